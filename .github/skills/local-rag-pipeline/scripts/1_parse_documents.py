@@ -1,27 +1,75 @@
 #!/usr/bin/env python3
 """
-Step 1: Parse documents (PDF/DOCX) using Docling.
+Step 1: Parse documents (PDF/DOCX/TXT/MD) using Docling.
 
 Extracts layout structure, tables, and metadata from documents.
+Markdown, plain text and simple born-digital PDFs (text layer, no tables)
+take a lightweight fast path instead of Docling's layout pipeline; see
+fast_extract.py.
+
 Output:
-- .pkl: Serialized DoclingDocument objects
+- docling.json.zst / .json.gz: DoclingDocument in a versioned JSON container
+  (or docling.pkl with --format pickle; see docling_store.py)
 - .md: Full Markdown export (for LLM processing)
-- .csv: Extracted tables (for LLM processing)
+- .csv: Extracted tables (for LLM processing), or with --table-store arrow
+  one corpus-wide tables.arrow (see table_store.py)
+- source.json: Source path, document type (antrag, berichte, ...) and project
+
+Subfolders are scanned recursively in priority order and mirrored in the
+output directory. The project of a document is --project, or else the
+first folder of its path when the documents/ root is parsed
+(documents/{projekt-id}/...; see document_scanner.document_project()).
 
 Usage:
-    python 1_parse_documents.py <input_dir> <output_dir>
+    python 1_parse_documents.py <input_dir> <output_dir> [--workers N] [--format json|pickle]
+                         [--shard-threshold PAGES] [--shard-size PAGES]
+                         [--timeout SECONDS] [--max-memory MB] [--retry-quarantined]
+                         [--table-store csv|arrow] [--project PROJEKT_ID]
+                         [--no-fast-path] [--force]
 
 Example:
-    python 1_parse_documents.py ./pdfs/ ./parsed_docs/
+    python 1_parse_documents.py ./pdfs/ ./parsed_docs/ --workers 4
+    python 1_parse_documents.py documents/ki-2024/ .rag/parsed/ --project ki-2024
+    python 1_parse_documents.py documents/ .rag/parsed/
 """
 
 import sys
 import os
-import pickle
 import csv
+import json
+import argparse
 from pathlib import Path
 from docling.document_converter import DocumentConverter
 from tqdm import tqdm
+from manifest import StageManifest, MANIFEST_NAME
+from docling_store import save_document, FORMATS
+from fast_extract import triage, extract
+from document_scanner import document_project, scan_documents
+from supervisor import SupervisedPool, WorkerLost
+from table_store import STORE_NAME, require_pyarrow, table_cells, update_table_store
+from page_shards import (
+    DEFAULT_SHARD_SIZE,
+    DEFAULT_SHARD_THRESHOLD,
+    merge_page_shards,
+    plan_page_ranges,
+)
+
+SUPPORTED_EXTENSIONS = [".pdf", ".docx", ".doc", ".txt", ".md", ".markdown"]
+
+DEFAULT_TIMEOUT = 1800  # seconds per document (or page-range shard)
+DEFAULT_MAX_MEMORY_MB = 8192  # resident memory per worker process
+
+# Per-process converter, created on first use (never for fast-path-only runs)
+_converter = None
+
+
+def get_converter() -> DocumentConverter:
+    """Return this process's DocumentConverter, creating it on first use."""
+    global _converter
+    if _converter is None:
+        tqdm.write(f"Initializing Docling DocumentConverter (pid {os.getpid()})...")
+        _converter = DocumentConverter()
+    return _converter
 
 
 def export_markdown(doc, md_path: Path):
@@ -31,20 +79,16 @@ def export_markdown(doc, md_path: Path):
         f.write(md_text)
 
 
-def export_tables(doc, doc_dir: Path, min_rows: int = 3, min_cols: int = 2):
-    """Export all tables as CSV files with page-based filenames.
+def _iter_tables(doc, min_rows: int = 3, min_cols: int = 2):
+    """Yield (page, table_index, dataframe) for tables worth exporting.
 
     Args:
         doc: DoclingDocument object
-        doc_dir: Output directory for CSV files
         min_rows: Minimum number of rows (default: 3)
         min_cols: Minimum number of columns (default: 2)
     """
     if not hasattr(doc, "tables") or not doc.tables:
-        return 0
-
-    doc_dir.mkdir(parents=True, exist_ok=True)
-    table_count = 0
+        return
 
     for i, table in enumerate(doc.tables):
         table_data = table.export_to_dataframe()
@@ -62,7 +106,23 @@ def export_tables(doc, doc_dir: Path, min_rows: int = 3, min_cols: int = 2):
                     page_num = prov.page_no
                     break
 
-        csv_path = doc_dir / f"page-{page_num}-table-{i + 1}.csv"
+        yield page_num, i + 1, table_data
+
+
+def export_tables(doc, doc_dir: Path, min_rows: int = 3, min_cols: int = 2):
+    """Export all tables as CSV files with page-based filenames.
+
+    Args:
+        doc: DoclingDocument object
+        doc_dir: Output directory for CSV files
+        min_rows: Minimum number of rows (default: 3)
+        min_cols: Minimum number of columns (default: 2)
+    """
+    table_count = 0
+
+    for page_num, table_index, table_data in _iter_tables(doc, min_rows, min_cols):
+        doc_dir.mkdir(parents=True, exist_ok=True)
+        csv_path = doc_dir / f"page-{page_num}-table-{table_index}.csv"
 
         with open(csv_path, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
@@ -73,91 +133,494 @@ def export_tables(doc, doc_dir: Path, min_rows: int = 3, min_cols: int = 2):
     return table_count
 
 
-def parse_documents(input_dir: str, output_dir: str):
+def collect_tables(doc, min_rows: int = 3, min_cols: int = 2) -> list:
+    """Tables as plain lists for the corpus table store (see table_store.py).
+
+    Returns:
+        List of (page, table_index, headers, rows) with string cells
     """
-    Parse all PDF/DOCX files in input directory using Docling.
+    return [
+        (
+            page_num,
+            table_index,
+            [str(header) for header in table_data.columns],
+            [[str(value) for value in row] for row in table_data.values.tolist()],
+        )
+        for page_num, table_index, table_data in _iter_tables(doc, min_rows, min_cols)
+    ]
+
 
-    This function processes documents sequentially for reliability.
-    For better performance with many documents, ensure all files are
-    in the same input directory for optimal batching.
+def convert_file(file_path: Path, fast_path: bool = True, page_range: tuple = None):
+    """Convert one document (or one page range of a PDF) to a DoclingDocument.
 
     Args:
-        input_dir: Directory containing PDF/DOCX files
-        output_dir: Directory to save parsed DoclingDocument objects
+        file_path: Source document
+        fast_path: Let triage() route simple files to the lightweight extractor
+            (plain text always uses it; Docling has no TXT backend)
+        page_range: 1-based inclusive (first, last) page range; forces Docling
+
+    Returns:
+        (doc, route) where route describes the path taken
     """
-    input_path = Path(input_dir)
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
+    if page_range is not None:
+        document = get_converter().convert(str(file_path), page_range=page_range).document
+        return document, f"docling: pages {page_range[0]}-{page_range[1]}"
 
-    # Initialize Docling converter
-    print("Initializing Docling DocumentConverter...")
-    converter = DocumentConverter()
+    use_fast_path, reason = triage(file_path)
+    if file_path.suffix.lower() != ".txt" and not fast_path:
+        use_fast_path, reason = False, "fast path disabled"
 
-    # Find all PDF and DOCX files
-    supported_extensions = [".pdf", ".docx", ".doc"]
-    files = []
-    for ext in supported_extensions:
-        files.extend(input_path.glob(f"*{ext}"))
+    if use_fast_path:
+        return extract(file_path), f"fast path: {reason}"
+    return get_converter().convert(str(file_path)).document, f"docling: {reason}"
 
-    if not files:
-        print(f"No PDF/DOCX files found in {input_dir}")
-        return
 
-    print(f"Found {len(files)} documents to parse")
+def write_outputs(doc, doc_dir: Path, doc_format: str = "json", table_store: str = "csv"):
+    """Write the stored document, contents.md and tables/ for one document.
+
+    With table_store="arrow" no CSV files are written; the tables are
+    returned under "tables" for the parent process to add to the corpus
+    table store.
 
-    # Parse each document
-    for file_path in tqdm(files, desc="Parsing documents"):
+    Returns:
+        Dict with element counts and written files, for the progress summary
+    """
+    doc_dir.mkdir(parents=True, exist_ok=True)
+
+    # Save DoclingDocument object
+    save_document(doc, doc_dir, doc_format)
+
+    # Export Markdown
+    md_path = doc_dir / "contents.md"
+    export_markdown(doc, md_path)
+
+    # Export tables as CSV, or collect them for the table store
+    table_dir = doc_dir / "tables"
+    tables = None
+    num_csv = 0
+    if table_store == "arrow":
+        tables = collect_tables(doc)
+    else:
+        num_csv = export_tables(doc, table_dir)
+
+    return {
+        "num_texts": len(doc.texts) if hasattr(doc, "texts") else 0,
+        "num_tables": len(doc.tables) if hasattr(doc, "tables") else 0,
+        "num_csv": num_csv,
+        "tables": tables,
+        # Not rglob: a sibling folder of the same name nests its documents here
+        "outputs": [
+            str(p)
+            for p in sorted([*doc_dir.glob("*"), *table_dir.glob("*")])
+            if p.is_file()
+        ],
+    }
+
+
+def write_source_info(doc_dir: Path, source_info: dict) -> str:
+    """Write source.json (source path relative to input_dir, document type, project)."""
+    path = doc_dir / "source.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(source_info, f, indent=2, ensure_ascii=False)
+    return str(path)
+
+
+def parse_file(
+    file_path: Path,
+    doc_dir: Path,
+    doc_format: str = "json",
+    fast_path: bool = True,
+    page_range: tuple = None,
+    table_store: str = "csv",
+):
+    """Convert one document and write its outputs.
+
+    For a page-range shard nothing is written; the partial document is
+    returned so the parent process can merge all shards of the file.
+
+    Returns:
+        Summary dict (see write_outputs) plus the route taken, or the
+        DoclingDocument of the shard when page_range is given
+    """
+    doc, route = convert_file(file_path, fast_path, page_range)
+    if page_range is not None:
+        return doc
+
+    summary = write_outputs(doc, doc_dir, doc_format, table_store)
+    summary["route"] = route
+    return summary
+
+
+def _print_summary(name: str, summary: dict):
+    if summary["tables"] is not None:
+        exported = f"{len(summary['tables'])} to table store"
+    else:
+        exported = f"{summary['num_csv']} CSV exported"
+    tqdm.write(
+        f"  ✓ {name}: {summary['num_texts']} text elements, "
+        f"{summary['num_tables']} tables, {exported} "
+        f"({summary['route']})"
+    )
+
+
+def _parse_in_worker(file_path: str, doc_dir: str, options: dict, page_range):
+    return parse_file(Path(file_path), Path(doc_dir), page_range=page_range, **options)
+
+
+def _run_serial(tasks: list, options: dict):
+    """Run (file_path, doc_dir, page_range) tasks in this process.
+
+    Yields:
+        (task, result, error) with error None on success
+    """
+    for task in tasks:
+        file_path, doc_dir, page_range = task
         try:
-            # Convert document
-            result = converter.convert(str(file_path))
-            doc = result.document
+            result = parse_file(file_path, doc_dir, page_range=page_range, **options)
+        except Exception as e:
+            yield task, None, str(e)
+        else:
+            yield task, result, None
 
-            doc_dir = output_path / file_path.stem
-            doc_dir.mkdir(parents=True, exist_ok=True)
 
-            # Save DoclingDocument object
-            pkl_path = doc_dir / "docling.pkl"
-            with open(pkl_path, "wb") as f:
-                pickle.dump(doc, f)
+def _run_supervised(tasks: list, workers: int, options: dict, timeout: float, max_memory_mb: float):
+    """Run (file_path, doc_dir, page_range) tasks in supervised worker processes.
 
-            # Export Markdown
-            md_path = doc_dir / "contents.md"
-            export_markdown(doc, md_path)
+    Each worker converts one task at a time. A worker that exceeds the
+    timeout or memory cap, or crashes, is killed and replaced; only its
+    own task fails, with a WorkerLost error (see supervisor.py).
 
-            # Export tables as CSV
-            table_dir = doc_dir / "tables"
-            num_csv = export_tables(doc, table_dir)
+    Yields:
+        (task, result, error) as soon as each task finishes
+    """
+    pool = SupervisedPool(workers, _parse_in_worker, timeout, max_memory_mb)
+    jobs = (
+        (task, (str(task[0]), str(task[1]), options, task[2])) for task in tasks
+    )
+    yield from pool.run(jobs)
+
+
+def parse_documents(
+    input_dir: str,
+    output_dir: str,
+    workers: int = 1,
+    force: bool = False,
+    doc_format: str = "json",
+    fast_path: bool = True,
+    shard_threshold: int = DEFAULT_SHARD_THRESHOLD,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_memory_mb: float = DEFAULT_MAX_MEMORY_MB,
+    retry_quarantined: bool = False,
+    table_store: str = "csv",
+    project: str = None,
+):
+    """
+    Parse all PDF/DOCX/TXT/MD files under input directory using Docling.
+
+    The directory is scanned recursively in ingestion priority order
+    (antrag/, berichte/, publikationen/, meetings/, rest; see
+    document_scanner.py), all in one process lifetime. Outputs mirror the
+    source tree, and each document directory gets a source.json with the
+    source path, document type and project, which step 2 copies into the
+    chunks.
+
+    Documents are converted in supervised worker processes, each with its
+    own DocumentConverter; results are reported as soon as a document
+    finishes. A worker that runs longer than `timeout` seconds per
+    document, grows beyond `max_memory_mb`, or crashes is killed and
+    replaced, and its document is quarantined: later runs skip it until
+    its content changes. With workers=1 and both limits disabled,
+    documents are converted in this process instead.
+
+    With workers > 1, PDFs longer than shard_threshold pages that need
+    Docling are split into page ranges of shard_size pages, converted in
+    parallel and merged back into one document (see page_shards.py).
+
+    Only new or changed files are parsed; see manifest.py. Outputs of
+    files that were removed from input_dir are deleted.
 
-            # Print summary
-            num_texts = len(doc.texts) if hasattr(doc, "texts") else 0
-            num_tables = len(doc.tables) if hasattr(doc, "tables") else 0
+    Args:
+        input_dir: Directory tree containing PDF/DOCX/TXT/MD files
+        output_dir: Directory to save parsed DoclingDocument objects
+        workers: Number of parallel worker processes (default: 1)
+        force: Re-parse every file, ignoring the manifest
+        doc_format: Storage format for the DoclingDocument ("json" or "pickle")
+        fast_path: Route simple files to the lightweight extractor
+        shard_threshold: Page count above which a PDF is sharded (0 disables)
+        shard_size: Pages per shard
+        timeout: Wall-clock seconds per document or shard (0 disables)
+        max_memory_mb: Resident memory cap per worker in MB (0 disables)
+        retry_quarantined: Try quarantined documents again
+        table_store: "csv" (one file per table) or "arrow" (one corpus-wide
+            tables.arrow in output_dir; see table_store.py)
+        project: Projekt-id of every document (input_dir is one project);
+            None takes it from the first folder of each path
+    """
+    input_path = Path(input_dir)
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    if table_store == "arrow":
+        require_pyarrow()
+    store_path = output_path / STORE_NAME
+
+    # Find all supported files, in priority order
+    files = []
+    doc_types = {}
+    for file_path, doc_type in scan_documents(input_path, SUPPORTED_EXTENSIONS):
+        files.append(file_path)
+        doc_types[file_path] = doc_type
+
+    manifest = StageManifest(output_path / MANIFEST_NAME, stage="parse")
+    keys = {f: f.relative_to(input_path).as_posix() for f in files}
+    removed = manifest.remove_stale(keys.values())
+    if removed:
+        print(f"Removed outputs of {len(removed)} deleted source file(s)")
+
+    if not files:
+        manifest.save()
+        if table_store == "arrow" and store_path.exists():
+            update_table_store(store_path, {}, set(removed))
+        print(f"No PDF/DOCX/TXT/MD files found in {input_dir}")
+        return
+
+    pending = [f for f in files if force or not manifest.is_current(keys[f], f)]
+
+    # Skip documents that killed a worker before, unless they changed since
+    quarantined = []
+    if not retry_quarantined:
+        for file_path in pending:
+            reason = manifest.quarantine_reason(keys[file_path], file_path)
+            if reason:
+                quarantined.append(file_path)
+                tqdm.write(f"  ⊘ Skipping quarantined {keys[file_path]}: {reason}")
+        pending = [f for f in pending if f not in quarantined]
+
+    print(
+        f"Found {len(files)} documents, {len(pending)} new or changed to parse"
+        + (f", {len(quarantined)} quarantined" if quarantined else "")
+    )
+
+    for file_path in pending:
+        manifest.discard_outputs(keys[file_path])
+
+    # Mirror the source tree so equal file names in different folders
+    # do not collide
+    doc_dirs = {
+        f: output_path / f.relative_to(input_path).parent / f.stem for f in pending
+    }
+
+    options = {"doc_format": doc_format, "fast_path": fast_path, "table_store": table_store}
+
+    # Table store: rows of re-parsed and deleted documents are replaced
+    new_cells = {}
+    drop_documents = set(removed) | {keys[f] for f in pending}
+    if table_store == "arrow" and not store_path.exists() and len(pending) < len(files):
+        print(f"Note: {STORE_NAME} does not exist yet; use --force to add unchanged documents")
+
+    # Split oversized PDFs that need Docling into page-range tasks
+    tasks = []
+    shard_state = {}
+    for file_path in pending:
+        page_ranges = []
+        if workers > 1:
+            page_ranges = plan_page_ranges(file_path, shard_threshold, shard_size)
+            if page_ranges and fast_path and triage(file_path)[0]:
+                page_ranges = []  # the fast path is cheap enough unsharded
+        if page_ranges:
+            shard_state[file_path] = {"docs": {}, "remaining": len(page_ranges), "errors": []}
+            tasks.extend(
+                (file_path, doc_dirs[file_path], page_range) for page_range in page_ranges
+            )
             tqdm.write(
-                f"  ✓ {file_path.name}: {num_texts} text elements, "
-                f"{num_tables} tables, {num_csv} CSV exported"
+                f"  ⧉ {keys[file_path]}: {page_ranges[-1][1]} pages → "
+                f"{len(page_ranges)} shards of {shard_size}"
             )
-
+        else:
+            tasks.append((file_path, doc_dirs[file_path], None))
+    workers = max(1, min(workers, len(tasks)))
+
+    def on_success(file_path: Path, summary: dict):
+        source_info = {
+            "source_path": keys[file_path],
+            "doc_type": doc_types[file_path],
+            "project": project or document_project(Path(keys[file_path])),
+        }
+        summary["outputs"].append(write_source_info(doc_dirs[file_path], source_info))
+        _print_summary(keys[file_path], summary)
+        if summary["tables"] is not None:
+            new_cells[keys[file_path]] = table_cells(
+                summary["tables"], keys[file_path], doc_types[file_path]
+            )
+        manifest.record(keys[file_path], file_path, outputs=summary["outputs"])
+        manifest.release(keys[file_path])
+        manifest.save()
+
+    def on_error(file_path: Path, error):
+        if not isinstance(error, WorkerLost):
+            tqdm.write(f"  ✗ Error parsing {keys[file_path]}: {error}")
+            return
+        # The worker was killed and replaced; skip this file until it changes
+        tqdm.write(f"  ✗ Error parsing {keys[file_path]}: {error} (quarantined)")
+        manifest.quarantine(keys[file_path], file_path, str(error))
+        manifest.save()
+
+    def on_shard(file_path: Path, page_range: tuple, doc, error):
+        """Collect one shard; merge and write once all shards of the file are in."""
+        state = shard_state[file_path]
+        state["remaining"] -= 1
+        if error:
+            shard_error = f"pages {page_range[0]}-{page_range[1]}: {error}"
+            if isinstance(error, WorkerLost):
+                shard_error = WorkerLost(shard_error)
+            state["errors"].append(shard_error)
+        else:
+            state["docs"][page_range] = doc
+        if state["remaining"]:
+            return False
+
+        docs = shard_state.pop(file_path)["docs"]
+        if state["errors"]:
+            lost = [e for e in state["errors"] if isinstance(e, WorkerLost)]
+            message = "; ".join(map(str, state["errors"]))
+            on_error(file_path, WorkerLost(message) if lost else message)
+            return True
+        try:
+            merged = merge_page_shards(file_path, docs)
+            summary = write_outputs(merged, doc_dirs[file_path], doc_format, table_store)
+            summary["route"] = f"docling: {len(docs)} page shards merged"
+            on_success(file_path, summary)
         except Exception as e:
-            tqdm.write(f"  ✗ Error parsing {file_path.name}: {e}")
+            tqdm.write(f"  ✗ Error merging {keys[file_path]}: {e}")
+        return True
+
+    try:
+        if workers > 1 or timeout or max_memory_mb:
+            print(
+                f"Starting {workers} supervised worker process(es) "
+                f"(one DocumentConverter each; timeout {timeout or 'off'}s, "
+                f"memory cap {max_memory_mb or 'off'} MB)..."
+            )
+            results = _run_supervised(tasks, workers, options, timeout, max_memory_mb)
+        else:
+            results = _run_serial(tasks, options)
+
+        with tqdm(total=len(pending), desc="Parsing documents") as progress:
+            for (file_path, _, page_range), result, error in results:
+                if page_range is not None:
+                    if on_shard(file_path, page_range, result, error):
+                        progress.update(1)
+                    continue
+                if error:
+                    on_error(file_path, error)
+                else:
+                    on_success(file_path, result)
+                progress.update(1)
+    finally:
+        manifest.save()
+        if table_store == "arrow":
+            num_rows = update_table_store(store_path, new_cells, drop_documents)
+            print(f"Table store: {num_rows} cells in {store_path}")
 
     print(f"\nParsed documents saved to: {output_path}")
     print(f"Next step: python 2_chunk_documents.py {output_dir} ./chunks/")
 
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python 1_parse_documents.py <input_dir> <output_dir>")
-        print("\nExample:")
-        print("  python 1_parse_documents.py ./pdfs/ ./parsed_docs/")
-        sys.exit(1)
-
-    input_dir = sys.argv[1]
-    output_dir = sys.argv[2]
-
-    if not os.path.exists(input_dir):
-        print(f"Error: Input directory not found: {input_dir}")
+    parser = argparse.ArgumentParser(description="Parse documents with Docling")
+    parser.add_argument("input_dir", help="Directory containing PDF/DOCX/TXT/MD files")
+    parser.add_argument("output_dir", help="Directory to save parsed documents")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of parallel worker processes, each with its own converter (default: 1)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="json",
+        help="Storage format for parsed documents (default: json, compressed and versioned; "
+        "pickle is the legacy docling.pkl)",
+    )
+    parser.add_argument(
+        "--table-store",
+        choices=["csv", "arrow"],
+        default="csv",
+        help="csv: tables/page-N-table-M.csv per document (default); arrow: all tables "
+        f"of the corpus in one memory-mappable {STORE_NAME} (see table_store.py)",
+    )
+    parser.add_argument(
+        "--shard-threshold",
+        type=int,
+        default=DEFAULT_SHARD_THRESHOLD,
+        help="With --workers > 1, split PDFs with more pages than this into page-range "
+        f"shards (default: {DEFAULT_SHARD_THRESHOLD}, 0 disables)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help=f"Pages per shard (default: {DEFAULT_SHARD_SIZE})",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Kill a worker after this many seconds on one document or shard "
+        f"(default: {DEFAULT_TIMEOUT}, 0 disables)",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=float,
+        default=DEFAULT_MAX_MEMORY_MB,
+        help="Kill a worker whose resident memory exceeds this many MB "
+        f"(default: {DEFAULT_MAX_MEMORY_MB}, 0 disables)",
+    )
+    parser.add_argument(
+        "--retry-quarantined",
+        action="store_true",
+        help="Parse documents again that were quarantined after a timeout, "
+        "memory overrun or crash",
+    )
+    parser.add_argument(
+        "--project",
+        metavar="PROJEKT_ID",
+        help="Projekt-id of all documents, when input_dir is a single project "
+        "(default: the first folder of each path, for the documents/ root)",
+    )
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Send every PDF/MD file through Docling's full layout pipeline",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-parse all files, ignoring the incremental manifest",
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        print(f"Error: Input directory not found: {args.input_dir}")
         sys.exit(1)
 
-    parse_documents(input_dir, output_dir)
+    parse_documents(
+        args.input_dir,
+        args.output_dir,
+        args.workers,
+        args.force,
+        args.format,
+        not args.no_fast_path,
+        args.shard_threshold,
+        args.shard_size,
+        args.timeout,
+        args.max_memory,
+        args.retry_quarantined,
+        args.table_store,
+        args.project,
+    )
 
 
 if __name__ == "__main__":
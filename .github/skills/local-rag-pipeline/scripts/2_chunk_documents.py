@@ -3,152 +3,557 @@
 Step 2: Chunk parsed documents using HybridChunker.
 
 Applies hierarchical, token-aware chunking while preserving metadata.
-Output: JSON files with chunks and metadata.
+Tokens are counted with the embedding model's tokenizer, and chunks are
+sized to the model's input limit so nothing is truncated in step 3.
+Output: JSON (or JSON Lines, --format jsonl) files with chunks and metadata.
 
 Usage:
-    python 2_chunk_documents.py <parsed_dir> <output_dir> [--max-tokens MAX]
+    python 2_chunk_documents.py <parsed_dir> <output_dir> [--embedding-model MODEL]
+                                [--from-collection CHROMA_DB_PATH COLLECTION]
+                                [--max-tokens MAX] [--format json|jsonl]
+                                [--provenance sidecar|inline]
+                                [--dedup-threshold T | --no-dedup]
+                                [--workers N] [--force]
 
 Example:
-    python 2_chunk_documents.py ./parsed_docs/ ./chunks/ --max-tokens 512
+    python 2_chunk_documents.py ./parsed_docs/ ./chunks/ --embedding-model BAAI/bge-base-en-v1.5
 """
 
 import sys
 import os
 import json
-import pickle
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from docling.chunking import HybridChunker
 from tqdm import tqdm
+from manifest import StageManifest, MANIFEST_NAME
+from docling_store import find_parsed_documents, load_document
+from chunk_io import (
+    FORMATS,
+    ChunkIdAssigner,
+    chunk_file_doc_name,
+    chunk_file_name,
+    provenance_file_name,
+    save_provenance,
+    write_chunks,
+)
+from chunk_tokenizer import tokenizer_available, prefill_document
+from dedup import (
+    DEFAULT_THRESHOLD,
+    build_dedup_index,
+    format_dedup_report,
+    minhash,
+    minhash_file_name,
+    remove_dedup_index,
+    save_minhash,
+)
+from embedding_models import (
+    DEFAULT_EMBEDDING_MODEL,
+    collection_embedding_model,
+    count_over_limit,
+    hub_model_name,
+    token_limits,
+)
+from shards import source_project
 
 
 def extract_metadata(chunk):
-    """Extract metadata from a chunk object."""
+    """Extract metadata and provenance boxes from a chunk object.
+
+    Returns:
+        (metadata, boxes): boxes holds (page, l, t, r, b) for every
+        provenance item of the chunk, in document order
+    """
     metadata = {
         "page_numbers": [],
         "headings": [],
         "filename": "",
         "chunk_index": 0,
         "has_table": False,
-        "bboxes": [],
     }
+    boxes = []
+
+    meta = getattr(chunk, "meta", None)
+    if meta is None:
+        return metadata, boxes
 
     try:
-        # Extract page numbers from provenance
-        if hasattr(chunk, "meta") and hasattr(chunk.meta, "doc_items"):
-            page_numbers = set()
-            for item in chunk.meta.doc_items:
-                if hasattr(item, "prov"):
-                    for prov in item.prov:
-                        if hasattr(prov, "page_no"):
-                            page_numbers.add(prov.page_no)
-                        if hasattr(prov, "bbox"):
-                            bbox = prov.bbox
-                            metadata["bboxes"].append(
-                                {
-                                    "l": bbox.l if hasattr(bbox, "l") else 0,
-                                    "t": bbox.t if hasattr(bbox, "t") else 0,
-                                    "r": bbox.r if hasattr(bbox, "r") else 0,
-                                    "b": bbox.b if hasattr(bbox, "b") else 0,
-                                }
-                            )
-
-                # Check for tables
-                if hasattr(item, "label") and item.label == "table":
-                    metadata["has_table"] = True
-
-            metadata["page_numbers"] = sorted(list(page_numbers))
+        # Extract page numbers and boxes from provenance
+        page_numbers = set()
+        for item in getattr(meta, "doc_items", None) or []:
+            for prov in getattr(item, "prov", None) or []:
+                page_numbers.add(prov.page_no)
+                bbox = prov.bbox
+                if bbox is not None:
+                    boxes.append((prov.page_no, bbox.l, bbox.t, bbox.r, bbox.b))
+
+            # Check for tables
+            if getattr(item, "label", None) == "table":
+                metadata["has_table"] = True
+
+        metadata["page_numbers"] = sorted(page_numbers)
 
         # Extract headings
-        if hasattr(chunk, "meta") and hasattr(chunk.meta, "headings"):
-            metadata["headings"] = chunk.meta.headings if chunk.meta.headings else []
+        metadata["headings"] = getattr(meta, "headings", None) or []
 
         # Extract filename
-        if hasattr(chunk, "meta") and hasattr(chunk.meta, "origin"):
-            if hasattr(chunk.meta.origin, "filename"):
-                metadata["filename"] = chunk.meta.origin.filename
+        origin = getattr(meta, "origin", None)
+        if origin is not None and getattr(origin, "filename", None):
+            metadata["filename"] = origin.filename
 
     except Exception as e:
         print(f"Warning: Error extracting metadata: {e}")
 
-    return metadata
+    return metadata, boxes
 
 
-def chunk_documents(parsed_dir: str, output_dir: str, max_tokens: int = 512):
+def load_source_info(doc_dir: Path) -> dict:
+    """Read source.json written by step 1 (absent for older parsed trees)."""
+    path = doc_dir / "source.json"
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_chunker(max_tokens: int, model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """HybridChunker as configured for this pipeline.
+
+    Counts tokens with the tokenizer of the embedding model `model_name`.
+    Uses the batched, memoized CachingTokenizer when docling-core supports
+    pluggable tokenizers (see chunk_tokenizer.py); chunks are the same
+    either way.
+
+    Args:
+        max_tokens: Token budget per chunk (see embedding_models.token_limits())
+        model_name: Embedding model whose tokenizer is used
     """
-    Chunk parsed documents using HybridChunker.
+    model_name = hub_model_name(model_name)
+    if tokenizer_available():
+        from chunk_tokenizer import CachingTokenizer
+
+        tokenizer = CachingTokenizer.from_pretrained(
+            model_name=model_name, max_tokens=max_tokens
+        )
+        tokenizer.warm_up()
+        return HybridChunker(tokenizer=tokenizer, merge_list_items=True)
+    return HybridChunker(
+        max_tokens=max_tokens, merge_list_items=True, tokenizer=model_name
+    )
+
+
+def _hf_tokenizer(chunker):
+    """The Hugging Face tokenizer behind a chunker (wrapped in newer docling-core)."""
+    tokenizer = chunker.tokenizer
+    return tokenizer.get_tokenizer() if hasattr(tokenizer, "get_tokenizer") else tokenizer
+
+
+def iter_document_chunks(chunker, doc, source_info: dict, provenance: list = None):
+    """Chunk one DoclingDocument, yielding chunks as the chunker produces them.
 
     Args:
-        parsed_dir: Directory containing parsed .pkl files
-        output_dir: Directory to save chunk JSON files
-        max_tokens: Maximum tokens per chunk
+        chunker: Chunker from create_chunker()
+        doc: DoclingDocument
+        source_info: Contents of source.json (doc_type, source_path, project)
+        provenance: If given, the boxes of each chunk are appended to this
+            list (for chunk_io.save_provenance()); otherwise they are
+            stored inline as metadata["bboxes"]
+
+    Yields:
+        {"text", "metadata"} dicts, as stored in chunk files
     """
-    parsed_path = Path(parsed_dir)
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
+    prefill_document(chunker, doc)
 
-    # Initialize chunker
-    print(f"Initializing HybridChunker (max_tokens={max_tokens})...")
-    chunker = HybridChunker(
-        max_tokens=max_tokens, merge_list_items=True, tokenizer="gpt2"
-    )
+    for idx, chunk in enumerate(chunker.chunk(doc)):
+        metadata, boxes = extract_metadata(chunk)
+        metadata["chunk_index"] = idx
+        if provenance is None:
+            metadata["bboxes"] = [
+                {"l": l, "t": t, "r": r, "b": b} for _, l, t, r, b in boxes
+            ]
+        else:
+            provenance.append(boxes)
+        metadata["doc_type"] = source_info.get("doc_type", "")
+        metadata["source_path"] = source_info.get("source_path", "")
+        metadata["project"] = source_project(source_info)
 
-    # Find all .pkl files (recursively)
-    pkl_files = list(parsed_path.glob("**/*.pkl"))
+        yield {"text": chunk.text, "metadata": metadata}
 
-    if not pkl_files:
-        print(f"No .pkl files found in {parsed_dir}")
-        return
 
-    print(f"Found {len(pkl_files)} parsed documents")
+def chunk_document(chunker, doc, source_info: dict, provenance: list = None) -> list:
+    """Chunk one DoclingDocument (see iter_document_chunks()).
+
+    Returns:
+        List of {"text", "metadata"} dicts
+    """
+    return list(iter_document_chunks(chunker, doc, source_info, provenance))
 
-    # Process each document
-    total_chunks = 0
-    for pkl_file in tqdm(pkl_files, desc="Chunking documents"):
-        try:
-            # Load DoclingDocument
-            with open(pkl_file, "rb") as f:
-                doc = pickle.load(f)
 
-            # Generate chunks
-            chunks = list(chunker.chunk(doc))
+# Chunk texts per batched call when counting tokens for the truncation report
+_COUNT_BATCH = 256
 
-            # Extract text and metadata for each chunk
-            chunk_data = []
-            for idx, chunk in enumerate(chunks):
-                metadata = extract_metadata(chunk)
-                metadata["chunk_index"] = idx
 
-                chunk_data.append({"text": chunk.text, "metadata": metadata})
+def chunk_file(
+    chunker,
+    doc_file: Path,
+    output_file: Path,
+    token_limit: int,
+    provenance_file: Path = None,
+    minhash_file: Path = None,
+) -> tuple:
+    """Chunk one stored document and write its chunk file.
 
-            # Save chunks as JSON (use parent directory name for unique filenames)
-            doc_name = pkl_file.parent.name
-            output_file = output_path / f"{doc_name}_chunks.json"
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(chunk_data, f, indent=2, ensure_ascii=False)
+    JSON Lines files are written one chunk at a time.
 
-            total_chunks += len(chunks)
-            tqdm.write(f"  ✓ {pkl_file.name}: {len(chunks)} chunks")
+    Args:
+        chunker: Chunker from create_chunker()
+        doc_file: Stored DoclingDocument
+        output_file: Chunk JSON to write
+        token_limit: Embedding model input limit, for the truncation report
+        provenance_file: Provenance sidecar to write; bboxes are stored
+            inline in the chunk metadata when None
+        minhash_file: MinHash signatures to write for near-duplicate
+            detection (see dedup.py); skipped when None
+
+    Returns:
+        (number of chunks written, number of chunks over token_limit)
+    """
+    # Load DoclingDocument
+    doc = load_document(doc_file)
+
+    tokenizer = _hf_tokenizer(chunker)
+    assign_id = ChunkIdAssigner(chunk_file_doc_name(output_file))
+    ids = []
+    over_limit = 0
+    texts = []
+    signatures = []
+    pages = []
+
+    def counted(chunks):
+        # Count chunks over the model limit in batches while they are written
+        nonlocal over_limit
+        for chunk in chunks:
+            ids.append(assign_id(chunk["text"]))
+            texts.append(chunk["text"])
+            if minhash_file:
+                signatures.append(minhash(chunk["text"]))
+                pages.append(chunk["metadata"]["page_numbers"])
+            if len(texts) == _COUNT_BATCH:
+                over_limit += count_over_limit(tokenizer, texts, token_limit)
+                texts.clear()
+            yield chunk
+        over_limit += count_over_limit(tokenizer, texts, token_limit)
+
+    # Generate chunks; document type and source path come from the
+    # folder in step 1
+    provenance = [] if provenance_file else None
+    source_info = load_source_info(doc_file.parent)
+    chunks = iter_document_chunks(chunker, doc, source_info, provenance)
+    num_chunks = write_chunks(output_file, counted(chunks))
+    if provenance_file:
+        save_provenance(provenance_file, provenance, ids)
+    if minhash_file:
+        save_minhash(minhash_file, ids, signatures, pages, source_info)
+    return num_chunks, over_limit
+
+
+# Per-process chunker for --workers mode, created by the pool initializer
+_chunker = None
+
+
+def _init_worker(max_tokens: int, model_name: str, threads_per_worker: int):
+    global _chunker
+    # Keep the Rust tokenizer's thread pool from oversubscribing the CPU
+    os.environ.setdefault("RAYON_NUM_THREADS", str(threads_per_worker))
+    _chunker = create_chunker(max_tokens, model_name)
+
+
+def _chunk_in_worker(
+    doc_file: str, output_file: str, token_limit: int, provenance_file: str, minhash_file: str
+) -> tuple:
+    return chunk_file(
+        _chunker,
+        Path(doc_file),
+        Path(output_file),
+        token_limit,
+        Path(provenance_file) if provenance_file else None,
+        Path(minhash_file) if minhash_file else None,
+    )
 
+
+def _run_serial(tasks: list, max_tokens: int, model_name: str, token_limit: int):
+    """Chunk (doc_file, output_file, provenance_file, minhash_file) tasks in this process.
+
+    Yields:
+        (doc_file, output_file, (num_chunks, num_over_limit), error)
+    """
+    print(f"Initializing HybridChunker (max_tokens={max_tokens}, tokenizer={model_name})...")
+    chunker = create_chunker(max_tokens, model_name)
+    for doc_file, output_file, provenance_file, minhash_file in tasks:
+        try:
+            counts = chunk_file(
+                chunker, doc_file, output_file, token_limit, provenance_file, minhash_file
+            )
+            yield doc_file, output_file, counts, None
         except Exception as e:
-            tqdm.write(f"  ✗ Error chunking {pkl_file.name}: {e}")
+            yield doc_file, output_file, (0, 0), str(e)
+
+
+def _run_parallel(tasks: list, max_tokens: int, model_name: str, token_limit: int, workers: int):
+    """Chunk (doc_file, output_file, provenance_file, minhash_file) tasks in a process pool.
+
+    Each worker builds its chunker and warms up its tokenizer once, in the
+    pool initializer. Output files are written by the workers and are
+    identical to the serial mode; only completion order differs.
+
+    Yields:
+        (doc_file, output_file, (num_chunks, num_over_limit), error) as
+        documents finish
+    """
+    print(
+        f"Starting {workers} worker processes (one HybridChunker each, "
+        f"max_tokens={max_tokens}, tokenizer={model_name})..."
+    )
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    # spawn: the tokenizers library must not be forked after first use
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(max_tokens, model_name, threads_per_worker),
+    ) as pool:
+        futures = {
+            pool.submit(
+                _chunk_in_worker,
+                str(doc_file),
+                str(output_file),
+                token_limit,
+                str(provenance_file) if provenance_file else None,
+                str(minhash_file) if minhash_file else None,
+            ): (doc_file, output_file)
+            for doc_file, output_file, provenance_file, minhash_file in tasks
+        }
+        for future in as_completed(futures):
+            doc_file, output_file = futures[future]
+            try:
+                yield doc_file, output_file, future.result(), None
+            except Exception as e:
+                yield doc_file, output_file, (0, 0), str(e)
+
+
+def chunk_documents(
+    parsed_dir: str,
+    output_dir: str,
+    max_tokens: int = None,
+    force: bool = False,
+    workers: int = 1,
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    chunk_format: str = "json",
+    provenance: str = "sidecar",
+    dedup_threshold: float = DEFAULT_THRESHOLD,
+):
+    """
+    Chunk parsed documents using HybridChunker.
+
+    Reads the JSON containers written by step 1 as well as legacy .pkl
+    files. Only documents whose stored file changed since the last run
+    are re-chunked; chunk files of documents that no longer exist are
+    deleted.
+
+    Chunks are sized with the tokenizer of the embedding model used in
+    step 3, and by default to the model's input limit minus its special
+    tokens. Chunks that the model would still truncate are counted and
+    reported. The model and budget are part of the manifest's stage key,
+    so switching models re-chunks everything.
+
+    With workers > 1 documents are chunked in parallel processes, each
+    with its own pre-warmed chunker; the chunk files are identical to
+    the sequential mode.
+
+    Near-duplicate chunks across documents are detected with MinHash/LSH
+    (see dedup.py): signatures are stored per document, and after
+    chunking dedup.json maps every duplicate to one canonical chunk that
+    carries all source references. Steps 3 and 4 embed and index only
+    the canonical chunks. The dedup ratio is reported per document type.
+
+    Args:
+        parsed_dir: Directory containing parsed documents
+        output_dir: Directory to save chunk JSON files
+        max_tokens: Maximum tokens per chunk (default: the model's limit)
+        force: Re-chunk every document, ignoring the manifest
+        workers: Number of parallel worker processes (default: 1)
+        model_name: Embedding model whose tokenizer and limit are used
+        chunk_format: "json" (one array per document) or "jsonl" (JSON
+            Lines, written and read one chunk at a time)
+        provenance: "sidecar" (bounding boxes in <doc>_provenance.npz,
+            see chunk_io.py) or "inline" (metadata["bboxes"] lists)
+        dedup_threshold: Minimum estimated Jaccard similarity for two
+            chunks to be collapsed; None disables deduplication
+    """
+    parsed_path = Path(parsed_dir)
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # Find all stored documents (recursively)
+    doc_files = find_parsed_documents(parsed_path)
+
+    token_limit, budget = token_limits(model_name)
+    if max_tokens is None:
+        max_tokens = budget
+    elif max_tokens > budget:
+        print(
+            f"Warning: --max-tokens {max_tokens} exceeds the {budget} tokens "
+            f"{model_name} embeds; longer chunks will be truncated"
+        )
+    print(f"Embedding model: {model_name} (limit {token_limit} tokens, chunk budget {max_tokens})")
+
+    manifest = StageManifest(
+        output_path / MANIFEST_NAME, stage=f"chunk:{model_name}:{max_tokens}"
+    )
+    keys = {f: f.relative_to(parsed_path).as_posix() for f in doc_files}
+    removed = manifest.remove_stale(keys.values())
+    if removed:
+        print(f"Removed chunks of {len(removed)} deleted document(s)")
+
+    if not doc_files:
+        manifest.save()
+        remove_dedup_index(output_path)
+        print(f"No parsed documents found in {parsed_dir}")
+        return
+
+    # Relative directory path for unique filenames,
+    # e.g. antrag/vollantrag -> antrag__vollantrag_chunks.json
+    output_files = {}
+    doc_names = {}
+    for f in doc_files:
+        doc_name = doc_names[f] = "__".join(f.parent.relative_to(parsed_path).parts)
+        output_files[f] = [output_path / chunk_file_name(doc_name, chunk_format)]
+        if provenance == "sidecar":
+            output_files[f].append(output_path / provenance_file_name(doc_name))
+        if dedup_threshold is not None:
+            output_files[f].append(output_path / minhash_file_name(doc_name))
+
+    def in_format(doc_file: Path) -> bool:
+        recorded = manifest.get(keys[doc_file]).get("outputs", {})
+        return sorted(recorded) == sorted(p.name for p in output_files[doc_file])
+
+    pending = [
+        f
+        for f in doc_files
+        if force or not manifest.is_current(keys[f], f) or not in_format(f)
+    ]
+    print(f"Found {len(doc_files)} parsed documents, {len(pending)} new or changed")
+
+    tasks = []
+    for doc_file in pending:
+        # Switching --format/--provenance/--no-dedup: drop files of the other layout
+        if not in_format(doc_file):
+            manifest.discard_outputs(keys[doc_file])
+        outputs = {p.name: p for p in output_files[doc_file]}
+        tasks.append(
+            (
+                doc_file,
+                output_files[doc_file][0],
+                outputs.get(provenance_file_name(doc_names[doc_file])),
+                outputs.get(minhash_file_name(doc_names[doc_file])),
+            )
+        )
+
+    workers = max(1, min(workers, len(tasks)))
+    if workers > 1:
+        results = _run_parallel(tasks, max_tokens, model_name, token_limit, workers)
+    else:
+        results = _run_serial(tasks, max_tokens, model_name, token_limit)
 
+    # Process each document
+    total_chunks = 0
+    total_over_limit = 0
+    for doc_file, output_file, (num_chunks, over_limit), error in tqdm(
+        results, total=len(tasks), desc="Chunking documents"
+    ):
+        if error:
+            tqdm.write(f"  ✗ Error chunking {keys[doc_file]}: {error}")
+            continue
+        manifest.record(keys[doc_file], doc_file, outputs=output_files[doc_file])
+        total_chunks += num_chunks
+        total_over_limit += over_limit
+        note = f" ({over_limit} over the model limit)" if over_limit else ""
+        tqdm.write(f"  ✓ {chunk_file_doc_name(output_file)}: {num_chunks} chunks{note}")
+
+    manifest.save()
     print(f"\nTotal chunks created: {total_chunks}")
+    print(
+        f"Chunks over the {token_limit}-token limit of {model_name}: {total_over_limit}"
+        + (" (truncated when embedded)" if total_over_limit else "")
+    )
+    if dedup_threshold is None:
+        remove_dedup_index(output_path)
+    else:
+        # Over all documents, not only the re-chunked ones
+        print(format_dedup_report(build_dedup_index(output_path, dedup_threshold)))
     print(f"Chunks saved to: {output_path}")
-    print(f"Next step: python 3_generate_embeddings.py {output_dir} ./embeddings/")
+    print(f"Next step: python 3_generate_embeddings.py {output_dir} ./embeddings/ --model {model_name}")
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Chunk parsed documents with HybridChunker"
     )
-    parser.add_argument("parsed_dir", help="Directory containing .pkl files")
+    parser.add_argument("parsed_dir", help="Directory containing parsed documents")
     parser.add_argument("output_dir", help="Directory to save chunk JSON files")
+    parser.add_argument(
+        "--embedding-model",
+        default=DEFAULT_EMBEDDING_MODEL,
+        help=f"Embedding model used in step 3; its tokenizer and input limit size the chunks (default: {DEFAULT_EMBEDDING_MODEL})",
+    )
+    parser.add_argument(
+        "--from-collection",
+        nargs=2,
+        metavar=("CHROMA_DB_PATH", "COLLECTION"),
+        help="Take the embedding model from an existing collection's metadata",
+    )
     parser.add_argument(
         "--max-tokens",
         type=int,
-        default=512,
-        help="Maximum tokens per chunk (default: 512)",
+        help="Maximum tokens per chunk (default: the embedding model's input limit)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="json",
+        help="Chunk file format: json array or jsonl (JSON Lines, streamed) (default: json)",
+    )
+    parser.add_argument(
+        "--provenance",
+        choices=["sidecar", "inline"],
+        default="sidecar",
+        help="Bounding boxes in a columnar <doc>_provenance.npz (sidecar) or as "
+        "per-chunk bboxes lists in the chunk metadata (inline) (default: sidecar)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Collapse chunks of different documents whose estimated Jaccard similarity "
+        f"reaches this value into one (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Keep near-duplicate chunks; do not write MinHash signatures or dedup.json",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of parallel worker processes, each with its own chunker (default: 1)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-chunk all documents, ignoring the incremental manifest",
     )
 
     args = parser.parse_args()
@@ -157,7 +562,21 @@ def main():
         print(f"Error: Parsed directory not found: {args.parsed_dir}")
         sys.exit(1)
 
-    chunk_documents(args.parsed_dir, args.output_dir, args.max_tokens)
+    model_name = args.embedding_model
+    if args.from_collection:
+        model_name = collection_embedding_model(*args.from_collection)
+
+    chunk_documents(
+        args.parsed_dir,
+        args.output_dir,
+        args.max_tokens,
+        args.force,
+        args.workers,
+        model_name,
+        args.format,
+        args.provenance,
+        None if args.no_dedup else args.dedup_threshold,
+    )
 
 
 if __name__ == "__main__":
@@ -3,10 +3,30 @@
 Step 3: Generate embeddings for chunks using sentence-transformers.
 
 GPU-accelerated batch embedding generation.
-Output: NPZ files with embeddings and metadata.
+Output: memory-mappable .npy shards with an offset-indexed records file
+(or compressed NPZ files, --format npz); see embedding_store.py.
+
+Reads *_chunks.json and *_chunks.jsonl files from step 2; JSON Lines
+files are read and encoded --batch-size chunks at a time. Near-duplicate
+chunks listed in the chunk directory's dedup.json are skipped; their
+canonical chunk carries all source references (see dedup.py).
+
+Chunks of consecutive files are pooled (--window) and encoded in batches
+of similar token length, so small files do not produce underfilled
+batches and little work goes into padding. Vectors are scattered back to
+their files; the output files are the same as with per-file encoding.
+
+On CPU servers, --workers encodes the batches in several processes, each
+pinned to its own slice of cores (see embedding_pool.py); --workers auto
+measures the best split once per machine and model.
 
 Usage:
     python 3_generate_embeddings.py <chunks_dir> <output_dir> [--model MODEL] [--batch-size SIZE]
+                                    [--window CHUNKS] [--cache PATH | --no-cache]
+                                    [--cache-size-mb MB] [--backend torch|onnx|onnx-int8]
+                                    [--onnx-dir DIR] [--workers N|auto]
+                                    [--threads-per-worker N] [--retune]
+                                    [--format npy|npz] [--dtype float32|float16] [--force]
 
 Example:
     python 3_generate_embeddings.py ./chunks/ ./embeddings/ --model BAAI/bge-base-en-v1.5 --batch-size 32
@@ -21,92 +41,791 @@ from pathlib import Path
 from sentence_transformers import SentenceTransformer
 import torch
 from tqdm import tqdm
+from manifest import StageManifest, MANIFEST_NAME
+from chunk_io import (
+    ChunkIdAssigner,
+    chunk_file_doc_name,
+    find_chunk_files,
+    iter_chunk_batches,
+    iter_chunks,
+)
+from dedup import load_dedup_index
+from embedding_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_SIZE_MB, open_cache
+from embedding_backends import BACKENDS, cache_model_key, check_backend, load_backend_model
+from embedding_pool import EmbeddingPool, tune_pool
+from embedding_store import (
+    DTYPES,
+    STORE_FORMATS,
+    embedding_file_name,
+    embedding_file_paths,
+    existing_embedding_files,
+    open_embedding_file,
+    record_line,
+    remove_embedding_files,
+    write_shard,
+)
+
+# Chunks pooled across files before encoding (--window)
+DEFAULT_WINDOW = 4096
+# Chunks encoded per workers x threads split when tuning the pool (--workers auto)
+TUNING_SAMPLES = 512
+
+
+def load_embedder(
+    model_name: str, backend: str = "torch", onnx_dir: str = None
+) -> SentenceTransformer:
+    """Load a sentence-transformers model on the GPU when available.
+
+    Args:
+        model_name: sentence-transformers model name
+        backend: "torch", or "onnx"/"onnx-int8" for ONNX Runtime on CPU
+            (see embedding_backends.py)
+        onnx_dir: Export directory of the onnx backends
+    """
+    device = "cuda" if backend == "torch" and torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    if device == "cuda":
+        print(f"GPU: {torch.cuda.get_device_name(0)}")
+
+    print(f"Loading embedding model: {model_name} ({backend} backend)")
+    embedder = load_backend_model(model_name, backend, device, onnx_dir)
+    print(f"Embedding dimension: {embedder.get_sentence_embedding_dimension()}")
+    return embedder
+
+
+def tuning_texts(chunk_files: list, samples: int = TUNING_SAMPLES) -> list:
+    """Evenly spaced chunk texts of the files to embed, for tune_pool()."""
+    texts = [chunk["text"] for f in chunk_files for chunk in iter_chunks(f)]
+    step = max(1, len(texts) // samples)
+    return texts[::step][:samples]
+
+
+def load_pool(
+    model_name: str,
+    backend: str,
+    onnx_dir: str,
+    workers,
+    threads_per_worker: int,
+    batch_size: int,
+    chunk_files: list,
+    retune: bool = False,
+):
+    """Start an EmbeddingPool, or return None to encode in this process.
+
+    Args:
+        workers: Number of encoder processes, or "auto" to use the split
+            measured by tune_pool() on chunks of chunk_files
+        threads_per_worker: Intra-op threads per process (default: the
+            cores divided by workers)
+        retune: Measure again even if a tuned split is stored
+    """
+    if workers != "auto" and int(workers) <= 1:
+        return None
+    if backend == "torch" and torch.cuda.is_available():
+        print("Warning: --workers is for CPU encoding; using the GPU in this process instead")
+        return None
+    if workers == "auto":
+        texts = tuning_texts(chunk_files)
+        workers, threads_per_worker = tune_pool(
+            model_name, backend, onnx_dir, texts, batch_size, retune
+        )
+        if workers <= 1:
+            return None
+    pool = EmbeddingPool(model_name, backend, onnx_dir, int(workers), threads_per_worker)
+    print(
+        f"Encoding in {pool.workers} worker processes x {pool.threads_per_worker} threads "
+        f"({model_name}, {backend} backend)"
+    )
+    return pool
+
+
+def embed_texts(embedder: SentenceTransformer, texts: list, batch_size: int) -> np.ndarray:
+    """Encode texts to normalized embeddings (GPU-accelerated batch processing)."""
+    if isinstance(embedder, EmbeddingPool):
+        return embedder.encode(texts, batch_size)
+    embeddings = embedder.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_tensor=True,
+        normalize_embeddings=True,  # For cosine similarity
+        show_progress_bar=False,
+    )
+    return embeddings.cpu().numpy()
+
+
+def encode_cached(cache, cache_key: str, texts: list, encode) -> np.ndarray:
+    """encode(texts), taking texts found in the embedding cache from there.
+
+    Args:
+        cache: EmbeddingCache, or None to always encode
+        cache_key: Model name the cache files the vectors under
+            (embedding_backends.cache_model_key())
+        encode: Function from a list of texts to normalized embeddings
+    """
+    if cache is None:
+        return encode(texts)
+    # embed_texts() always normalizes
+    return cache.encode(cache_key, True, texts, encode)
+
+
+def _write_output(
+    output_file: Path,
+    embeddings: np.ndarray,
+    metadata_parts: list,
+    text_parts: list,
+    ids: list,
+    model_name: str,
+    dtype: str = "float32",
+):
+    """Write an npy shard or NPZ (by output_file's name) from JSON-encoded
+    metadata and texts, and remove the file's other format."""
+    if output_file.name.endswith(".npz"):
+        np.savez_compressed(
+            output_file,
+            embeddings=embeddings.astype(dtype),
+            metadata="[" + ", ".join(metadata_parts) + "]",
+            texts="[" + ", ".join(text_parts) + "]",
+            ids=json.dumps(ids),
+            model_name=model_name,
+            embedding_dim=embeddings.shape[1],
+        )
+    else:
+        write_shard(
+            output_file,
+            embeddings,
+            ids,
+            map(record_line, ids, text_parts, metadata_parts),
+            model_name,
+            dtype,
+        )
+    remove_embedding_files(output_file, keep=output_file)
+
+
+def save_embeddings(
+    output_file: Path,
+    embeddings: np.ndarray,
+    chunks: list,
+    model_name: str,
+    ids: list,
+    dtype: str = "float32",
+):
+    """Write the embedding file consumed by step 4 (see embedding_store.py)."""
+    _write_output(
+        output_file,
+        embeddings,
+        # json.dumps of the whole list joins items with ", "
+        [json.dumps(chunk["metadata"]) for chunk in chunks],
+        [json.dumps(chunk["text"]) for chunk in chunks],
+        ids,
+        model_name,
+        dtype,
+    )
+
+
+def previous_embeddings(output_file: Path, model_name: str, dtype: str = "float32") -> dict:
+    """Chunk ID → embedding of an existing embedding file written with the same model.
+
+    The file may be in either format (switching --format re-uses the
+    vectors). Returns an empty dict if there is none, if it predates chunk
+    IDs, or if it stores float16 vectors and `dtype` is float32.
+    """
+    for path in existing_embedding_files(output_file):
+        try:
+            data = open_embedding_file(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Ignoring unreadable {path}: {e}")
+            continue
+        if data.ids is None or data.model_name != model_name:
+            continue
+        if np.dtype(data.dtype).itemsize < np.dtype(dtype).itemsize:
+            continue
+        return dict(zip(data.ids, np.asarray(data.embeddings, dtype=np.float32)))
+    return {}
+
+
+def embed_missing(
+    embedder: SentenceTransformer,
+    texts: list,
+    ids: list,
+    known: dict,
+    batch_size: int,
+    skip: set = frozenset(),
+) -> tuple:
+    """Embeddings for texts, encoding only chunks whose ID is not in `known`.
+
+    Args:
+        known: Chunk ID → embedding to reuse
+        skip: Chunk IDs that need no embedding (their rows stay None)
+
+    Returns:
+        (list of embedding rows aligned with texts, number reused)
+    """
+    rows = [known.get(chunk_id) for chunk_id in ids]
+    missing = [
+        i for i, row in enumerate(rows) if row is None and ids[i] not in skip
+    ]
+    if missing:
+        new = embed_texts(embedder, [texts[i] for i in missing], batch_size)
+        for i, row in zip(missing, new):
+            rows[i] = row
+    return rows, len(rows) - len(missing)
+
+
+def apply_dedup(chunks: list, ids: list, dedup: dict) -> tuple:
+    """Drop duplicate chunks and attach source references to canonical ones.
+
+    Args:
+        chunks: Chunk dicts of one batch
+        ids: Their chunk IDs
+        dedup: Index from dedup.load_dedup_index()
+
+    Returns:
+        (remaining chunks, their IDs); canonical chunks get
+        metadata["sources"] with the source_path and page_numbers of every
+        chunk collapsed into them (their own first)
+    """
+    duplicates = dedup.get("duplicates", {})
+    references = dedup.get("references", {})
+    kept_chunks, kept_ids = [], []
+    for chunk, chunk_id in zip(chunks, ids):
+        if chunk_id in duplicates:
+            continue
+        if chunk_id in references:
+            chunk["metadata"]["sources"] = [
+                {"source_path": ref["source_path"], "page_numbers": ref["page_numbers"]}
+                for ref in references[chunk_id]
+            ]
+        kept_chunks.append(chunk)
+        kept_ids.append(chunk_id)
+    return kept_chunks, kept_ids
+
+
+def token_lengths(embedder: SentenceTransformer, texts: list) -> list:
+    """Token counts of texts as the model encodes them (truncated to max_seq_length)."""
+    encoded = embedder.tokenizer(
+        texts,
+        truncation=True,
+        max_length=embedder.max_seq_length,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def length_sorted_batches(lengths: list, batch_size: int) -> list:
+    """Index arrays of batches of texts with similar token counts, shortest first."""
+    order = np.argsort(lengths, kind="stable")
+    return [order[start : start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def encode_length_sorted(embedder: SentenceTransformer, texts: list, batch_size: int) -> np.ndarray:
+    """Encode texts in token-length-sorted batches; rows are in input order.
+
+    Every batch is padded to its longest text, so batches of similar
+    length waste little work on padding. An EmbeddingPool encodes the
+    batches in parallel.
+    """
+    batches = length_sorted_batches(token_lengths(embedder, texts), batch_size)
+    if isinstance(embedder, EmbeddingPool):
+        encoded = embedder.encode_batches([[texts[i] for i in indices] for indices in batches])
+    else:
+        encoded = (
+            embed_texts(embedder, [texts[i] for i in indices], batch_size) for indices in batches
+        )
+    embeddings = None
+    for indices, rows in zip(batches, encoded):
+        if embeddings is None:
+            embeddings = np.empty((len(texts), rows.shape[1]), dtype=rows.dtype)
+        embeddings[indices] = rows
+    return embeddings
+
+
+class ChunkFileEmbeddings:
+    """The embedding file of one chunk file, assembled batch by batch.
+
+    Texts and metadata are kept as compact JSON strings, and the file holds
+    the same data as save_embeddings() would write. Embeddings of chunks
+    whose ID is in the previous embedding file of this chunk file are
+    reused; the others are filled in by the caller.
+    """
+
+    def __init__(
+        self,
+        chunk_file: Path,
+        output_file: Path,
+        model_name: str,
+        dedup: dict = None,
+        dtype: str = "float32",
+    ):
+        self.chunk_file = chunk_file
+        self.output_file = output_file
+        self.model_name = model_name
+        self.dedup = dedup
+        self.dtype = dtype
+        self.known = previous_embeddings(output_file, model_name, dtype)
+        self.assign_id = ChunkIdAssigner(chunk_file_doc_name(chunk_file))
+        self.rows = []
+        self.ids = []
+        self.metadata_parts = []
+        self.text_parts = []
+        self.num_chunks = 0
+        self.reused = 0
+        self.unfilled = 0
+        self.read = False
+        self.error = None
+
+    def add_batch(self, batch: list) -> list:
+        """Add chunk dicts in file order.
+
+        Returns:
+            (row index, text) of the added chunks that need encoding
+        """
+        self.num_chunks += len(batch)
+        ids = [self.assign_id(chunk["text"]) for chunk in batch]
+        if self.dedup:
+            batch, ids = apply_dedup(batch, ids, self.dedup)
+
+        missing = []
+        for chunk, chunk_id in zip(batch, ids):
+            row = self.known.get(chunk_id)
+            if row is None:
+                missing.append((len(self.rows), chunk["text"]))
+            else:
+                self.reused += 1
+            self.rows.append(row)
+            self.ids.append(chunk_id)
+            self.metadata_parts.append(json.dumps(chunk["metadata"]))
+            self.text_parts.append(json.dumps(chunk["text"]))
+        self.unfilled += len(missing)
+        return missing
+
+    def fill(self, index: int, row: np.ndarray):
+        """Set the embedding of a row returned by add_batch()."""
+        self.rows[index] = row
+        self.unfilled -= 1
+
+    def write(self) -> tuple:
+        """Write the embedding file once every row is filled.
+
+        Returns:
+            (shape of the embedding matrix, number of reused embeddings,
+            number of skipped duplicates), or None if the file has no chunks.
+            Nothing is written when every chunk is a duplicate; the shape is
+            then (0, 0).
+        """
+        if not self.num_chunks:
+            return None
+        duplicates = self.num_chunks - len(self.ids)
+        if not self.ids:
+            return (0, 0), 0, duplicates
+
+        embeddings = np.stack(self.rows)
+        _write_output(
+            self.output_file,
+            embeddings,
+            self.metadata_parts,
+            self.text_parts,
+            self.ids,
+            self.model_name,
+            self.dtype,
+        )
+        return embeddings.shape, self.reused, duplicates
+
+
+def embed_chunk_file(
+    embedder: SentenceTransformer,
+    chunk_file: Path,
+    output_file: Path,
+    batch_size: int,
+    model_name: str,
+    dedup: dict = None,
+    cache=None,
+    cache_key: str = None,
+    dtype: str = "float32",
+) -> tuple:
+    """Embed a chunk file batch by batch and write its embedding file.
+
+    Only one batch of chunk dicts is alive at a time. Chunks whose ID is
+    already in the previous embedding file of this chunk file are not
+    encoded again.
+
+    Args:
+        output_file: npy shard header or NPZ (see embedding_store.py)
+        dedup: Near-duplicate index of the chunk directory (see
+            apply_dedup()); all chunks are embedded when None
+        cache: EmbeddingCache consulted before encoding, or None
+        cache_key: Model name for the cache (default: model_name)
+        dtype: "float32" or "float16" for the stored vectors
+
+    Returns:
+        See ChunkFileEmbeddings.write()
+    """
+    contents = ChunkFileEmbeddings(chunk_file, output_file, model_name, dedup, dtype)
+    for batch in iter_chunk_batches(chunk_file, batch_size):
+        missing = contents.add_batch(batch)
+        if missing:
+            rows = encode_cached(
+                cache,
+                cache_key or model_name,
+                [text for _, text in missing],
+                lambda texts: embed_texts(embedder, texts, batch_size),
+            )
+            for (index, _), row in zip(missing, rows):
+                contents.fill(index, row)
+    return contents.write()
+
+
+class EmbeddingWindow:
+    """Encodes the chunks of many files together, in length-sorted batches.
+
+    Files add the chunks they need encoded; once `size` chunks are
+    waiting, all of them are encoded at once (encode_length_sorted()) and
+    the vectors are scattered back to their files. Small files thus share
+    full batches, and each batch holds texts of similar token length.
+    """
+
+    def __init__(
+        self,
+        embedder: SentenceTransformer,
+        batch_size: int,
+        size: int,
+        cache=None,
+        cache_key: str = None,
+    ):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.size = size
+        self.cache = cache
+        self.cache_key = cache_key
+        self.texts = []
+        self.slots = []
+        self.files = []
+
+    def add_file(self, contents: ChunkFileEmbeddings):
+        """Start tracking a file; it completes once read and filled."""
+        self.files.append(contents)
+
+    def add(self, contents: ChunkFileEmbeddings, missing: list):
+        """Queue (row index, text) pairs of a file; encodes when the window is full."""
+        for index, text in missing:
+            self.slots.append((contents, index))
+            self.texts.append(text)
+        if len(self.texts) >= self.size:
+            self.flush()
+
+    def discard(self, contents: ChunkFileEmbeddings):
+        """Drop a file (e.g. after a read error) and its queued chunks."""
+        keep = [i for i, (owner, _) in enumerate(self.slots) if owner is not contents]
+        self.slots = [self.slots[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.files.remove(contents)
+
+    def flush(self):
+        """Encode all queued chunks.
+
+        An encoding error is recorded as the `error` of every file that
+        had chunks in the window.
+        """
+        if not self.texts:
+            return
+        try:
+            rows = encode_cached(
+                self.cache,
+                self.cache_key,
+                self.texts,
+                lambda texts: encode_length_sorted(self.embedder, texts, self.batch_size),
+            )
+            for (contents, index), row in zip(self.slots, rows):
+                contents.fill(index, row)
+        except Exception as e:
+            for contents, _ in self.slots:
+                contents.error = str(e)
+        self.texts = []
+        self.slots = []
+
+    def completed(self) -> list:
+        """Remove and return the files that are read and filled (or failed), in order."""
+
+        def done(contents):
+            return contents.read and (contents.error or not contents.unfilled)
+
+        finished = [f for f in self.files if done(f)]
+        self.files = [f for f in self.files if not done(f)]
+        return finished
+
+
+def _embed_per_file(
+    embedder,
+    tasks: list,
+    batch_size: int,
+    model_name: str,
+    dedup: dict,
+    cache=None,
+    cache_key: str = None,
+    dtype: str = "float32",
+):
+    """Embed (chunk_file, output_file) tasks one file at a time.
+
+    Yields:
+        (chunk_file, output_file, result of embed_chunk_file(), error)
+    """
+    for json_file, output_file in tasks:
+        try:
+            result = embed_chunk_file(
+                embedder,
+                json_file,
+                output_file,
+                batch_size,
+                model_name,
+                dedup,
+                cache,
+                cache_key,
+                dtype,
+            )
+            yield json_file, output_file, result, None
+        except Exception as e:
+            yield json_file, output_file, None, str(e)
+
+
+def _embed_windowed(
+    embedder,
+    tasks: list,
+    batch_size: int,
+    model_name: str,
+    dedup: dict,
+    window_size: int,
+    cache=None,
+    cache_key: str = None,
+    dtype: str = "float32",
+):
+    """Embed (chunk_file, output_file) tasks through one EmbeddingWindow.
+
+    Files are written as soon as all their rows are filled, so at most
+    about `window_size` chunks wait for encoding at any time.
+
+    Yields:
+        (chunk_file, output_file, result of ChunkFileEmbeddings.write(), error)
+    """
+    window = EmbeddingWindow(embedder, batch_size, window_size, cache, cache_key or model_name)
+
+    def finished():
+        for contents in window.completed():
+            if contents.error:
+                yield contents.chunk_file, contents.output_file, None, contents.error
+                continue
+            try:
+                yield contents.chunk_file, contents.output_file, contents.write(), None
+            except Exception as e:
+                yield contents.chunk_file, contents.output_file, None, str(e)
+
+    for json_file, output_file in tasks:
+        contents = ChunkFileEmbeddings(json_file, output_file, model_name, dedup, dtype)
+        window.add_file(contents)
+        try:
+            for batch in iter_chunk_batches(json_file, batch_size):
+                window.add(contents, contents.add_batch(batch))
+            contents.read = True
+        except Exception as e:
+            window.discard(contents)
+            yield json_file, output_file, None, str(e)
+            continue
+        yield from finished()
+
+    window.flush()
+    yield from finished()
 
 
 def generate_embeddings(
-    chunks_dir: str, output_dir: str, model_name: str, batch_size: int
+    chunks_dir: str,
+    output_dir: str,
+    model_name: str,
+    batch_size: int,
+    force: bool = False,
+    window: int = DEFAULT_WINDOW,
+    cache_path: str = str(DEFAULT_CACHE_PATH),
+    cache_size_mb: int = DEFAULT_MAX_SIZE_MB,
+    backend: str = "torch",
+    onnx_dir: str = None,
+    workers=1,
+    threads_per_worker: int = None,
+    retune: bool = False,
+    store_format: str = "npy",
+    dtype: str = "float32",
 ):
     """
     Generate embeddings for all chunks using sentence-transformers.
 
+    Only chunk files that changed since the last run are re-embedded, and
+    within them only chunks whose content-addressed ID (see chunk_io.py)
+    is not in the previous embedding file; embedding files of chunk files
+    that no longer exist are deleted. The model name is part of the manifest's stage
+    key, so switching models re-embeds everything.
+
+    Chunks that dedup.json (step 2) marks as near-duplicates are not
+    embedded. A chunk file is also processed again when its entries in
+    dedup.json changed, e.g. because another document now shares its
+    chunks.
+
+    By default the chunks of consecutive files are pooled in a window of
+    `window` chunks and encoded in batches sorted by token length (see
+    EmbeddingWindow), instead of one encode() call per file.
+
+    Texts are looked up in the persistent embedding cache (see
+    embedding_cache.py) before they are encoded, so text that another
+    project or an earlier chunking already embedded with this model is
+    not encoded again. Hits and misses are reported at the end. With
+    `force`, the cache is only written: every chunk is encoded and its
+    cached vector replaced.
+
+    With `workers` > 1 the batches are encoded by an EmbeddingPool of
+    pinned CPU processes; results come back in submission order, so the
+    output does not depend on the number of workers.
+
+    Embeddings are written as npy shards that step 4 memory-maps, or as
+    compressed NPZ files (see embedding_store.py). Changing the format or
+    dtype rewrites every file from its previous vectors, without encoding.
+
     Args:
         chunks_dir: Directory containing chunk JSON files
-        output_dir: Directory to save embedding NPZ files
+        output_dir: Directory to save embedding files
         model_name: Name of sentence-transformers model
         batch_size: Batch size for encoding
+        force: Re-embed every chunk, ignoring the manifest, previous files
+            and cached vectors (which are overwritten)
+        window: Chunks pooled across files before encoding; 0 encodes
+            each file on its own
+        cache_path: Embedding cache file; None disables the cache
+        cache_size_mb: Size limit of the cache file; least recently used
+            vectors are evicted beyond it
+        backend: Inference backend, "torch", "onnx" or "onnx-int8" (see
+            embedding_backends.py); embedding files record model_name either way
+        onnx_dir: Export directory of the onnx backends
+        workers: Encoder processes on CPU, or "auto" to measure the best
+            workers x threads split (stored per machine, model and backend)
+        threads_per_worker: Intra-op threads per process (default: the
+            cores divided by workers)
+        retune: With workers="auto", measure again instead of using the
+            stored split
+        store_format: "npy" (memory-mappable shards) or "npz"
+        dtype: "float32" or "float16" for the stored vectors
     """
     chunks_path = Path(chunks_dir)
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    # Check GPU availability
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"Using device: {device}")
-    if device == "cuda":
-        print(f"GPU: {torch.cuda.get_device_name(0)}")
-
-    # Load embedding model
-    print(f"Loading embedding model: {model_name}")
-    embedder = SentenceTransformer(model_name, device=device)
-    embedding_dim = embedder.get_sentence_embedding_dimension()
-    print(f"Embedding dimension: {embedding_dim}")
+    # Find all chunk files (JSON and JSON Lines)
+    json_files = find_chunk_files(chunks_path)
 
-    # Find all chunk JSON files
-    json_files = list(chunks_path.glob("*_chunks.json"))
+    manifest = StageManifest(output_path / MANIFEST_NAME, stage=f"embed:{model_name}")
+    keys = {f: f.name for f in json_files}
+    removed = manifest.remove_stale(keys.values())
+    if removed:
+        print(f"Removed embeddings of {len(removed)} deleted chunk file(s)")
 
     if not json_files:
-        print(f"No chunk JSON files found in {chunks_dir}")
+        manifest.save()
+        print(f"No chunk files found in {chunks_dir}")
         return
 
-    print(f"Found {len(json_files)} chunk files")
+    store = f"{store_format}:{dtype}"
+    dedup = load_dedup_index(chunks_path)
+    dedup_state = {
+        f: dedup["documents"].get(chunk_file_doc_name(f), "") for f in json_files
+    }
+    pending = [
+        f
+        for f in json_files
+        if force
+        or not manifest.is_current(keys[f], f)
+        or manifest.get(keys[f]).get("dedup", "") != dedup_state[f]
+        # Entries from before the npy store were float32 NPZ files
+        or manifest.get(keys[f]).get("store", "npz:float32") != store
+    ]
+    print(f"Found {len(json_files)} chunk files, {len(pending)} new or changed")
+    if not pending:
+        manifest.save()
+        return
+
+    # Load embedding model (in worker processes with --workers)
+    try:
+        check_backend(backend)
+        embedder = load_pool(
+            model_name, backend, onnx_dir, workers, threads_per_worker, batch_size, pending, retune
+        ) or load_embedder(model_name, backend, onnx_dir)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    # --force encodes every chunk again and overwrites its cached vector
+    cache = open_cache(cache_path, cache_size_mb, refresh=force)
+    cache_key = cache_model_key(model_name, backend)
 
-    # Process each file
+    # (x_chunks.json and x_chunks.jsonl both become x_chunks_embeddings.json/.npz)
+    tasks = [(f, output_path / embedding_file_name(f.stem, store_format)) for f in pending]
+    if force:
+        for _, output_file in tasks:
+            remove_embedding_files(output_file)
+    if window > 0:
+        print(f"Pooling up to {window} chunks across files into length-sorted batches")
+        results = _embed_windowed(
+            embedder, tasks, batch_size, model_name, dedup, window, cache, cache_key, dtype
+        )
+    else:
+        results = _embed_per_file(
+            embedder, tasks, batch_size, model_name, dedup, cache, cache_key, dtype
+        )
+
+    # Save each file's embeddings with metadata
     total_chunks = 0
-    for json_file in tqdm(json_files, desc="Generating embeddings"):
+    total_reused = 0
+    total_duplicates = 0
+    for json_file, output_file, result, error in tqdm(
+        results, total=len(tasks), desc="Generating embeddings"
+    ):
+        if error:
+            tqdm.write(f"  ✗ Error processing {json_file.name}: {error}")
+            continue
         try:
-            # Load chunks
-            with open(json_file, "r", encoding="utf-8") as f:
-                chunks = json.load(f)
-
-            if not chunks:
+            if result is None:
                 tqdm.write(f"  ⚠ {json_file.name}: No chunks found, skipping")
                 continue
 
-            # Extract texts
-            texts = [chunk["text"] for chunk in chunks]
-
-            # Generate embeddings (GPU-accelerated batch processing)
-            embeddings = embedder.encode(
-                texts,
-                batch_size=batch_size,
-                convert_to_tensor=True,
-                normalize_embeddings=True,  # For cosine similarity
-                show_progress_bar=False,
-            )
-
-            # Convert to numpy
-            embeddings_np = embeddings.cpu().numpy()
-
-            # Save embeddings and metadata
-            output_file = output_path / f"{json_file.stem}_embeddings.npz"
-            np.savez_compressed(
-                output_file,
-                embeddings=embeddings_np,
-                metadata=json.dumps([chunk["metadata"] for chunk in chunks]),
-                texts=json.dumps(texts),
-                model_name=model_name,
-                embedding_dim=embedding_dim,
+            shape, reused, duplicates = result
+            total_duplicates += duplicates
+            if not shape[0]:
+                # Every chunk is indexed through another document
+                remove_embedding_files(output_file)
+                manifest.record(
+                    keys[json_file], json_file, dedup=dedup_state[json_file], store=store
+                )
+                tqdm.write(f"  ✓ {json_file.name}: all {duplicates} chunks are duplicates")
+                continue
+            manifest.record(
+                keys[json_file],
+                json_file,
+                outputs=embedding_file_paths(output_file),
+                dedup=dedup_state[json_file],
+                store=store,
             )
 
-            total_chunks += len(chunks)
-            tqdm.write(
-                f"  ✓ {json_file.name}: {len(chunks)} embeddings ({embeddings_np.shape})"
-            )
+            total_chunks += shape[0] - reused
+            total_reused += reused
+            note = f", {reused} unchanged reused" if reused else ""
+            note += f", {duplicates} duplicates skipped" if duplicates else ""
+            tqdm.write(f"  ✓ {json_file.name}: {shape[0]} embeddings ({shape}{note})")
 
         except Exception as e:
             tqdm.write(f"  ✗ Error processing {json_file.name}: {e}")
 
-    print(f"\nTotal embeddings generated: {total_chunks}")
+    manifest.save()
+    if isinstance(embedder, EmbeddingPool):
+        embedder.close()
+    print(
+        f"\nTotal embeddings generated: {total_chunks} ({total_reused} unchanged chunks reused, "
+        f"{total_duplicates} near-duplicates skipped)"
+    )
+    if cache is not None:
+        print(cache.stats_line())
+        cache.close()
     print(f"Embeddings saved to: {output_path}")
     print(
         f"Next step: python 4_index_to_chromadb.py {output_dir} ./chroma_db/ --collection my_collection"
@@ -115,8 +834,8 @@ def generate_embeddings(
 
 def main():
     parser = argparse.ArgumentParser(description="Generate embeddings for chunks")
-    parser.add_argument("chunks_dir", help="Directory containing chunk JSON files")
-    parser.add_argument("output_dir", help="Directory to save embedding NPZ files")
+    parser.add_argument("chunks_dir", help="Directory containing chunk JSON/JSONL files")
+    parser.add_argument("output_dir", help="Directory to save embedding files")
     parser.add_argument(
         "--model",
         default="sentence-transformers/all-MiniLM-L6-v2",
@@ -128,14 +847,100 @@ def main():
         default=64,
         help="Batch size for encoding (default: 64, reduce to 32 if OOM errors occur)",
     )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=DEFAULT_WINDOW,
+        help="Chunks pooled across files and encoded in token-length-sorted batches; "
+        f"0 encodes each file on its own (default: {DEFAULT_WINDOW})",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Inference backend: PyTorch, or ONNX Runtime (fp32 or int8) for CPU servers; "
+        "export first with embedding_backends.py export (default: torch)",
+    )
+    parser.add_argument(
+        "--onnx-dir",
+        help="ONNX export directory (default: ~/.cache/local-rag-pipeline/onnx/<model>)",
+    )
+    parser.add_argument(
+        "--workers",
+        default="1",
+        help="Encoder processes on CPU, each pinned to its own cores; 'auto' measures "
+        "the fastest split once per machine and model (default: 1)",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        help="Intra-op threads per encoder process (default: cores / workers)",
+    )
+    parser.add_argument(
+        "--retune",
+        action="store_true",
+        help="With --workers auto, measure again instead of using the stored split",
+    )
+    parser.add_argument(
+        "--cache",
+        default=str(DEFAULT_CACHE_PATH),
+        help=f"Persistent embedding cache shared across runs and projects (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--cache-size-mb",
+        type=int,
+        default=DEFAULT_MAX_SIZE_MB,
+        help=f"Evict least recently used vectors beyond this size (default: {DEFAULT_MAX_SIZE_MB})",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Encode every chunk, bypassing the cache"
+    )
+    parser.add_argument(
+        "--format",
+        choices=STORE_FORMATS,
+        default="npy",
+        help="Embedding files: memory-mappable .npy shards with an offset-indexed records "
+        "file, or compressed NPZ (default: npy)",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=DTYPES,
+        default="float32",
+        help="Stored vector precision; float16 halves the files (default: float32)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-embed all chunks, ignoring the incremental manifest and the embedding "
+        "cache (whose vectors are replaced)",
+    )
 
     args = parser.parse_args()
 
     if not os.path.exists(args.chunks_dir):
         print(f"Error: Chunks directory not found: {args.chunks_dir}")
         sys.exit(1)
+    if args.workers != "auto" and not args.workers.isdigit():
+        print(f"Error: --workers must be a number or 'auto', got {args.workers}")
+        sys.exit(1)
 
-    generate_embeddings(args.chunks_dir, args.output_dir, args.model, args.batch_size)
+    generate_embeddings(
+        args.chunks_dir,
+        args.output_dir,
+        args.model,
+        args.batch_size,
+        args.force,
+        args.window,
+        None if args.no_cache else args.cache,
+        args.cache_size_mb,
+        args.backend,
+        args.onnx_dir,
+        args.workers,
+        args.threads_per_worker,
+        args.retune,
+        args.format,
+        args.dtype,
+    )
 
 
 if __name__ == "__main__":
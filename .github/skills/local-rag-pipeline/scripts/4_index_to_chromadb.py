@@ -3,10 +3,26 @@
 Step 4: Index embeddings to ChromaDB.
 
 Store embeddings and metadata in ChromaDB collections.
-Output: ChromaDB persistent database.
+Output: ChromaDB persistent database, or with --store hnsw a FAISS HNSW
+index per collection (see vector_store.py).
+
+Reads the embedding files of step 3 in either format (see
+embedding_store.py). Vectors of npy shards are memory-mapped, so only the
+rows of chunks the collection does not hold yet are read from disk. New
+chunks of many files are upserted together, in batches of the backend's
+maximum size, while the next files are read.
+
+With --shard-by, the chunks of each document go to the shard collection
+of its project (or other shard key) instead, and the shards are recorded
+in the database's shard registry (see shards.py); step 5 then searches
+one shard or fans out over all of them.
 
 Usage:
     python 4_index_to_chromadb.py <embeddings_dir> <chroma_db_path> --collection <name>
+                                  [--store chroma|hnsw] [--batch-size N] [--no-prefetch]
+                                  [--hnsw-space cosine|ip|l2] [--hnsw-m M]
+                                  [--hnsw-construction-ef EF] [--hnsw-search-ef EF]
+                                  [--shard-by project|doc_type] [--server] [--force]
 
 Example:
     python 4_index_to_chromadb.py ./embeddings/ ./chroma_db/ --collection legal_docs
@@ -15,122 +31,636 @@ Example:
 import sys
 import os
 import json
+import time
 import numpy as np
 import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-import chromadb
-from chromadb.config import Settings
 from tqdm import tqdm
+from manifest import StageManifest
+from chunk_io import chunk_ids
+from embedding_store import find_embedding_files, open_embedding_file
+from vector_store import HNSW_SPACES, VECTOR_STORES, database_store, hnsw_metadata, open_client, persist
+from shards import PROJECT_KEY, SHARD_KEYS, ShardRegistry, shard_collection_name, shard_value
+
+# Rows per write when the client does not report its limit
+DEFAULT_MAX_BATCH = 5000
+# Error of --shard-by project for documents without a project (see shards.py)
+NO_PROJECT = (
+    "no project; parse a single project with 1_parse_documents.py --project <projekt-id>, "
+    "or parse the documents/ root"
+)
+
 
+def chromadb_metadata(meta: dict) -> dict:
+    """Chunk metadata as stored in ChromaDB (lists become JSON strings).
 
-def index_to_chromadb(embeddings_dir: str, chroma_db_path: str, collection_name: str):
+    Canonical chunks of near-duplicates (see dedup.py) get "sources", the
+    JSON list of every document the chunk occurs in, and "has_duplicates"
+    (True), so a filename filter can include them. Other chunks get "[]"
+    and False: ChromaDB merges the metadata of an update into the stored
+    one, so a chunk that stopped being canonical must overwrite both keys.
     """
-    Index embeddings to ChromaDB collection.
+    metadata = {
+        "filename": meta.get("filename", ""),
+        "page_numbers": json.dumps(meta.get("page_numbers", [])),
+        "headings": json.dumps(meta.get("headings", [])),
+        "chunk_index": meta.get("chunk_index", 0),
+        "has_table": meta.get("has_table", False),
+        "doc_type": meta.get("doc_type", ""),
+        "sources": json.dumps(meta.get("sources", [])),
+        "has_duplicates": bool(meta.get("sources")),
+    }
+    return metadata
+
 
-    ⚠️ WARNING: Do not run multiple instances writing to the same collection!
-    ChromaDB uses SQLite backend which only supports single-writer mode.
-    For parallel indexing, use different collection names.
+def diff_chunks(collection, ids: list, old_ids: list, existing: set = None) -> tuple:
+    """Split one document's chunks into what the collection must change.
 
     Args:
-        embeddings_dir: Directory containing embedding NPZ files
-        chroma_db_path: Path to ChromaDB database
-        collection_name: Name of ChromaDB collection
+        collection: ChromaDB collection
+        ids: Chunk IDs of the document, in chunk order
+        old_ids: IDs indexed for this document before
+        existing: IDs of this document already in the collection;
+            looked up in the collection when None
+
+    Returns:
+        (stale IDs to delete, indices of new chunks, indices of kept chunks)
     """
-    embeddings_path = Path(embeddings_dir)
+    id_set = set(ids)
+    stale = [chunk_id for chunk_id in old_ids if chunk_id not in id_set]
+    if existing is None:
+        existing = set(collection.get(ids=ids, include=[])["ids"]) if ids else set()
+    new = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+    kept = [i for i, chunk_id in enumerate(ids) if chunk_id in existing]
+    return stale, new, kept
 
-    # Find all embedding NPZ files
-    npz_files = list(embeddings_path.glob("*_embeddings.npz"))
 
-    if not npz_files:
-        print(f"No embedding NPZ files found in {embeddings_dir}")
-        return
+def embedding_rows(embeddings, indices: list) -> np.ndarray:
+    """float32 (len(indices), dim) array of the given rows, for ChromaDB."""
+    return np.stack([np.asarray(embeddings[i], dtype=np.float32) for i in indices])
 
-    print(f"Found {len(npz_files)} embedding files")
 
-    # Initialize ChromaDB client
-    print(f"Initializing ChromaDB at: {chroma_db_path}")
-    client = chromadb.PersistentClient(
-        path=chroma_db_path,
-        settings=Settings(anonymized_telemetry=False, allow_reset=True),
-    )
+def sync_chunks(
+    collection,
+    ids: list,
+    embeddings,
+    documents: list,
+    metadatas: list,
+    old_ids: list,
+    existing: set = None,
+) -> tuple:
+    """Bring one document's chunks in the collection up to date.
+
+    Chunk IDs are content-addressed (see chunk_io.py), so an unchanged
+    chunk keeps its ID when text is inserted before it. IDs the document
+    no longer has are deleted, IDs the collection does not hold yet are
+    added, and the chunks in between only get their metadata refreshed
+    (chunk_index and headings may have moved).
+
+    Args:
+        collection: ChromaDB collection
+        ids: Chunk IDs of the document, in chunk order
+        embeddings: Embedding rows aligned with ids; rows of chunks in
+            `existing` are not used and may be None
+        documents: Chunk texts aligned with ids
+        metadatas: ChromaDB metadata aligned with ids
+        old_ids: IDs indexed for this document before
+        existing: IDs of this document already in the collection;
+            looked up in the collection when None
+
+    Returns:
+        (added, deleted, kept) chunk counts
+    """
+    stale, new, kept = diff_chunks(collection, ids, old_ids, existing)
+    if stale:
+        collection.delete(ids=stale)
+    if new:
+        # upsert: the same IDs may have been indexed by another tool
+        # (numbered scripts vs. stream_pipeline.py) into this collection
+        collection.upsert(
+            ids=[ids[i] for i in new],
+            embeddings=embedding_rows(embeddings, new),
+            documents=[documents[i] for i in new],
+            metadatas=[metadatas[i] for i in new],
+        )
+    if kept:
+        collection.update(
+            ids=[ids[i] for i in kept], metadatas=[metadatas[i] for i in kept]
+        )
+    return len(new), len(stale), len(kept)
+
+
+class BatchedWriter:
+    """Packs the collection writes of many files into full batches.
+
+    New chunks of consecutive files are upserted together in batches of
+    `max_batch` rows (the backend's limit), and kept chunks get their
+    metadata updated in batches of the same size; embeddings are passed
+    as float32 arrays. With `prefetch`, writes run in a background thread,
+    so the next files are read and diffed while a batch is written; at
+    most one write is in flight, and writes happen in submission order.
+
+    A file is complete once all of its writes have finished; completed()
+    reports each file with the first error of its writes, if any.
+    """
+
+    def __init__(self, collection, max_batch: int, prefetch: bool = True):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self.in_flight = None
+        self.upserts = []  # (owner, id, embedding row, document, metadata)
+        self.updates = []  # (owner, id, metadata)
+        self.remaining = {}
+        self.errors = {}
+        self.finished = []
+        self.rows_written = 0
+
+    def add_file(self, owner, stale: list, upserts: list, updates: list):
+        """Queue one file's changes (see diff_chunks()).
+
+        Args:
+            owner: Key reported by completed() for this file
+            stale: IDs to delete
+            upserts: (id, embedding row, document, metadata) of new chunks
+            updates: (id, metadata) of kept chunks
+        """
+        self.remaining[owner] = len(upserts) + len(updates) + (1 if stale else 0)
+        if not self.remaining[owner]:
+            self._finish(owner)
+        if stale:
+            self._submit(lambda: self.collection.delete(ids=stale), {owner: 1})
+        self.upserts.extend((owner, *row) for row in upserts)
+        self.updates.extend((owner, *row) for row in updates)
+        while len(self.upserts) >= self.max_batch:
+            self._write_upserts()
+        while len(self.updates) >= self.max_batch:
+            self._write_updates()
+
+    def _write_upserts(self):
+        rows, self.upserts = self.upserts[: self.max_batch], self.upserts[self.max_batch :]
+        embeddings = np.stack([np.asarray(row[2], dtype=np.float32) for row in rows])
+        self._submit(
+            lambda: self.collection.upsert(
+                ids=[row[1] for row in rows],
+                embeddings=embeddings,
+                documents=[row[3] for row in rows],
+                metadatas=[row[4] for row in rows],
+            ),
+            _row_counts(rows),
+            len(rows),
+        )
+
+    def _write_updates(self):
+        rows, self.updates = self.updates[: self.max_batch], self.updates[self.max_batch :]
+        self._submit(
+            lambda: self.collection.update(
+                ids=[row[1] for row in rows], metadatas=[row[2] for row in rows]
+            ),
+            _row_counts(rows),
+        )
 
-    # Load first file to get embedding dimension
-    first_data = np.load(npz_files[0], allow_pickle=True)
-    embedding_dim = int(first_data["embedding_dim"])
-    model_name = str(first_data["model_name"])
+    def _submit(self, write, owners: dict, rows: int = 0):
+        self._wait()
+        if self.executor is not None:
+            future = self.executor.submit(write)
+        else:
+            future = Future()
+            try:
+                future.set_result(write())
+            except Exception as e:
+                future.set_exception(e)
+        self.in_flight = (future, owners, rows)
+
+    def _wait(self):
+        if self.in_flight is None:
+            return
+        future, owners, rows = self.in_flight
+        self.in_flight = None
+        try:
+            future.result()
+            self.rows_written += rows
+            error = None
+        except Exception as e:
+            error = str(e)
+        for owner, count in owners.items():
+            if error:
+                self.errors.setdefault(owner, error)
+            self.remaining[owner] -= count
+            if not self.remaining[owner]:
+                self._finish(owner)
+
+    def _finish(self, owner):
+        del self.remaining[owner]
+        self.finished.append((owner, self.errors.pop(owner, None)))
+
+    def completed(self) -> list:
+        """(owner, error or None) of the files completed since the last call."""
+        finished, self.finished = self.finished, []
+        return finished
+
+    def close(self):
+        """Write the partial last batches and wait for every write."""
+        while self.upserts:
+            self._write_upserts()
+        while self.updates:
+            self._write_updates()
+        self._wait()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def _row_counts(rows: list) -> dict:
+    counts = {}
+    for row in rows:
+        counts[row[0]] = counts.get(row[0], 0) + 1
+    return counts
+
+
+def max_batch_size(client) -> int:
+    """Largest number of rows the client accepts in one add/upsert call."""
+    try:
+        return client.get_max_batch_size()
+    except AttributeError:
+        return DEFAULT_MAX_BATCH
+
+
+def manifest_in_sync(chroma_db_path: str, collection_names: list, manifest: StageManifest) -> bool:
+    """Whether the collections still hold every chunk the manifest records.
+
+    A collection deleted since the last run, or chunks deleted from it
+    (see 6_collection_manager.py), leave fewer rows than recorded IDs;
+    all files must then be diffed against the collection again.
+    """
+    recorded = sum(len(entry.get("ids", [])) for entry in manifest.entries.values())
+    if not recorded:
+        return True
+    client = open_client(chroma_db_path)
+    try:
+        count = sum(client.get_collection(name=name).count() for name in collection_names)
+    except Exception:
+        return False
+    return count >= recorded
+
+
+def open_collection(
+    chroma_db_path: str,
+    collection_name: str,
+    model_name: str,
+    embedding_dim: int,
+    server: bool = False,
+    store: str = None,
+    index_params: dict = None,
+):
+    """Open (or create) a collection tagged with its embedding model.
+
+    With `server`, the collection is opened through the index server of
+    the database (see index_server.py) instead of a client of this
+    process. `store` selects the vector store of a new database (see
+    vector_store.py); `index_params` are HNSW parameters of a new
+    collection (hnsw_metadata()), fixed once it exists.
+    """
+    if server:
+        from index_server import IndexClient
+
+        print(f"Connecting to the index server of: {chroma_db_path}")
+        client = IndexClient(chroma_db_path)
+    else:
+        client = open_client(chroma_db_path, store)
+        print(f"Initializing {database_store(chroma_db_path)} store at: {chroma_db_path}")
 
     print(f"Embedding model: {model_name}")
     print(f"Embedding dimension: {embedding_dim}")
 
     # Get or create collection
+    index_params = index_params or {}
     collection = client.get_or_create_collection(
         name=collection_name,
         metadata={
             "description": f"Collection for {collection_name}",
             "embedding_model": model_name,
             "embedding_dim": embedding_dim,
+            **index_params,
         },
     )
+    metadata = collection.metadata or {}
+    ignored = {key: value for key, value in index_params.items() if metadata.get(key) != value}
+    if ignored:
+        print(f"Warning: index parameters are fixed when a collection is created; ignoring {ignored}")
 
     print(f"Using collection: {collection_name}")
+    return collection
+
+
+def index_to_chromadb(
+    embeddings_dir: str,
+    chroma_db_path: str,
+    collection_name: str,
+    force: bool = False,
+    batch_size: int = None,
+    prefetch: bool = True,
+    server: bool = False,
+    store: str = None,
+    index_params: dict = None,
+    shard_by: str = None,
+):
+    """
+    Index embeddings to ChromaDB collection.
+
+    ⚠️ WARNING: Do not run multiple instances writing to the same database
+    directly! ChromaDB uses SQLite backend which only supports single-writer
+    mode. For parallel indexing, start index_server.py for the database and
+    pass `server=True` (--server) to every producer.
+
+    A per-collection manifest in the database directory records which IDs
+    each embedding file produced. Only new or changed files are indexed,
+    and within them only the chunk-level difference (see sync_chunks());
+    the IDs of embedding files that no longer exist are removed from the
+    collection.
+
+    New chunks of all files are upserted in batches of the backend's
+    maximum size, with float32 arrays instead of lists of Python floats
+    (see BatchedWriter). A file is recorded in the manifest once all of
+    its writes succeeded, so an interrupted run is simply repeated: the
+    upserts are idempotent.
 
-    # Index all embeddings
+    With `shard_by`, every embedding file goes to the shard collection of
+    its shard value (see shards.py), opened on first use and registered
+    in the shard registry; a document whose shard value changed is moved.
+    A collection already sharded keeps its shard key.
+
+    Args:
+        embeddings_dir: Directory containing embedding files of step 3
+        chroma_db_path: Path to ChromaDB database
+        collection_name: Name of ChromaDB collection
+        force: Re-index every chunk of every embedding file, ignoring the manifest
+        batch_size: Rows per write (default: the client's maximum batch size)
+        prefetch: Read and diff the next files while a batch is written
+        server: Write through the database's index server (see
+            index_server.py); the manifest is then kept per embeddings_dir
+        store: Vector store of a new database, "chroma" or "hnsw" (an
+            existing database keeps its store; see vector_store.py)
+        index_params: HNSW parameters of a new collection, as collection
+            metadata (vector_store.hnsw_metadata())
+        shard_by: Shard key, one of shards.SHARD_KEYS; None writes one
+            collection unless it is sharded already
+    """
+    embeddings_path = Path(embeddings_dir)
+    registry = ShardRegistry(chroma_db_path)
+    sharded = registry.get(collection_name)
+    if sharded and shard_by and shard_by != sharded["shard_key"]:
+        print(f"Error: Collection '{collection_name}' is sharded by {sharded['shard_key']}, not {shard_by}")
+        sys.exit(1)
+    if sharded and not shard_by:
+        shard_by = sharded["shard_key"]
+        print(f"Collection '{collection_name}' is sharded by {shard_by}")
+
+    # Find all embedding files (npy shard headers and NPZs)
+    embedding_files = find_embedding_files(embeddings_path)
+
+    if not embedding_files:
+        print(f"No embedding files found in {embeddings_dir}")
+        return
+
+    # Sharded runs keep their own manifest, so IDs never refer to the wrong collection
+    manifest_stem = f".manifest-{collection_name}" + ("-shards" if shard_by else "")
+    manifest_name = f"{manifest_stem}.json"
+    if server:
+        from index_server import producer_manifest_name
+
+        manifest_name = producer_manifest_name(manifest_stem, embeddings_dir)
+    manifest = StageManifest(Path(chroma_db_path) / manifest_name, stage=f"index:{collection_name}")
+    keys = {f: f.name for f in embedding_files}
+    pending = [f for f in embedding_files if force or not manifest.is_current(keys[f], f)]
+    stale = set(manifest.entries) - set(keys.values())
+
+    print(f"Found {len(embedding_files)} embedding files, {len(pending)} new or changed")
+
+    if shard_by:
+        shards = (registry.get(collection_name) or {}).get("shards", {})
+        values = {entry.get("shard", "") for entry in manifest.entries.values()}
+        names = [shards[value]["collection"] if value in shards else "" for value in values]
+    else:
+        names = [collection_name]
+    if len(pending) < len(embedding_files) and not manifest_in_sync(chroma_db_path, names, manifest):
+        print(f"Collection '{collection_name}' lacks indexed chunks (deleted?); checking every file")
+        pending = embedding_files
+
+    if not pending and not stale:
+        print(f"Collection '{collection_name}' is up to date")
+        return
+
+    # Open first file to get embedding dimension
+    first_data = open_embedding_file(embedding_files[0])
+    if shard_by == PROJECT_KEY:
+        records = first_data.records()
+        if records and not shard_value(records[0]["metadata"], PROJECT_KEY):
+            # Otherwise every document-type folder would become a "project"
+            print(f"Error: {embedding_files[0].name} has {NO_PROJECT}")
+            sys.exit(1)
+    # Shard value (None: unsharded) → (collection, writer), opened on first use
+    targets = {}
+
+    def target(value):
+        nonlocal batch_size
+        if value not in targets:
+            name = collection_name if value is None else shard_collection_name(collection_name, value)
+            collection = open_collection(
+                chroma_db_path,
+                name,
+                first_data.model_name,
+                first_data.embedding_dim,
+                server,
+                store,
+                index_params,
+            )
+            if value is not None:
+                registry.register(
+                    collection_name,
+                    shard_by,
+                    value,
+                    name,
+                    first_data.model_name,
+                    first_data.embedding_dim,
+                )
+            if not targets:
+                batch_size = batch_size or max_batch_size(
+                    collection.client if server else open_client(chroma_db_path)
+                )
+                print(
+                    f"Writing in batches of up to {batch_size} chunks"
+                    + (", prefetching" if prefetch else "")
+                )
+            targets[value] = (collection, BatchedWriter(collection, batch_size, prefetch))
+        return targets[value]
+
+    if not shard_by:
+        target(None)
+
+    # Remove chunks whose embedding file is gone
+    removed = manifest.remove_stale(keys.values())
+    for key, entry in removed.items():
+        if entry.get("ids"):
+            target(entry.get("shard"))[0].delete(ids=entry["ids"])
+            print(f"  - {key}: {len(entry['ids'])} chunks removed")
+
+    # Index new and changed embeddings, batched across files (and shards)
+    queued = {}
     total_indexed = 0
-    for npz_file in tqdm(npz_files, desc="Indexing to ChromaDB"):
+    total_deleted = 0
+
+    def record_completed():
+        nonlocal total_indexed, total_deleted
+        for key, error in [done for _, writer in targets.values() for done in writer.completed()]:
+            embedding_file, ids, value, added, deleted, kept = queued.pop(key)
+            if error:
+                tqdm.write(f"  ✗ Error indexing {embedding_file.name}: {error}")
+                continue
+            if value is None:
+                manifest.record(key, embedding_file, ids=ids)
+            else:
+                manifest.record(key, embedding_file, ids=ids, shard=value)
+            manifest.save()
+            total_indexed += added
+            total_deleted += deleted
+            tqdm.write(
+                f"  ✓ {embedding_file.name}: {added} added, {deleted} deleted, {kept} unchanged"
+            )
+
+    start = time.perf_counter()
+    for embedding_file in tqdm(pending, desc="Indexing to ChromaDB"):
         try:
-            # Load embeddings and metadata
-            data = np.load(npz_file, allow_pickle=True)
-            embeddings = data["embeddings"]
-            metadata_list = json.loads(str(data["metadata"]))
-            texts = json.loads(str(data["texts"]))
+            # Load metadata; vectors of npy shards stay memory-mapped
+            data = open_embedding_file(embedding_file)
+            embeddings = data.embeddings
+            records = data.records()
+            metadata_list = [record["metadata"] for record in records]
+            texts = [record["text"] for record in records]
 
-            # Generate IDs
-            doc_name = npz_file.stem.replace("_chunks_embeddings", "")
-            ids = [f"{doc_name}_chunk_{i}" for i in range(len(embeddings))]
+            # Content-addressed IDs (computed here for NPZs from before step 3 stored them)
+            if data.ids is not None:
+                ids = data.ids
+            else:
+                doc_name = embedding_file.stem.replace("_chunks_embeddings", "")
+                ids = chunk_ids(doc_name, texts)
 
             # Prepare metadata for ChromaDB (convert lists to strings)
-            chromadb_metadata = []
-            for meta in metadata_list:
-                chromadb_meta = {
-                    "filename": meta.get("filename", ""),
-                    "page_numbers": json.dumps(meta.get("page_numbers", [])),
-                    "headings": json.dumps(meta.get("headings", [])),
-                    "chunk_index": meta.get("chunk_index", 0),
-                    "has_table": meta.get("has_table", False),
-                }
-                chromadb_metadata.append(chromadb_meta)
-
-            # Add to collection (ChromaDB expects list of lists for embeddings)
-            collection.add(
-                ids=ids,
-                embeddings=embeddings.tolist(),
-                documents=texts,
-                metadatas=chromadb_metadata,
-            )
+            metadatas = [chromadb_metadata(meta) for meta in metadata_list]
 
-            total_indexed += len(embeddings)
-            tqdm.write(f"  ✓ {npz_file.name}: {len(embeddings)} chunks indexed")
+            # Diff against the previous version of this file's chunks
+            key = keys[embedding_file]
+            old_ids = manifest.get(key).get("ids", [])
+            value = None
+            if shard_by:
+                value = shard_value(metadata_list[0], shard_by) if metadata_list else ""
+                if shard_by == PROJECT_KEY and metadata_list and not value:
+                    raise ValueError(NO_PROJECT)
+            if shard_by and old_ids and manifest.get(key).get("shard") != value:
+                # Moved to another shard: drop it from the old one
+                target(manifest.get(key).get("shard"))[0].delete(ids=old_ids)
+                old_ids = []
+            collection, writer = target(value)
+            stale_ids, new, kept = diff_chunks(
+                collection, ids, old_ids, existing=set() if force else None
+            )
+            queued[key] = (embedding_file, ids, value, len(new), len(stale_ids), len(kept))
+            writer.add_file(
+                key,
+                stale_ids,
+                [(ids[i], embeddings[i], texts[i], metadatas[i]) for i in new],
+                [(ids[i], metadatas[i]) for i in kept],
+            )
 
         except Exception as e:
-            tqdm.write(f"  ✗ Error indexing {npz_file.name}: {e}")
+            tqdm.write(f"  ✗ Error indexing {embedding_file.name}: {e}")
+        record_completed()
 
-    print(f"\nTotal chunks indexed: {total_indexed}")
+    for _, writer in targets.values():
+        writer.close()
+    record_completed()
+    persist([collection for collection, _ in targets.values()])
+    seconds = time.perf_counter() - start
+
+    manifest.save()
+    print(f"\nTotal chunks indexed: {total_indexed} ({total_deleted} vanished chunks deleted)")
+    rows_written = sum(writer.rows_written for _, writer in targets.values())
+    if rows_written:
+        print(
+            f"Indexing rate: {rows_written / seconds:.0f} chunks/s "
+            f"({rows_written} chunks in {seconds:.1f}s)"
+        )
     print(f"Collection: {collection_name}")
+    if shard_by:
+        shards = registry.get(collection_name)["shards"]
+        print(f"Shards ({shard_by}): {len(shards)} collections, {len(targets)} written in this run")
     print(f"Database location: {chroma_db_path}")
     print(
         f'Next step: python 5_search_documents.py {chroma_db_path} "your query" --collection {collection_name}'
+        + (" [--shard <value>]" if shard_by else "")
     )
 
 
 def main():
     parser = argparse.ArgumentParser(description="Index embeddings to ChromaDB")
     parser.add_argument(
-        "embeddings_dir", help="Directory containing embedding NPZ files"
+        "embeddings_dir", help="Directory containing embedding files of step 3"
     )
     parser.add_argument("chroma_db_path", help="Path to ChromaDB database")
     parser.add_argument(
         "--collection", required=True, help="Name of ChromaDB collection"
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-index all embedding files, ignoring the incremental manifest",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Chunks per upsert, packed across files (default: the ChromaDB client's maximum)",
+    )
+    parser.add_argument(
+        "--no-prefetch",
+        action="store_true",
+        help="Wait for each write before reading the next files",
+    )
+    parser.add_argument(
+        "--store",
+        choices=VECTOR_STORES,
+        help="Vector store of a new database (default: chroma); an existing database "
+        "keeps its store. With --server, the index server's store is used",
+    )
+    parser.add_argument(
+        "--hnsw-space",
+        choices=HNSW_SPACES,
+        help="Distance of a new collection's index (default: l2 for chroma, ip for hnsw)",
+    )
+    parser.add_argument(
+        "--hnsw-m", type=int, help="Graph degree of a new collection's index (default: 16 / 32)"
+    )
+    parser.add_argument(
+        "--hnsw-construction-ef",
+        type=int,
+        help="Beam width while building a new collection's index (default: 100)",
+    )
+    parser.add_argument(
+        "--hnsw-search-ef",
+        type=int,
+        help="Beam width per query of a new collection (default: 10 / 64); see tune_index.py",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_KEYS,
+        help=f"One collection per value of this key: {PROJECT_KEY} (first folder of the source path, "
+        "the projekt-id) or doc_type (see shards.py)",
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Write through the index server of the database (index_server.py), "
+        "so several producers can feed one collection",
+    )
 
     args = parser.parse_args()
 
@@ -138,7 +668,30 @@ def main():
         print(f"Error: Embeddings directory not found: {args.embeddings_dir}")
         sys.exit(1)
 
-    index_to_chromadb(args.embeddings_dir, args.chroma_db_path, args.collection)
+    existing_store = database_store(args.chroma_db_path)
+    if args.store and existing_store and args.store != existing_store:
+        print(f"Error: {args.chroma_db_path} is a {existing_store} database, not {args.store}")
+        sys.exit(1)
+
+    try:
+        index_to_chromadb(
+            args.embeddings_dir,
+            args.chroma_db_path,
+            args.collection,
+            args.force,
+            args.batch_size,
+            not args.no_prefetch,
+            args.server,
+            args.store,
+            hnsw_metadata(
+                args.hnsw_space, args.hnsw_m, args.hnsw_construction_ef, args.hnsw_search_ef
+            ),
+            args.shard_by,
+        )
+    except ConnectionError as e:
+        # --server without a running index server
+        print(f"Error: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
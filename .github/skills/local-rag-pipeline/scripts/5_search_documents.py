@@ -5,20 +5,39 @@ Step 5: Search documents with two-stage retrieval.
 Vector search followed by cross-encoder reranking.
 Output: Ranked results with metadata.
 
+The database may use either vector store of step 4 (ChromaDB or the
+HNSW index, see vector_store.py); its store is detected.
+
+Query embeddings are taken from the persistent embedding cache (see
+embedding_cache.py) when the same query was encoded before; the
+embedding model is then not loaded at all.
+
+A collection sharded by step 4 (--shard-by, see shards.py) is searched
+in the shard named by --project (alias --shard, e.g. a projekt-id) only;
+without it, all shards are queried concurrently and their candidates merged by
+distance before reranking.
+
 Usage:
-    python 5_search_documents.py <chroma_db_path> "<query>" --collection <n> [--top-k K] [--rerank-candidates N]
+    python 5_search_documents.py <chroma_db_path> "<query>" --collection <n> [--project VALUE]
+                                 [--top-k K] [--rerank-candidates N]
+                                 [--cache PATH | --no-cache]
+                                 [--backend torch|onnx|onnx-int8] [--onnx-dir DIR]
 
 Example:
     python 5_search_documents.py ./chroma_db/ "What are the payment terms?" --collection legal_docs --top-k 5
+    python 5_search_documents.py ./chroma_db/ "Arbeitspakete" --collection portfolio --project proj-042
 """
 
 import sys
 import json
 import argparse
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer, CrossEncoder
+from sentence_transformers import CrossEncoder
 import torch
+from embedding_cache import DEFAULT_CACHE_PATH, open_cache
+from embedding_backends import BACKENDS, cache_model_key, check_backend, load_backend_model
+from vector_store import open_client
+from shards import ShardRegistry
+from search_filters import query_candidates
 
 
 def search_documents(
@@ -29,6 +48,11 @@ def search_documents(
     rerank_candidates: int = 20,
     reranker_model: str = "BAAI/bge-reranker-v2-m3",
     filter_filename: str = None,
+    filter_doc_type: str = None,
+    cache_path: str = str(DEFAULT_CACHE_PATH),
+    backend: str = "torch",
+    onnx_dir: str = None,
+    shard: str = None,
 ):
     """
     Search documents with two-stage retrieval.
@@ -40,57 +64,110 @@ def search_documents(
         top_k: Number of final results to return
         rerank_candidates: Number of candidates for reranking
         reranker_model: Cross-encoder model for reranking
+        filter_filename: Only search chunks of this source file
+        filter_doc_type: Only search chunks of this document type (antrag, berichte, ...)
+        cache_path: Embedding cache file; None disables the cache
+        backend: Query encoding backend, "torch", "onnx" or "onnx-int8"
+            (see embedding_backends.py)
+        onnx_dir: Export directory of the onnx backends
+        shard: Shard value to search in a sharded collection (e.g. a
+            projekt-id); None searches all shards
     """
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Using device: {device}")
 
-    print(f"Loading ChromaDB from: {chroma_db_path}")
-    client = chromadb.PersistentClient(
-        path=chroma_db_path, settings=Settings(anonymized_telemetry=False)
-    )
-
-    try:
-        collection = client.get_collection(name=collection_name)
-    except Exception as e:
-        print(f"Error: Collection '{collection_name}' not found")
-        print(f"Available collections: {[c.name for c in client.list_collections()]}")
-        sys.exit(1)
+    print(f"Loading vector store from: {chroma_db_path}")
+    client = open_client(chroma_db_path)
 
-    coll_metadata = collection.metadata
-    embedding_model_name = coll_metadata.get("embedding_model", "BAAI/bge-base-en-v1.5")
-    print(f"Collection: {collection_name}")
+    sharded = ShardRegistry(chroma_db_path).get(collection_name)
+    if sharded:
+        shards = sharded["shards"]
+        if shard is not None:
+            if shard not in shards:
+                print(f"Error: Collection '{collection_name}' has no shard '{shard}'")
+                print(f"Available shards: {sorted(shards)}")
+                sys.exit(1)
+            selected = [shard]
+        elif sharded["shard_key"] == "doc_type" and filter_doc_type:
+            # The filter names the shard
+            selected = [filter_doc_type] if filter_doc_type in shards else []
+        else:
+            selected = sorted(shards)
+        models = {shards[value]["embedding_model"] for value in selected}
+        if len(models) > 1:
+            print(f"Error: Shards of '{collection_name}' use different embedding models: {sorted(models)}")
+            print("Search one shard at a time with --shard")
+            sys.exit(1)
+        collections = [client.get_collection(name=shards[value]["collection"]) for value in selected]
+        embedding_model_name = models.pop() if models else "BAAI/bge-base-en-v1.5"
+        print(
+            f"Collection: {collection_name} (sharded by {sharded['shard_key']}, "
+            f"searching {len(collections)} of {len(shards)} shards)"
+        )
+    else:
+        if shard is not None:
+            print(f"Error: Collection '{collection_name}' is not sharded (see 4_index_to_chromadb.py --shard-by)")
+            sys.exit(1)
+        try:
+            collections = [client.get_collection(name=collection_name)]
+        except Exception as e:
+            print(f"Error: Collection '{collection_name}' not found")
+            print(f"Available collections: {[c.name for c in client.list_collections()]}")
+            sys.exit(1)
+        coll_metadata = collections[0].metadata
+        embedding_model_name = coll_metadata.get("embedding_model", "BAAI/bge-base-en-v1.5")
+        print(f"Collection: {collection_name}")
+    total_chunks = sum(collection.count() for collection in collections)
     print(f"Embedding model: {embedding_model_name}")
-    print(f"Total chunks: {collection.count()}")
+    print(f"Total chunks: {total_chunks}")
+    if not total_chunks:
+        print("No results found")
+        return
 
-    print(f"\n[Stage 1] Loading embedding model...")
-    embedder = SentenceTransformer(
-        embedding_model_name, device=device, local_files_only=True
-    )
+    def encode(texts):
+        print(f"\n[Stage 1] Loading embedding model...")
+        embedder = load_backend_model(
+            embedding_model_name, backend, device, onnx_dir, local_files_only=True
+        )
+        print(f"Generating query embedding...")
+        embeddings = embedder.encode(
+            texts, convert_to_tensor=True, normalize_embeddings=True
+        )
+        return embeddings.cpu().numpy()
 
-    print(f"Generating query embedding...")
-    query_embedding = embedder.encode(
-        [query], convert_to_tensor=True, normalize_embeddings=True
-    )
+    cache = open_cache(cache_path)
+    if cache is None:
+        query_embedding = encode([query])
+    else:
+        query_embedding = cache.encode(
+            cache_model_key(embedding_model_name, backend), True, [query], encode
+        )
+        print(cache.stats_line())
+        cache.close()
 
     print(
         f"\n[Stage 1] Vector search (retrieving top-{rerank_candidates} candidates)..."
     )
 
-    query_params = {
-        "query_embeddings": query_embedding.cpu().numpy().tolist(),
-        "n_results": min(rerank_candidates, collection.count()),
-    }
-
     if filter_filename:
-        query_params["where"] = {"filename": {"$eq": filter_filename}}
+        # Includes chunks collapsed into canonical chunks of other files (see search_filters.py)
         print(f"Filtering by filename: {filter_filename}")
+    if filter_doc_type:
+        print(f"Filtering by document type: {filter_doc_type}")
 
-    results = collection.query(**query_params)
+    # Shards are queried concurrently and their candidates merged by distance
+    results = query_candidates(
+        collections,
+        query_embedding.tolist(),
+        rerank_candidates,
+        filter_filename,
+        filter_doc_type,
+    )
 
     if not results["documents"][0]:
         print(
-            f"No documents found for filename: {filter_filename}"
-            if filter_filename
+            "No documents found for the given filters"
+            if filter_filename or filter_doc_type
             else "No results found"
         )
         return
@@ -122,9 +199,19 @@ def search_documents(
         page_numbers = json.loads(meta.get("page_numbers", "[]"))
         headings = json.loads(meta.get("headings", "[]"))
         has_table = meta.get("has_table", False)
+        doc_type = meta.get("doc_type", "")
+        shard_name = meta.get("shard", "")
+        # Near-duplicates collapsed into this chunk (dedup.py); first is itself
+        sources = json.loads(meta.get("sources", "[]"))
 
         print(f"[Rank {rank}] Score: {score:.4f}")
         print(f"Source: {filename} (Pages: {page_numbers if page_numbers else 'N/A'})")
+        if doc_type:
+            print(f"Type: {doc_type}")
+        if shard_name:
+            print(f"Shard: {shard_name}")
+        for source in sources[1:]:
+            print(f"Also in: {source['source_path']} (Pages: {source['page_numbers'] or 'N/A'})")
         if headings:
             print(f"Context: {' > '.join(headings)}")
         if has_table:
@@ -144,6 +231,13 @@ def main():
     parser.add_argument(
         "--collection", required=True, help="Name of collection to search"
     )
+    parser.add_argument(
+        "--shard",
+        "--project",
+        dest="shard",
+        metavar="VALUE",
+        help="Search only this shard of a sharded collection, e.g. a projekt-id (default: all shards)",
+    )
     parser.add_argument(
         "--top-k", type=int, default=5, help="Number of final results (default: 5)"
     )
@@ -162,9 +256,37 @@ def main():
         "--filter-filename",
         help="Filter results by source filename",
     )
+    parser.add_argument(
+        "--filter-doc-type",
+        help="Filter results by document type (subfolder, e.g. antrag, berichte)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=str(DEFAULT_CACHE_PATH),
+        help=f"Persistent embedding cache (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always encode the query"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Query encoding backend (ONNX backends need embedding_backends.py export) (default: torch)",
+    )
+    parser.add_argument(
+        "--onnx-dir",
+        help="ONNX export directory (default: ~/.cache/local-rag-pipeline/onnx/<model>)",
+    )
 
     args = parser.parse_args()
 
+    try:
+        check_backend(args.backend)
+    except ImportError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
     search_documents(
         args.chroma_db_path,
         args.query,
@@ -173,6 +295,11 @@ def main():
         args.rerank_candidates,
         args.reranker,
         args.filter_filename,
+        args.filter_doc_type,
+        None if args.no_cache else args.cache,
+        args.backend,
+        args.onnx_dir,
+        args.shard,
     )
 
 
@@ -2,7 +2,14 @@
 """
 Step 6: Manage ChromaDB collections.
 
-List, inspect, and delete collections.
+List, inspect, and delete collections (of either vector store, see
+vector_store.py). Deleting a sharded collection (see shards.py) deletes
+all of its shard collections.
+
+Deletes also update the incremental manifests of step 4 and
+stream_pipeline.py in the database directory: a deleted collection's
+manifests are removed, and files whose chunks were deleted are dropped
+from them, so the next indexing run restores what it should.
 
 Usage:
     python 6_collection_manager.py <chroma_db_path> --list
@@ -19,18 +26,74 @@ Examples:
     python 6_collection_manager.py ./chroma_db/ --delete-source report.pdf --collection vw_reports
 """
 
+import re
 import sys
 import json
 import argparse
-import chromadb
-from chromadb.config import Settings
+from pathlib import Path
+from manifest import StageManifest
+from vector_store import open_client
+from shards import ShardRegistry
+
+
+def collection_manifests(chroma_db_path: str, collection_name: str, sharded: bool = False) -> list:
+    """Manifest files of step 4 and stream_pipeline.py for one collection.
+
+    Covers the per-producer manifests of the index server (name plus a
+    source directory hash, see index_server.py); with `sharded`, the
+    manifests of the sharded collection instead (step 4 --shard-by).
+    """
+    suffix = "-shards" if sharded else ""
+    pattern = re.compile(
+        rf"^\.manifest-(stream-)?{re.escape(collection_name)}{suffix}(-[0-9a-f]{{8}})?\.json$"
+    )
+    path = Path(chroma_db_path)
+    if not path.is_dir():
+        return []
+    return sorted(p for p in path.iterdir() if pattern.match(p.name))
+
+
+def manifest_owner(chroma_db_path: str, collection_name: str) -> tuple:
+    """(collection whose manifests index this one, shard value or None).
+
+    A shard collection is indexed through the manifests of its sharded
+    collection (see shards.py).
+    """
+    for base, entry in ShardRegistry(chroma_db_path).entries().items():
+        for value, shard in entry["shards"].items():
+            if shard["collection"] == collection_name:
+                return base, value
+    return collection_name, None
+
+
+def forget_indexed(chroma_db_path: str, collection_name: str, ids: list = None):
+    """Update the manifests after a delete from a collection.
+
+    Files that produced any of `ids` are dropped from the manifests, so
+    the next indexing run indexes them again; with `ids` None (the whole
+    collection was deleted) every file indexed into it is dropped.
+    """
+    base, value = manifest_owner(chroma_db_path, collection_name)
+    ids = None if ids is None else set(ids)
+    for path in collection_manifests(chroma_db_path, base, sharded=value is not None):
+        manifest = StageManifest.load(path)
+        dropped = [
+            key
+            for key, entry in manifest.entries.items()
+            if (value is None or entry.get("shard") == value)
+            and (ids is None or ids.intersection(entry.get("ids", [])))
+        ]
+        if not dropped:
+            continue
+        for key in dropped:
+            del manifest.entries[key]
+        manifest.save()
+        print(f"  Manifest {path.name}: {len(dropped)} file(s) will be re-indexed on the next run")
 
 
 def list_collections(chroma_db_path: str):
     """List all collections in the database."""
-    client = chromadb.PersistentClient(
-        path=chroma_db_path, settings=Settings(anonymized_telemetry=False)
-    )
+    client = open_client(chroma_db_path)
 
     collections = client.list_collections()
 
@@ -46,14 +109,15 @@ def list_collections(chroma_db_path: str):
         if coll.metadata:
             for key, value in coll.metadata.items():
                 print(f"   {key}: {value}")
+
+    for name, sharded in sorted(ShardRegistry(chroma_db_path).entries().items()):
+        print(f"\n🗂  {name}: sharded by {sharded['shard_key']} into {len(sharded['shards'])} collections")
     print("=" * 80)
 
 
 def collection_info(chroma_db_path: str, collection_name: str):
     """Display detailed information about a collection."""
-    client = chromadb.PersistentClient(
-        path=chroma_db_path, settings=Settings(anonymized_telemetry=False)
-    )
+    client = open_client(chroma_db_path)
 
     try:
         collection = client.get_collection(name=collection_name)
@@ -90,9 +154,7 @@ def collection_info(chroma_db_path: str, collection_name: str):
 
 def delete_documents_by_ids(chroma_db_path: str, collection_name: str, doc_ids: list):
     """Delete specific documents by their IDs."""
-    client = chromadb.PersistentClient(
-        path=chroma_db_path, settings=Settings(anonymized_telemetry=False)
-    )
+    client = open_client(chroma_db_path)
 
     try:
         collection = client.get_collection(name=collection_name)
@@ -114,14 +176,13 @@ def delete_documents_by_ids(chroma_db_path: str, collection_name: str, doc_ids:
         return
 
     collection.delete(ids=existing_ids)
+    forget_indexed(chroma_db_path, collection_name, existing_ids)
     print(f"✓ {len(existing_ids)} document(s) deleted successfully")
 
 
 def delete_documents_by_source(chroma_db_path: str, collection_name: str, source: str):
     """Delete all documents from a specific source file."""
-    client = chromadb.PersistentClient(
-        path=chroma_db_path, settings=Settings(anonymized_telemetry=False)
-    )
+    client = open_client(chroma_db_path)
 
     try:
         collection = client.get_collection(name=collection_name)
@@ -145,14 +206,18 @@ def delete_documents_by_source(chroma_db_path: str, collection_name: str, source
         return
 
     collection.delete(ids=doc_ids)
+    forget_indexed(chroma_db_path, collection_name, doc_ids)
     print(f"✓ {len(doc_ids)} document(s) from '{source}' deleted successfully")
 
 
 def delete_collection(chroma_db_path: str, collection_name: str):
     """Delete a collection from the database."""
-    client = chromadb.PersistentClient(
-        path=chroma_db_path, settings=Settings(anonymized_telemetry=False)
-    )
+    client = open_client(chroma_db_path)
+    registry = ShardRegistry(chroma_db_path)
+    sharded = registry.get(collection_name)
+    if sharded:
+        delete_sharded_collection(chroma_db_path, client, registry, collection_name, sharded)
+        return
 
     try:
         collection = client.get_collection(name=collection_name)
@@ -166,6 +231,14 @@ def delete_collection(chroma_db_path: str, collection_name: str):
             return
 
         client.delete_collection(name=collection_name)
+        base, value = manifest_owner(chroma_db_path, collection_name)
+        if value is None:
+            for path in collection_manifests(chroma_db_path, collection_name):
+                path.unlink()
+        else:
+            # A single shard of a sharded collection
+            forget_indexed(chroma_db_path, collection_name)
+            registry.unregister(base, value)
         print(f"✓ Collection '{collection_name}' deleted successfully")
 
     except Exception as e:
@@ -173,6 +246,30 @@ def delete_collection(chroma_db_path: str, collection_name: str):
         sys.exit(1)
 
 
+def delete_sharded_collection(
+    chroma_db_path: str, client, registry: ShardRegistry, collection_name: str, sharded: dict
+):
+    """Delete every shard collection of a sharded collection."""
+    shards = sharded["shards"]
+    existing = {c.name for c in client.list_collections()}
+    names = [shard["collection"] for shard in shards.values() if shard["collection"] in existing]
+    count = sum(client.get_collection(name=name).count() for name in names)
+
+    response = input(
+        f"\n⚠️  Delete sharded collection '{collection_name}' ({len(names)} shards, {count} chunks)? (yes/no): "
+    )
+    if response.lower() != "yes":
+        print("Deletion cancelled")
+        return
+
+    for name in names:
+        client.delete_collection(name=name)
+    registry.unregister(collection_name)
+    for path in collection_manifests(chroma_db_path, collection_name, sharded=True):
+        path.unlink()
+    print(f"✓ Sharded collection '{collection_name}' ({len(names)} shards) deleted successfully")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Manage ChromaDB collections")
     parser.add_argument("chroma_db_path", help="Path to ChromaDB database")
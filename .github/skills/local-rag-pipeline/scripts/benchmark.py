@@ -0,0 +1,730 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for pipeline storage formats and stages.
+
+Each measurement that reports memory runs in a fresh subprocess, so peak
+RSS (ru_maxrss) is not polluted by earlier measurements. Peak RSS includes
+the interpreter and library imports, which are the same for all variants.
+
+Usage:
+    python benchmark.py docling-load <parsed_dir> [--repeat N]
+    python benchmark.py chunk-provenance <parsed_dir> [--embedding-model MODEL]
+                                         [--format json|jsonl] [--repeat N]
+    python benchmark.py embed-batching <chunks_dir> [--model MODEL] [--batch-size N]
+                                       [--window CHUNKS] [--device cpu|cuda] [--repeat N]
+    python benchmark.py embed-backends <chunks_dir> [--model MODEL] [--onnx-dir DIR]
+                                       [--batch-size N] [--samples N] [--repeat N]
+    python benchmark.py index-batching <embeddings_dir> [--batch-size N] [--repeat N]
+    python benchmark.py vector-stores <embeddings_dir> [--stores chroma hnsw] [--queries N]
+                                      [--top-k K] [--repeat N]
+
+Example:
+    python benchmark.py docling-load .rag/parsed/ --repeat 3
+    python benchmark.py chunk-provenance .rag/parsed/
+    python benchmark.py embed-batching .rag/chunks/ --device cpu
+    python benchmark.py embed-backends .rag/chunks/ --samples 2000
+    python benchmark.py index-batching .rag/embeddings/
+    python benchmark.py vector-stores .rag/embeddings/ --queries 500
+"""
+
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process.
+
+    VmHWM where /proc exists: ru_maxrss also keeps the peak of the parent
+    at the time of the fork, which is large when the parent holds vectors.
+    """
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / 1e6
+
+
+def _run_probe(*args) -> dict:
+    """Run this script's hidden probe command in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, __file__, "_probe", *map(str, args)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _probe(kind: str, path: str, options: str = "{}"):
+    """Measure one operation in this (fresh) process and print JSON."""
+    options = json.loads(options)
+    if kind == "store-build":
+        import importlib
+        from vector_store import HnswClient, open_client
+
+        index_stage = importlib.import_module("4_index_to_chromadb")
+        files = _index_files(path, index_stage)
+        start = time.perf_counter()
+        client = open_client(options["db"], options["store"])
+        collection = client.get_or_create_collection(name="bench")
+        writer = index_stage.BatchedWriter(collection, index_stage.max_batch_size(client))
+        for n, (ids, embeddings, texts, metadatas) in enumerate(files):
+            rows = [(ids[i], embeddings[i], texts[i], metadatas[i]) for i in range(len(ids))]
+            writer.add_file(n, [], rows, [])
+        writer.close()
+        if isinstance(client, HnswClient):
+            client.close()  # the index file is part of the build
+        seconds = time.perf_counter() - start
+        print(json.dumps({"seconds": seconds, "peak_rss_mb": _peak_rss_mb()}))
+    elif kind == "store-query":
+        import numpy as np
+        from vector_store import open_client
+
+        queries = np.load(options["queries"])
+        baseline = _peak_rss_mb()
+        # The first query includes opening the collection and its index
+        start = time.perf_counter()
+        collection = open_client(path).get_collection("bench")
+        results = [collection.query(query_embeddings=queries[:1], n_results=options["top_k"])]
+        first = time.perf_counter() - start
+        latencies = []
+        for query in queries[1:]:
+            start = time.perf_counter()
+            results.append(collection.query(query_embeddings=query[None], n_results=options["top_k"]))
+            latencies.append(time.perf_counter() - start)
+        print(
+            json.dumps(
+                {
+                    "first_ms": first * 1000,
+                    "latencies_ms": [seconds * 1000 for seconds in latencies],
+                    "rss_delta_mb": _peak_rss_mb() - baseline,
+                    "ids": [result["ids"][0] for result in results],
+                }
+            )
+        )
+    elif kind == "docling-load":
+        from docling_store import load_document
+        from docling_core.types.doc import DoclingDocument  # noqa: F401 (baseline)
+
+        # Imports are identical for every format, so the absolute peak is
+        # comparable across formats; ru_maxrss is in KiB on Linux
+        start = time.perf_counter()
+        doc = load_document(Path(path))
+        seconds = time.perf_counter() - start
+        peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(
+            json.dumps(
+                {
+                    "seconds": seconds,
+                    "peak_rss_mb": peak_kib / 1024,
+                    "num_texts": len(doc.texts),
+                }
+            )
+        )
+    else:
+        raise ValueError(f"Unknown probe: {kind}")
+
+
+def bench_docling_load(parsed_dir: str, repeat: int):
+    """Compare load time and peak RSS of pickle vs. JSON container."""
+    from docling_store import find_parsed_documents, load_document, save_document
+
+    doc_files = find_parsed_documents(Path(parsed_dir))
+    if not doc_files:
+        print(f"No parsed documents found in {parsed_dir}")
+        return
+
+    print(f"Benchmarking {len(doc_files)} documents, {repeat} run(s) each\n")
+    results = {"pickle": [], "json": []}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, doc_file in enumerate(doc_files):
+            doc = load_document(doc_file)
+            for fmt in results:
+                fmt_dir = Path(tmp) / fmt / str(i)
+                fmt_dir.mkdir(parents=True)
+                stored = save_document(doc, fmt_dir, fmt)
+
+                runs = [_run_probe("docling-load", stored) for _ in range(repeat)]
+                results[fmt].append(
+                    {
+                        "doc": doc_file.parent.name,
+                        "bytes": stored.stat().st_size,
+                        "seconds": statistics.median(r["seconds"] for r in runs),
+                        "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                    }
+                )
+
+    print(
+        f"{'Format':<8} {'Size (MB)':>10} {'Load total (s)':>15} "
+        f"{'Load max (s)':>13} {'Peak RSS max (MB)':>18}"
+    )
+    print("-" * 68)
+    for fmt, rows in results.items():
+        print(
+            f"{fmt:<8} "
+            f"{sum(r['bytes'] for r in rows) / 1e6:>10.2f} "
+            f"{sum(r['seconds'] for r in rows):>15.3f} "
+            f"{max(r['seconds'] for r in rows):>13.3f} "
+            f"{max(r['peak_rss_mb'] for r in rows):>18.1f}"
+        )
+
+    slowest = max(results["pickle"], key=lambda r: r["seconds"])
+    print(f"\nSlowest pickle load: {slowest['doc']} ({slowest['seconds']:.3f}s)")
+
+
+def bench_chunk_provenance(parsed_dir: str, model_name: str, chunk_format: str, repeat: int):
+    """Compare inline bboxes vs. provenance sidecar: size, write and read time.
+
+    Documents are chunked once; each layout then extracts metadata from the
+    same chunks and writes its files (the step 2 work that differs), and
+    reads the chunk files back (the step 3 load; sidecars are only read
+    when boxes are needed).
+    """
+    import importlib
+    from tqdm import tqdm
+    from docling_store import find_parsed_documents, load_document
+    from embedding_models import token_limits
+    from chunk_io import (
+        chunk_file_name,
+        iter_chunks,
+        provenance_file_name,
+        save_provenance,
+        write_chunks,
+    )
+
+    chunk_stage = importlib.import_module("2_chunk_documents")
+
+    doc_files = find_parsed_documents(Path(parsed_dir))
+    if not doc_files:
+        print(f"No parsed documents found in {parsed_dir}")
+        return
+
+    _, budget = token_limits(model_name)
+    chunker = chunk_stage.create_chunker(budget, model_name)
+    docs = [
+        (str(i), list(chunker.chunk(load_document(doc_file))))
+        for i, doc_file in enumerate(tqdm(doc_files, desc="Chunking documents"))
+    ]
+    num_chunks = sum(len(chunks) for _, chunks in docs)
+    num_boxes = sum(
+        len(chunk_stage.extract_metadata(chunk)[1]) for _, chunks in docs for chunk in chunks
+    )
+    print(
+        f"\n{len(docs)} documents, {num_chunks} chunks, {num_boxes} boxes, "
+        f"{chunk_format} chunk files, {repeat} run(s) each\n"
+    )
+
+    def write(out_dir: Path, layout: str):
+        for name, chunks in docs:
+            records = []
+            provenance = []
+            for idx, chunk in enumerate(chunks):
+                metadata, boxes = chunk_stage.extract_metadata(chunk)
+                metadata["chunk_index"] = idx
+                if layout == "inline":
+                    metadata["bboxes"] = [
+                        {"l": l, "t": t, "r": r, "b": b} for _, l, t, r, b in boxes
+                    ]
+                else:
+                    provenance.append(boxes)
+                records.append({"text": chunk.text, "metadata": metadata})
+            write_chunks(out_dir / chunk_file_name(name, chunk_format), records)
+            if layout == "sidecar":
+                save_provenance(out_dir / provenance_file_name(name), provenance)
+
+    def read(out_dir: Path):
+        for name, _ in docs:
+            for _ in iter_chunks(out_dir / chunk_file_name(name, chunk_format)):
+                pass
+
+    print(
+        f"{'Layout':<8} {'Size (MB)':>10} {'Write (s)':>10} {'Read (s)':>9} "
+        f"{'Write chunks/s':>15} {'Read chunks/s':>14}"
+    )
+    print("-" * 71)
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in ("inline", "sidecar"):
+            out_dir = Path(tmp) / layout
+            out_dir.mkdir()
+            write_times = []
+            read_times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                write(out_dir, layout)
+                write_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                read(out_dir)
+                read_times.append(time.perf_counter() - start)
+
+            size = sum(f.stat().st_size for f in out_dir.iterdir())
+            write_s = statistics.median(write_times)
+            read_s = statistics.median(read_times)
+            print(
+                f"{layout:<8} {size / 1e6:>10.2f} {write_s:>10.3f} {read_s:>9.3f} "
+                f"{num_chunks / write_s:>15.0f} {num_chunks / read_s:>14.0f}"
+            )
+
+
+def bench_embed_batching(
+    chunks_dir: str, model_name: str, batch_size: int, window: int, device: str, repeat: int
+):
+    """Compare per-file encoding with cross-file, length-sorted batches (step 3).
+
+    Per file: one encode() call per chunk file, as before --window.
+    sentence-transformers sorts by characters within each call, so small
+    files give underfilled batches. Windowed: chunks of consecutive files
+    pooled into windows of `window` chunks and encoded in batches sorted by
+    token length (3_generate_embeddings.encode_length_sorted()).
+
+    Padding is the share of padded positions in all batches (each batch
+    is padded to its longest text), computed with the model's tokenizer.
+    """
+    import importlib
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    from chunk_io import find_chunk_files, iter_chunks
+
+    embed_stage = importlib.import_module("3_generate_embeddings")
+
+    files = [[c["text"] for c in iter_chunks(f)] for f in find_chunk_files(Path(chunks_dir))]
+    files = [texts for texts in files if texts]
+    if not files:
+        print(f"No chunk files found in {chunks_dir}")
+        return
+    texts = [text for file_texts in files for text in file_texts]
+
+    print(f"Loading {model_name} on {device}...")
+    embedder = SentenceTransformer(model_name, device=device)
+    lengths = embed_stage.token_lengths(embedder, texts)
+
+    def padding(batches: list) -> tuple:
+        real = sum(sum(lengths[i] for i in batch) for batch in batches)
+        padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+        return len(batches), 1 - real / padded
+
+    # Batches as encode() forms them per file: longest characters first
+    per_file_batches = []
+    offset = 0
+    for file_texts in files:
+        order = sorted(range(len(file_texts)), key=lambda i: -len(file_texts[i]))
+        per_file_batches.extend(
+            [offset + i for i in order[start : start + batch_size]]
+            for start in range(0, len(order), batch_size)
+        )
+        offset += len(file_texts)
+    windowed_batches = []
+    for start in range(0, len(texts), window):
+        windowed_batches.extend(
+            start + batch
+            for batch in embed_stage.length_sorted_batches(
+                lengths[start : start + window], batch_size
+            )
+        )
+
+    def per_file():
+        return np.concatenate(
+            [embed_stage.embed_texts(embedder, file_texts, batch_size) for file_texts in files]
+        )
+
+    def windowed():
+        return np.concatenate(
+            [
+                embed_stage.encode_length_sorted(embedder, texts[start : start + window], batch_size)
+                for start in range(0, len(texts), window)
+            ]
+        )
+
+    print(
+        f"\n{len(files)} chunk files, {len(texts)} chunks "
+        f"(median {statistics.median(lengths):.0f} tokens), batch size {batch_size}, "
+        f"window {window}, {repeat} run(s) each\n"
+    )
+    print(f"{'Mode':<10} {'Batches':>8} {'Padding':>8} {'Time (s)':>9} {'Chunks/s':>9}")
+    print("-" * 48)
+    results = {}
+    for mode, run, batches in (
+        ("per-file", per_file, per_file_batches),
+        ("windowed", windowed, windowed_batches),
+    ):
+        run()  # warm-up
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[mode] = run()
+            times.append(time.perf_counter() - start)
+        seconds = statistics.median(times)
+        num_batches, pad = padding(batches)
+        print(
+            f"{mode:<10} {num_batches:>8} {pad:>8.1%} {seconds:>9.2f} {len(texts) / seconds:>9.1f}"
+        )
+
+    diff = np.abs(results["per-file"] - results["windowed"]).max()
+    print(f"\nMax. difference between the embeddings: {diff:.2e}")
+
+
+def bench_embed_backends(
+    chunks_dir: str, model_name: str, onnx_dir: str, batch_size: int, samples: int, repeat: int
+):
+    """CPU throughput of each embedding backend and its agreement with PyTorch.
+
+    Every backend encodes the same chunks in the length-sorted batches of
+    step 3. Backends without an export (embedding_backends.py export) are
+    skipped.
+    """
+    import importlib
+    from embedding_backends import BACKENDS, cosine_agreement, load_backend_model, parity_texts
+
+    embed_stage = importlib.import_module("3_generate_embeddings")
+
+    texts = parity_texts(chunks_dir, samples)
+    if not texts:
+        print(f"No chunk files found in {chunks_dir}")
+        return
+    print(f"\n{len(texts)} chunks, batch size {batch_size}, {repeat} run(s) each, CPU\n")
+    print(f"{'Backend':<10} {'Time (s)':>9} {'Chunks/s':>9} {'Speedup':>8} {'Cos min':>9} {'Cos mean':>9}")
+    print("-" * 59)
+
+    reference = None
+    reference_seconds = None
+    for backend in BACKENDS:
+        try:
+            embedder = load_backend_model(model_name, backend, "cpu", onnx_dir)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"{backend:<10} skipped: {e}")
+            continue
+        embed_stage.encode_length_sorted(embedder, texts[:batch_size], batch_size)  # warm-up
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            embeddings = embed_stage.encode_length_sorted(embedder, texts, batch_size)
+            times.append(time.perf_counter() - start)
+        seconds = statistics.median(times)
+        if reference is None:
+            reference, reference_seconds = embeddings, seconds
+        agreement = cosine_agreement(reference, embeddings)
+        print(
+            f"{backend:<10} {seconds:>9.2f} {len(texts) / seconds:>9.1f} "
+            f"{reference_seconds / seconds:>7.2f}x {agreement.min():>9.5f} {agreement.mean():>9.5f}"
+        )
+
+
+def _index_files(embeddings_dir: str, index_stage) -> list:
+    """(ids, embeddings, texts, metadatas) of each embedding file with chunk IDs."""
+    from embedding_store import find_embedding_files, open_embedding_file
+
+    files = []
+    for path in find_embedding_files(Path(embeddings_dir)):
+        data = open_embedding_file(path)
+        if data.ids is None:
+            continue
+        records = data.records()
+        files.append(
+            (
+                data.ids,
+                data.embeddings,
+                [record["text"] for record in records],
+                [index_stage.chromadb_metadata(record["metadata"]) for record in records],
+            )
+        )
+    return files
+
+
+def bench_index_batching(embeddings_dir: str, batch_size: int, repeat: int):
+    """Compare per-file indexing with batched upserts across files (step 4).
+
+    Every mode indexes all embedding files into a new collection in a
+    temporary database. Per file: one upsert per file with the vectors as
+    lists of Python floats, as before BatchedWriter. Batched: rows of
+    consecutive files packed into upserts of the client's maximum batch
+    size (or --batch-size) with float32 arrays, without and with writing
+    in the background while the next files are read.
+    """
+    import importlib
+    import shutil
+    import numpy as np
+    from vector_store import open_client
+
+    index_stage = importlib.import_module("4_index_to_chromadb")
+
+    files = _index_files(embeddings_dir, index_stage)
+    if not files:
+        print(f"No embedding files with chunk IDs found in {embeddings_dir}")
+        return
+    total = sum(len(ids) for ids, _, _, _ in files)
+    dim = files[0][1].shape[1]
+
+    def per_file(collection, max_batch, prefetch):
+        for ids, embeddings, texts, metadatas in files:
+            collection.upsert(
+                ids=ids,
+                embeddings=np.asarray(embeddings).tolist(),
+                documents=texts,
+                metadatas=metadatas,
+            )
+
+    def batched(collection, max_batch, prefetch):
+        writer = index_stage.BatchedWriter(collection, max_batch, prefetch)
+        for n, (ids, embeddings, texts, metadatas) in enumerate(files):
+            rows = [(ids[i], embeddings[i], texts[i], metadatas[i]) for i in range(len(ids))]
+            writer.add_file(n, [], rows, [])
+        writer.close()
+        errors = [error for _, error in writer.completed() if error]
+        if errors:
+            raise RuntimeError(errors[0])
+
+    print(f"\n{len(files)} embedding files, {total} chunks, dim {dim}, {repeat} run(s) each\n")
+    print(f"{'Mode':<18} {'Batch':>6} {'Time (s)':>9} {'Chunks/s':>9} {'Speedup':>8}")
+    print("-" * 54)
+    reference = None
+    for mode, run, prefetch in (
+        ("per-file", per_file, False),
+        ("batched", batched, False),
+        ("batched+prefetch", batched, True),
+    ):
+        times = []
+        for _ in range(repeat):
+            db_dir = tempfile.mkdtemp(prefix="bench-index-")
+            try:
+                client = open_client(db_dir, "chroma")
+                max_batch = batch_size or index_stage.max_batch_size(client)
+                collection = client.get_or_create_collection(name="bench")
+                start = time.perf_counter()
+                run(collection, max_batch, prefetch)
+                times.append(time.perf_counter() - start)
+            finally:
+                shutil.rmtree(db_dir, ignore_errors=True)
+        seconds = statistics.median(times)
+        reference = reference or seconds
+        batch = "file" if run is per_file else str(max_batch)
+        print(
+            f"{mode:<18} {batch:>6} {seconds:>9.2f} {total / seconds:>9.0f} "
+            f"{reference / seconds:>7.2f}x"
+        )
+
+
+def bench_vector_stores(embeddings_dir: str, stores: list, num_queries: int, top_k: int, repeat: int):
+    """Build time, disk size, memory, query latency and recall of each vector store.
+
+    Each store indexes all embedding files (as step 4 does) into a new
+    database; build and queries run in fresh processes for their peak
+    RSS. Queries are stored chunk vectors, spread over the corpus, one
+    per call; recall@k is measured against an exact search over all
+    vectors. Stores whose dependency is missing are skipped.
+    """
+    import importlib
+    import shutil
+    import numpy as np
+
+    index_stage = importlib.import_module("4_index_to_chromadb")
+
+    files = _index_files(embeddings_dir, index_stage)
+    if not files:
+        print(f"No embedding files with chunk IDs found in {embeddings_dir}")
+        return
+    ids = [chunk_id for file_ids, _, _, _ in files for chunk_id in file_ids]
+    vectors = np.concatenate([np.asarray(embeddings, dtype=np.float32) for _, embeddings, _, _ in files])
+    step = max(1, len(vectors) // num_queries)
+    queries = vectors[::step][:num_queries]
+    top_k = min(top_k, len(ids))
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :top_k]
+    exact_ids = [{ids[i] for i in row} for row in exact]
+
+    print(
+        f"\n{len(files)} embedding files, {len(ids)} chunks, dim {vectors.shape[1]}, "
+        f"{len(queries)} queries, top-{top_k}, {repeat} build(s) each\n"
+    )
+    print(
+        f"{'Store':<8} {'Build (s)':>10} {'Chunks/s':>9} {'Disk (MB)':>10} {'Build RSS':>10} "
+        f"{'Query RSS+':>11} {'First (ms)':>11} {'p50 (ms)':>9} {'p99 (ms)':>9} {'Recall@k':>9}"
+    )
+    print("-" * 105)
+    tmp = Path(tempfile.mkdtemp(prefix="bench-stores-"))
+    try:
+        np.save(tmp / "queries.npy", queries)
+        for store in stores:
+            times = []
+            try:
+                for run in range(repeat):
+                    db_dir = tmp / f"{store}-{run}"
+                    build = _run_probe(
+                        "store-build", embeddings_dir, json.dumps({"store": store, "db": str(db_dir)})
+                    )
+                    times.append(build["seconds"])
+                    if run < repeat - 1:
+                        shutil.rmtree(db_dir)
+                query = _run_probe(
+                    "store-query",
+                    db_dir,
+                    json.dumps({"queries": str(tmp / "queries.npy"), "top_k": top_k}),
+                )
+            except subprocess.CalledProcessError as e:
+                error = (e.stderr or "").strip().splitlines()
+                print(f"{store:<8} skipped: {error[-1] if error else e}")
+                continue
+            seconds = statistics.median(times)
+            latencies = sorted(query["latencies_ms"]) or [query["first_ms"]]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            recall = statistics.mean(
+                len(exact_ids[q] & set(found)) / top_k for q, found in enumerate(query["ids"])
+            )
+            print(
+                f"{store:<8} {seconds:>10.2f} {len(ids) / seconds:>9.0f} {_dir_size_mb(db_dir):>10.1f} "
+                f"{build['peak_rss_mb']:>10.1f} {query['rss_delta_mb']:>11.1f} {query['first_ms']:>11.1f} "
+                f"{statistics.median(latencies):>9.2f} {p99:>9.2f} {recall:>9.3f}"
+            )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("\nBuild RSS: peak of the indexing process; Query RSS+: growth while opening and querying")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline formats")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = subparsers.add_parser(
+        "docling-load", help="Pickle vs. JSON container: load time and peak RSS"
+    )
+    load_parser.add_argument("parsed_dir", help="Directory with parsed documents")
+    load_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per document (default: 3)"
+    )
+
+    provenance_parser = subparsers.add_parser(
+        "chunk-provenance",
+        help="Inline bboxes vs. provenance sidecar: chunk file size, write and read time",
+    )
+    provenance_parser.add_argument("parsed_dir", help="Directory with parsed documents")
+    provenance_parser.add_argument(
+        "--embedding-model",
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        help="Model whose tokenizer sizes the chunks (default: sentence-transformers/all-MiniLM-L6-v2)",
+    )
+    provenance_parser.add_argument(
+        "--format", choices=["json", "jsonl"], default="json", help="Chunk file format (default: json)"
+    )
+    provenance_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per layout (default: 3)"
+    )
+
+    batching_parser = subparsers.add_parser(
+        "embed-batching",
+        help="Per-file vs. cross-file length-sorted embedding batches: padding and chunks/s",
+    )
+    batching_parser.add_argument("chunks_dir", help="Directory with chunk files of step 2")
+    batching_parser.add_argument(
+        "--model",
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        help="sentence-transformers model (default: sentence-transformers/all-MiniLM-L6-v2)",
+    )
+    batching_parser.add_argument(
+        "--batch-size", type=int, default=64, help="Batch size for encoding (default: 64)"
+    )
+    batching_parser.add_argument(
+        "--window", type=int, default=4096, help="Chunks pooled across files (default: 4096)"
+    )
+    batching_parser.add_argument(
+        "--device", default="cpu", help="Device to encode on (default: cpu)"
+    )
+    batching_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per mode (default: 3)"
+    )
+
+    backends_parser = subparsers.add_parser(
+        "embed-backends",
+        help="PyTorch vs. ONNX vs. ONNX int8: CPU chunks/s and cosine agreement",
+    )
+    backends_parser.add_argument("chunks_dir", help="Directory with chunk files of step 2")
+    backends_parser.add_argument(
+        "--model",
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        help="sentence-transformers model (default: sentence-transformers/all-MiniLM-L6-v2)",
+    )
+    backends_parser.add_argument(
+        "--onnx-dir", help="ONNX export directory (default: ~/.cache/local-rag-pipeline/onnx/<model>)"
+    )
+    backends_parser.add_argument(
+        "--batch-size", type=int, default=64, help="Batch size for encoding (default: 64)"
+    )
+    backends_parser.add_argument(
+        "--samples", type=int, default=1000, help="Chunks to encode (default: 1000)"
+    )
+    backends_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per backend (default: 3)"
+    )
+
+    index_parser = subparsers.add_parser(
+        "index-batching",
+        help="Per-file vs. batched ChromaDB upserts: chunks/s into a temporary database",
+    )
+    index_parser.add_argument("embeddings_dir", help="Directory with embedding files of step 3")
+    index_parser.add_argument(
+        "--batch-size", type=int, help="Rows per upsert (default: the client's maximum)"
+    )
+    index_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per mode (default: 3)"
+    )
+
+    stores_parser = subparsers.add_parser(
+        "vector-stores",
+        help="ChromaDB vs. HNSW index: build time, disk, memory, query p50/p99 and recall",
+    )
+    stores_parser.add_argument("embeddings_dir", help="Directory with embedding files of step 3")
+    stores_parser.add_argument(
+        "--stores",
+        nargs="+",
+        choices=["chroma", "hnsw"],
+        default=["chroma", "hnsw"],
+        help="Stores to compare (default: chroma hnsw)",
+    )
+    stores_parser.add_argument(
+        "--queries", type=int, default=200, help="Query vectors (default: 200)"
+    )
+    stores_parser.add_argument(
+        "--top-k", type=int, default=20, help="Results per query (default: 20)"
+    )
+    stores_parser.add_argument(
+        "--repeat", type=int, default=1, help="Builds per store (default: 1)"
+    )
+
+    probe_parser = subparsers.add_parser("_probe")
+    probe_parser.add_argument("kind")
+    probe_parser.add_argument("path")
+    probe_parser.add_argument("options", nargs="?", default="{}")
+
+    args = parser.parse_args()
+
+    if args.command == "docling-load":
+        bench_docling_load(args.parsed_dir, args.repeat)
+    elif args.command == "chunk-provenance":
+        bench_chunk_provenance(args.parsed_dir, args.embedding_model, args.format, args.repeat)
+    elif args.command == "embed-batching":
+        bench_embed_batching(
+            args.chunks_dir, args.model, args.batch_size, args.window, args.device, args.repeat
+        )
+    elif args.command == "embed-backends":
+        bench_embed_backends(
+            args.chunks_dir, args.model, args.onnx_dir, args.batch_size, args.samples, args.repeat
+        )
+    elif args.command == "index-batching":
+        bench_index_batching(args.embeddings_dir, args.batch_size, args.repeat)
+    elif args.command == "vector-stores":
+        bench_vector_stores(args.embeddings_dir, args.stores, args.queries, args.top_k, args.repeat)
+    elif args.command == "_probe":
+        _probe(args.kind, args.path, args.options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Chunk file formats (hand-off from step 2 to step 3).
+
+Formats:
+- json (default): one JSON array per document, `<doc>_chunks.json`,
+  indented. Must be loaded completely before the first chunk is used.
+- jsonl: JSON Lines, `<doc>_chunks.jsonl`, one chunk object per line.
+  Written one chunk at a time and read back incrementally, so a reader
+  holds only the chunks it is working on. Lines are encoded with orjson
+  when it is installed (several times faster than json), with the json
+  module otherwise; both produce the same objects on reading.
+
+Both formats hold the same {"text", "metadata"} objects in the same order.
+
+Provenance sidecar (`<doc>_provenance.npz`): the bounding boxes of every
+chunk, stored column-wise instead of as one dict per box in the chunk
+metadata (which retrieval never reads). Boxes of chunk i are rows
+offsets[i]:offsets[i + 1] of
+
+    offsets  int64    (num_chunks + 1,)  row ranges per chunk
+    page     int32    (num_boxes,)       page of each box
+    bbox     float32  (num_boxes, 4)     l, t, r, b
+    ids      str      (num_chunks,)      chunk ID of each chunk
+
+Chunk IDs are content-addressed: `<doc>:<hash>`, where hash is a SHA-256
+prefix of the chunk text with whitespace normalized. Inserting a paragraph
+therefore changes only the IDs of the chunks it touches, and steps 3 and 4
+embed and index just those. Repeated identical text in one document gets
+`<doc>:<hash>:<n>` for its n-th repetition.
+"""
+
+import re
+import json
+import hashlib
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMATS = ["json", "jsonl"]
+
+_CHUNK_ID_PATTERN = re.compile(r"^(.*):[0-9a-f]{16}(?::\d+)?$")
+
+# <doc>_chunks.json / <doc>_chunks.jsonl
+_SUFFIXES = {"json": "_chunks.json", "jsonl": "_chunks.jsonl"}
+PROVENANCE_SUFFIX = "_provenance.npz"
+
+
+def chunk_file_name(doc_name: str, fmt: str = "json") -> str:
+    """File name of a document's chunks in the given format."""
+    return f"{doc_name}{_SUFFIXES[fmt]}"
+
+
+def chunk_file_doc_name(path: Path) -> str:
+    """Document name of a chunk file (inverse of chunk_file_name())."""
+    name = Path(path).name
+    for suffix in _SUFFIXES.values():
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return Path(path).stem
+
+
+def find_chunk_files(chunks_dir: Path) -> list:
+    """All chunk files of either format in a directory, sorted by name."""
+    chunks_dir = Path(chunks_dir)
+    files = []
+    for suffix in _SUFFIXES.values():
+        files.extend(chunks_dir.glob(f"*{suffix}"))
+    return sorted(files)
+
+
+def _encode_line(chunk: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(chunk) + b"\n"
+    return (json.dumps(chunk, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def write_chunks(path: Path, chunks) -> int:
+    """Write chunks in the format given by the file name.
+
+    Args:
+        path: Output file (*_chunks.json or *_chunks.jsonl)
+        chunks: Iterable of chunk dicts; for JSON Lines it is consumed
+            one chunk at a time
+
+    Returns:
+        Number of chunks written
+    """
+    path = Path(path)
+    if path.name.endswith(_SUFFIXES["jsonl"]):
+        count = 0
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(_encode_line(chunk))
+                count += 1
+        return count
+
+    chunks = list(chunks)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chunks, f, indent=2, ensure_ascii=False)
+    return len(chunks)
+
+
+def iter_chunks(path: Path):
+    """Yield the chunks of a chunk file in order (JSON Lines: incrementally)."""
+    path = Path(path)
+    if path.name.endswith(_SUFFIXES["jsonl"]):
+        loads = orjson.loads if orjson is not None else json.loads
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        yield from json.load(f)
+
+
+def iter_chunk_batches(path: Path, batch_size: int):
+    """Yield lists of up to `batch_size` chunks from a chunk file."""
+    batch = []
+    for chunk in iter_chunks(path):
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def normalize_text(text: str) -> str:
+    """Text as hashed for chunk IDs: NFC, whitespace runs collapsed, stripped."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class ChunkIdAssigner:
+    """Content-addressed chunk IDs for one document, assigned in chunk order."""
+
+    def __init__(self, doc_name: str):
+        self.doc_name = doc_name
+        self._seen = {}
+
+    def __call__(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:16]
+        repeat = self._seen.get(digest, 0)
+        self._seen[digest] = repeat + 1
+        if repeat:
+            return f"{self.doc_name}:{digest}:{repeat}"
+        return f"{self.doc_name}:{digest}"
+
+
+def chunk_ids(doc_name: str, texts) -> list:
+    """Chunk IDs of a document's chunk texts, in order (see ChunkIdAssigner)."""
+    assign = ChunkIdAssigner(doc_name)
+    return [assign(text) for text in texts]
+
+
+def chunk_id_doc_name(chunk_id: str) -> str:
+    """Document name of a chunk ID."""
+    match = _CHUNK_ID_PATTERN.match(chunk_id)
+    if match is None:
+        raise ValueError(f"Not a content-addressed chunk ID: {chunk_id}")
+    return match.group(1)
+
+
+def provenance_file_name(doc_name: str) -> str:
+    """File name of a document's provenance sidecar."""
+    return f"{doc_name}{PROVENANCE_SUFFIX}"
+
+
+def save_provenance(path: Path, boxes_per_chunk: list, ids: list):
+    """Write the provenance sidecar of one document.
+
+    Args:
+        path: Output file (*_provenance.npz)
+        boxes_per_chunk: One list per chunk, in chunk order, of
+            (page, l, t, r, b) tuples
+        ids: Chunk IDs, in chunk order
+    """
+    offsets = np.zeros(len(boxes_per_chunk) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(boxes) for boxes in boxes_per_chunk])
+    rows = np.array(
+        [box for boxes in boxes_per_chunk for box in boxes], dtype=np.float64
+    ).reshape(-1, 5)
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            offsets=offsets,
+            page=rows[:, 0].astype(np.int32),
+            bbox=rows[:, 1:].astype(np.float32),
+            ids=np.array(ids, dtype=str),
+        )
+
+
+def load_provenance(path: Path) -> dict:
+    """Load a provenance sidecar as a dict of arrays (offsets, page, bbox, ids)."""
+    with np.load(path) as data:
+        return {name: data[name] for name in ("offsets", "page", "bbox", "ids")}
+
+
+def chunk_boxes(provenance: dict, chunk_index: int) -> tuple:
+    """Pages and bounding boxes of one chunk.
+
+    Returns:
+        (page array of shape (n,), bbox array of shape (n, 4) as l, t, r, b)
+    """
+    start, end = provenance["offsets"][chunk_index : chunk_index + 2]
+    return provenance["page"][start:end], provenance["bbox"][start:end]
+
+
+def provenance_for_chunk_id(chunks_dir: Path, chunk_id: str) -> tuple:
+    """Pages and bounding boxes of an indexed chunk, e.g. from a search result.
+
+    Args:
+        chunks_dir: Chunk directory of step 2 (holds the sidecars)
+        chunk_id: ChromaDB ID, `<doc>:<hash>`
+
+    Returns:
+        See chunk_boxes()
+
+    Raises:
+        KeyError: The document's sidecar has no chunk with this ID
+            (e.g. the document was re-chunked since it was indexed)
+    """
+    doc_name = chunk_id_doc_name(chunk_id)
+    provenance = load_provenance(Path(chunks_dir) / provenance_file_name(doc_name))
+    matches = np.flatnonzero(provenance["ids"] == chunk_id)
+    if not len(matches):
+        raise KeyError(f"chunk {chunk_id} not in provenance sidecar")
+    return chunk_boxes(provenance, int(matches[0]))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Token counting for HybridChunker, batched and memoized.
+
+HybridChunker calls tokenizer.count_tokens() once per text, repeatedly for
+the same strings (every doc item, every candidate window, the delimiter),
+and HuggingFaceTokenizer answers each call with tokenizer.tokenize(). For
+a document, CachingTokenizer.prefill() encodes all serialized doc-item
+texts in one call to the fast (Rust) tokenizer's batch API, which runs
+multi-threaded, and count_tokens() then answers from a per-document cache.
+
+Counts are identical to HuggingFaceTokenizer.count_tokens(): with a fast
+tokenizer, tokenize() and a batch encode without special tokens return
+the same tokens. Cache misses fall back to the original method, so chunk
+output does not change.
+
+Requires a docling-core with pluggable tokenizers
+(docling_core.transforms.chunker.tokenizer); tokenizer_available() tells
+the caller whether to fall back to the plain model name.
+"""
+
+try:
+    from pydantic import PrivateAttr
+    from docling_core.transforms.chunker.tokenizer.huggingface import HuggingFaceTokenizer
+except ImportError:
+    HuggingFaceTokenizer = None
+
+
+def tokenizer_available() -> bool:
+    return HuggingFaceTokenizer is not None
+
+
+if HuggingFaceTokenizer is not None:
+
+    class CachingTokenizer(HuggingFaceTokenizer):
+        """HuggingFaceTokenizer with a per-document token-count cache."""
+
+        _counts: dict = PrivateAttr(default_factory=dict)
+
+        def count_tokens(self, text: str):
+            count = self._counts.get(text)
+            if count is None:
+                count = super().count_tokens(text=text)
+                self._counts[text] = count
+            return count
+
+        def prefill(self, texts: list):
+            """Count many texts with one batched call (fast tokenizers only)."""
+            if not self.tokenizer.is_fast:
+                return
+            texts = [t for t in dict.fromkeys(texts) if t not in self._counts]
+            if not texts:
+                return
+            encoded = self.tokenizer(
+                texts,
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )
+            for text, ids in zip(texts, encoded["input_ids"]):
+                self._counts[text] = len(ids)
+
+        def reset(self):
+            """Forget cached counts (call between documents to bound memory)."""
+            self._counts.clear()
+
+        def warm_up(self):
+            """Run the tokenizer once so lazy initialization is not billed to a document."""
+            self.count_tokens(text="warm up")
+            self.reset()
+
+
+def prefill_document(chunker, doc):
+    """Batch-count the serialized text of every doc item before chunking.
+
+    Args:
+        chunker: HybridChunker whose tokenizer is a CachingTokenizer
+        doc: DoclingDocument about to be chunked
+    """
+    tokenizer = chunker.tokenizer
+    if not hasattr(tokenizer, "prefill"):
+        return
+    tokenizer.reset()
+    serializer = chunker.serializer_provider.get_serializer(doc=doc)
+    texts = []
+    for item, _ in doc.iterate_items():
+        try:
+            text = serializer.serialize(item=item).text
+        except Exception:
+            continue
+        if text:
+            texts.append(text)
+    tokenizer.prefill(texts)
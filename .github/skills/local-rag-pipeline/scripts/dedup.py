@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate chunk detection across documents (MinHash + LSH).
+
+Proposal drafts, final versions and reports that quote them repeat the
+same paragraphs, often with small edits. Step 2 collapses such chunks so
+each is embedded and indexed once, as a canonical chunk that lists every
+document it occurs in.
+
+- While chunking, step 2 computes a MinHash signature of every chunk
+  (word 5-gram shingles of the normalized text, NUM_PERM permutations)
+  and stores them per document in `<doc>_minhash.npz`, next to the chunk
+  file. Only re-chunked documents get new signatures.
+- After chunking, build_dedup_index() loads all signatures, finds
+  candidate pairs with LSH banding (BANDS bands of NUM_PERM / BANDS rows)
+  and clusters them around a canonical chunk: a chunk joins a cluster
+  only if its estimated Jaccard similarity to the canonical chunk reaches
+  the threshold (no chains A≈B≈C with C far from A). Chunks are only
+  collapsed within a project (see shards.source_project()) and document
+  type, so --filter-doc-type in step 5 still finds every chunk
+  and every shard of step 4 --shard-by holds the canonical chunks of its
+  own duplicates. The clusters are written to `dedup.json` in the chunk
+  directory:
+
+    duplicates  chunk ID → ID of the canonical chunk it collapses into
+    references  canonical chunk ID → [{"chunk_id", "source_path",
+                "page_numbers"}, ...] of all cluster members
+    documents   document name → state hash of its dedup entries
+    stats       chunk and duplicate counts, overall, per project and per
+                doc_type
+
+  A canonical chunk stays canonical as long as it exists, so adding a
+  copy of a document does not re-embed the original.
+- Step 3 skips duplicate chunks and adds the references as
+  metadata["sources"] to canonical ones; step 4 indexes those. A chunk
+  file whose document's state hash changed is re-embedded (reusing the
+  vectors it already has), which also promotes a new canonical chunk when
+  the document of the old one is deleted.
+
+Usage (inside a stage script):
+    signatures = np.stack([minhash(text) for text in texts])
+    save_minhash(path, ids, signatures, pages, source_info)
+    index = build_dedup_index(chunks_dir, threshold=0.85)
+    index = load_dedup_index(chunks_dir)  # in step 3
+"""
+
+import os
+import json
+import zlib
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from chunk_io import chunk_id_doc_name, normalize_text
+from shards import source_project
+
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs from ~0.7 Jaccard similarity on become candidates
+BANDS = 16
+SHINGLE_WORDS = 5
+DEFAULT_THRESHOLD = 0.85
+
+MINHASH_SUFFIX = "_minhash.npz"
+DEDUP_INDEX_NAME = "dedup.json"
+DEDUP_INDEX_VERSION = 1
+
+# Universal hashing (a * x + b) mod p; fixed seed so signatures written
+# by earlier runs stay comparable
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str) -> set:
+    """Word SHINGLE_WORDS-grams of the normalized, lowercased text."""
+    words = normalize_text(text).lower().split()
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {
+        " ".join(words[i : i + SHINGLE_WORDS])
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of a chunk text (uint32, NUM_PERM values)."""
+    hashed = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64
+    ) % _PRIME
+    # a, b, x < 2^31: the products fit into uint64
+    return ((_A[:, None] * hashed[None, :] + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def minhash_file_name(doc_name: str) -> str:
+    """File name of a document's MinHash signatures."""
+    return f"{doc_name}{MINHASH_SUFFIX}"
+
+
+def save_minhash(path: Path, ids: list, signatures: np.ndarray, pages: list, source_info: dict):
+    """Write the MinHash signatures of one document.
+
+    Args:
+        path: Output file (*_minhash.npz)
+        ids: Chunk IDs, in chunk order
+        signatures: (num_chunks, NUM_PERM) array from minhash()
+        pages: page_numbers of each chunk
+        source_info: doc_type, source_path and project of the document (source.json)
+    """
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            ids=np.array(ids, dtype=str),
+            signatures=np.asarray(signatures, dtype=np.uint32).reshape(-1, NUM_PERM),
+            pages=json.dumps(pages),
+            source_path=source_info.get("source_path", ""),
+            doc_type=source_info.get("doc_type", ""),
+            project=source_project(source_info),
+        )
+
+
+def load_dedup_index(chunks_dir: Path) -> dict:
+    """The dedup.json of a chunk directory, or an empty index."""
+    path = Path(chunks_dir) / DEDUP_INDEX_NAME
+    if not path.exists():
+        return {"duplicates": {}, "references": {}, "documents": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _clusters(
+    signatures: np.ndarray, threshold: float, groups: list = None, preferred: set = frozenset()
+) -> list:
+    """Canonical chunk (index) of every chunk, clustered by LSH candidate pairs.
+
+    Two clusters merge only if every member of one reaches the threshold
+    against the canonical chunk of the other, so each duplicate is similar
+    to the chunk it collapses into.
+
+    Args:
+        signatures: (num_chunks, NUM_PERM) MinHash signatures
+        threshold: Minimum estimated Jaccard similarity to the canonical chunk
+        groups: Group of every chunk; chunks of different groups never merge
+        preferred: Indices that stay canonical when their cluster merges
+    """
+    root = list(range(len(signatures)))
+    members = {i: [i] for i in range(len(signatures))}
+    groups = groups or [None] * len(signatures)
+
+    def similar(i: int, j: int) -> bool:
+        # Fraction of equal MinHash values estimates Jaccard similarity
+        return np.mean(signatures[i] == signatures[j]) >= threshold
+
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        buckets = {}
+        block = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        for i, key in enumerate(map(bytes, block)):
+            buckets.setdefault((groups[i], key), []).append(i)
+        for bucket in buckets.values():
+            for pos, j in enumerate(bucket[1:], 1):
+                for i in bucket[:pos]:
+                    root_i, root_j = root[i], root[j]
+                    if root_i == root_j:
+                        break
+                    keep, other = (
+                        (root_j, root_i)
+                        if root_j in preferred and root_i not in preferred
+                        else (root_i, root_j)
+                    )
+                    if all(similar(keep, m) for m in members[other]):
+                        for m in members[other]:
+                            root[m] = keep
+                        members[keep].extend(members.pop(other))
+                        break
+    return root
+
+
+def _state_hash(entries: list) -> str:
+    if not entries:
+        return ""
+    return hashlib.sha256(json.dumps(sorted(entries)).encode("utf-8")).hexdigest()[:16]
+
+
+def build_dedup_index(chunks_dir: Path, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    """Cluster near-duplicate chunks of all documents and write dedup.json.
+
+    Args:
+        chunks_dir: Chunk directory of step 2 (holds the *_minhash.npz files)
+        threshold: Minimum estimated Jaccard similarity of word shingles
+
+    Returns:
+        The index as written (see module docstring)
+    """
+    chunks_dir = Path(chunks_dir)
+    previous = load_dedup_index(chunks_dir)
+    was_canonical = set(previous.get("references", {}))
+
+    ids, signatures, refs, doc_types, projects = [], [], [], [], []
+    for path in sorted(chunks_dir.glob(f"*{MINHASH_SUFFIX}")):
+        with np.load(path) as data:
+            file_ids = [str(chunk_id) for chunk_id in data["ids"]]
+            pages = json.loads(str(data["pages"]))
+            source_path = str(data["source_path"])
+            doc_type = str(data["doc_type"])
+            # Signatures written before step 1 recorded projects have none
+            project = (
+                str(data["project"])
+                if "project" in data.files
+                else source_project({"source_path": source_path})
+            )
+            signatures.append(data["signatures"])
+        ids.extend(file_ids)
+        doc_types.extend([doc_type] * len(file_ids))
+        projects.extend([project] * len(file_ids))
+        refs.extend(
+            {"chunk_id": chunk_id, "source_path": source_path, "page_numbers": p}
+            for chunk_id, p in zip(file_ids, pages)
+        )
+
+    # Keep previous canonical chunks, so their embeddings stay valid
+    preferred = {i for i, chunk_id in enumerate(ids) if chunk_id in was_canonical}
+    groups = list(zip(projects, doc_types))
+    roots = (
+        _clusters(np.concatenate(signatures), threshold, groups, preferred) if ids else []
+    )
+    members = {}
+    for i, root in enumerate(roots):
+        members.setdefault(root, []).append(i)
+
+    duplicates = {}
+    references = {}
+    for canonical, cluster in members.items():
+        if len(cluster) < 2:
+            continue
+        references[ids[canonical]] = [refs[canonical]] + [
+            refs[i] for i in cluster if i != canonical
+        ]
+        for i in cluster:
+            if i != canonical:
+                duplicates[ids[i]] = ids[canonical]
+
+    state = {}
+    for chunk_id, canonical in duplicates.items():
+        state.setdefault(chunk_id_doc_name(chunk_id), []).append([chunk_id, canonical])
+    for canonical, cluster_refs in references.items():
+        state.setdefault(chunk_id_doc_name(canonical), []).append(
+            [canonical, json.dumps(cluster_refs, sort_keys=True)]
+        )
+
+    by_project, by_type = {}, {}
+    for chunk_id, project, doc_type in zip(ids, projects, doc_types):
+        for breakdown, key in ((by_project, project), (by_type, doc_type)):
+            counts = breakdown.setdefault(key, {"chunks": 0, "duplicates": 0})
+            counts["chunks"] += 1
+            counts["duplicates"] += chunk_id in duplicates
+
+    index = {
+        "version": DEDUP_INDEX_VERSION,
+        "threshold": threshold,
+        "duplicates": duplicates,
+        "references": references,
+        "documents": {doc: _state_hash(entries) for doc, entries in state.items()},
+        "stats": {
+            "chunks": len(ids),
+            "duplicates": len(duplicates),
+            "by_project": by_project,
+            "by_doc_type": by_type,
+        },
+    }
+
+    tmp_path = chunks_dir / (DEDUP_INDEX_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, chunks_dir / DEDUP_INDEX_NAME)
+    return index
+
+
+def remove_dedup_index(chunks_dir: Path):
+    """Delete dedup.json (chunking without deduplication)."""
+    path = Path(chunks_dir) / DEDUP_INDEX_NAME
+    if path.exists():
+        path.unlink()
+
+
+def dedup_ratio(counts: dict) -> float:
+    """Share of chunks collapsed into another chunk (0 for no chunks)."""
+    return counts["duplicates"] / counts["chunks"] if counts["chunks"] else 0.0
+
+
+def format_dedup_report(index: dict) -> str:
+    """Multi-line dedup summary of an index, overall, per project and per document type."""
+    stats = index["stats"]
+    lines = [
+        f"Near-duplicate chunks: {stats['duplicates']} of {stats['chunks']} "
+        f"({dedup_ratio(stats):.1%}) collapsed into "
+        f"{len(index['references'])} canonical chunks"
+    ]
+    # Indexes written before the per-project breakdown lack it
+    for label, breakdown in (("project", "by_project"), ("doc_type", "by_doc_type")):
+        for value, counts in sorted(stats.get(breakdown, {}).items()):
+            lines.append(
+                f"  {label} {value or '(none)'}: {counts['duplicates']} of {counts['chunks']} "
+                f"({dedup_ratio(counts):.1%})"
+            )
+    return "\n".join(lines)
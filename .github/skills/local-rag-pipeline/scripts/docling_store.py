@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Storage format for parsed DoclingDocuments (hand-off from step 1 to step 2).
+
+Formats:
+- json (default): docling's native JSON schema in a versioned, compressed
+  container. zstd is used when the `zstandard` package is installed,
+  gzip otherwise. Loading never executes code and survives docling
+  upgrades as long as the document schema is compatible.
+- pickle: legacy `docling.pkl`, kept so existing parsed trees still load.
+
+JSON container layout (after decompression):
+    line 1:  header JSON (container version, schema version, element counts)
+    line 2+: DoclingDocument JSON
+
+The header can be read without decompressing the body (see read_header()),
+and the body is validated straight from bytes by pydantic-core, without
+building an intermediate Python dict.
+"""
+
+import io
+import gzip
+import importlib.metadata
+import json
+import pickle
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CONTAINER_FORMAT = "docling-json"
+CONTAINER_VERSION = 1
+DOC_BASENAME = "docling"
+FORMATS = ["json", "pickle"]
+
+# Preferred first when a document directory holds more than one format
+_SUFFIXES = [".json.zst", ".json.gz", ".pkl"]
+
+
+def _json_suffix() -> str:
+    return ".json.zst" if zstandard is not None else ".json.gz"
+
+
+def _open_write(path: Path):
+    if path.name.endswith(".zst"):
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"))
+    return gzip.open(path, "wb", compresslevel=6)
+
+
+def _open_read(path: Path):
+    if path.name.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(
+                f"{path.name} is zstd-compressed; install it with: pip install zstandard"
+            )
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.BufferedReader(reader)
+    return gzip.open(path, "rb")
+
+
+def _package_version(name: str) -> str:
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def save_document(doc, doc_dir: Path, fmt: str = "json") -> Path:
+    """Write a DoclingDocument to doc_dir in the given format.
+
+    Returns:
+        Path of the written file
+    """
+    doc_dir = Path(doc_dir)
+    if fmt == "pickle":
+        path = doc_dir / f"{DOC_BASENAME}.pkl"
+        with open(path, "wb") as f:
+            pickle.dump(doc, f)
+        return path
+
+    if fmt != "json":
+        raise ValueError(f"Unknown document format: {fmt} (expected one of {FORMATS})")
+
+    header = {
+        "format": CONTAINER_FORMAT,
+        "container_version": CONTAINER_VERSION,
+        "schema_version": doc.version,
+        "docling_core_version": _package_version("docling-core"),
+        "name": doc.name,
+        "num_texts": len(doc.texts),
+        "num_tables": len(doc.tables),
+        "num_pages": len(doc.pages),
+    }
+    path = doc_dir / f"{DOC_BASENAME}{_json_suffix()}"
+    with _open_write(path) as f:
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        f.write(doc.model_dump_json(by_alias=True, exclude_none=True).encode("utf-8"))
+    return path
+
+
+def read_header(path: Path) -> dict:
+    """Return the container header without decompressing the document body."""
+    path = Path(path)
+    if path.suffix == ".pkl":
+        return {"format": "pickle"}
+
+    with _open_read(path) as f:
+        return _check_header(path, f.readline())
+
+
+def _check_header(path: Path, line: bytes) -> dict:
+    header = json.loads(line)
+    if header.get("format") != CONTAINER_FORMAT:
+        raise ValueError(f"{path} is not a {CONTAINER_FORMAT} container")
+    if header.get("container_version", 0) > CONTAINER_VERSION:
+        raise ValueError(
+            f"{path} uses container version {header['container_version']}, "
+            f"this script supports up to {CONTAINER_VERSION}"
+        )
+    return header
+
+
+def load_document(path: Path):
+    """Load a DoclingDocument written by save_document() (either format)."""
+    path = Path(path)
+    if path.suffix == ".pkl":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    from docling_core.types.doc import DoclingDocument
+
+    body = bytearray()
+    with _open_read(path) as f:
+        _check_header(path, f.readline())
+        for block in iter(lambda: f.read(1 << 20), b""):
+            body.extend(block)
+    return DoclingDocument.model_validate_json(body)
+
+
+def find_parsed_documents(parsed_path: Path) -> list:
+    """Find one stored document per directory under parsed_path.
+
+    When a directory holds several formats (e.g. after switching from
+    pickle to json) the JSON container wins.
+    """
+    by_dir = {}
+    for suffix in reversed(_SUFFIXES):
+        for path in Path(parsed_path).glob(f"**/{DOC_BASENAME}{suffix}"):
+            by_dir[path.parent] = path
+    return sorted(by_dir.values())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Recursive, prioritized discovery of source documents.
+
+Walks a documents tree such as documents/{projekt-id}/ with os.scandir and
+yields files in the order the project-visitor skill ingests them: at every
+directory level the known document-type folders come first, in priority
+order, followed by everything else by name.
+
+    1. antrag/         Antragsunterlagen
+    2. berichte/       Projektberichte
+    3. publikationen/  Papers
+    4. meetings/       Meeting-Notizen
+    5. rest            Sonstige Dokumente
+
+Each file is yielded together with its document type: the first known
+folder on its relative path, otherwise the name of its parent folder
+(empty for files directly in the scanned directory). document_project()
+reads the projekt-id from the path when the documents/ root is scanned.
+"""
+
+import os
+from pathlib import Path
+
+PRIORITY_FOLDERS = ["antrag", "berichte", "publikationen", "meetings"]
+
+
+def _sort_key(entry: os.DirEntry) -> tuple:
+    name = entry.name.lower()
+    if entry.is_dir() and name in PRIORITY_FOLDERS:
+        return (PRIORITY_FOLDERS.index(name), name)
+    return (len(PRIORITY_FOLDERS), name)
+
+
+def document_type(rel_path: Path) -> str:
+    """Document type of a file, given its path relative to the scan root."""
+    folders = [part.lower() for part in rel_path.parts[:-1]]
+    for folder in folders:
+        if folder in PRIORITY_FOLDERS:
+            return folder
+    return folders[-1] if folders else ""
+
+
+def document_project(rel_path: Path) -> str:
+    """Project of a file, given its path relative to a documents/ root.
+
+    The first folder is the projekt-id (documents/{projekt-id}/...). When
+    it is a document-type folder, a single project was scanned and the
+    project is unknown (""), as for files directly in the scanned directory.
+    """
+    folders = rel_path.parts[:-1]
+    if not folders or folders[0].lower() in PRIORITY_FOLDERS:
+        return ""
+    return folders[0]
+
+
+def scan_documents(root: Path, extensions: list):
+    """Yield supported files under root in ingestion priority order.
+
+    Directories are read lazily, one at a time, so the first files are
+    available before the whole tree has been walked. Hidden files and
+    folders (starting with ".") are skipped.
+
+    Args:
+        root: Directory to scan
+        extensions: Lower-case file suffixes to include (e.g. [".pdf"])
+
+    Yields:
+        (file_path, doc_type) tuples
+    """
+    root = Path(root)
+    extensions = set(extensions)
+    # Depth-first; the stack holds per-directory iterators over sorted entries
+    stack = [iter(_sorted_entries(root))]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir():
+            stack.append(iter(_sorted_entries(entry.path)))
+        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+            file_path = Path(entry.path)
+            yield file_path, document_type(file_path.relative_to(root))
+
+
+def _sorted_entries(path) -> list:
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entries, key=_sort_key)
+    except OSError as e:
+        print(f"Warning: Cannot read directory {path}: {e}")
+        return []
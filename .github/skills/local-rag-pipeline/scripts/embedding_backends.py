@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Embedding inference backends: PyTorch, ONNX Runtime, ONNX with int8.
+
+On CPU-only servers, plain PyTorch inference is the slowest stage after
+parsing. sentence-transformers (>= 3.2) can run the same model through
+ONNX Runtime instead, optionally with dynamically int8-quantized weights.
+Both need a one-time local export, written to
+~/.cache/local-rag-pipeline/onnx/<model> by default:
+
+    torch      SentenceTransformer as before (GPU when available)
+    onnx       onnx/model.onnx, fp32; vectors match PyTorch to ~1e-6
+    onnx-int8  onnx/model_qint8_<isa>.onnx, dynamic int8 quantization of
+               the linear layers; fastest on CPU, cosine agreement with
+               PyTorch is typically above 0.99 (check with `parity`)
+
+Vectors of all backends live in the same space, so a collection indexed
+with one backend can be searched with another. The embedding cache keys
+int8 vectors separately (cache_model_key()).
+
+Usage:
+    python embedding_backends.py export <model> [--output DIR] [--quantize avx2|avx512|avx512_vnni|arm64]
+    python embedding_backends.py parity <model> [--onnx-dir DIR] [--chunks-dir DIR] [--samples N]
+
+Example:
+    python embedding_backends.py export sentence-transformers/all-MiniLM-L6-v2 --quantize avx2
+    python embedding_backends.py parity sentence-transformers/all-MiniLM-L6-v2 --chunks-dir .rag/chunks/
+
+Requires: pip install "optimum[onnxruntime]" (for the onnx backends)
+"""
+
+import re
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from embedding_models import hub_model_name
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+QUANTIZATION_CONFIGS = ["avx2", "avx512", "avx512_vnni", "arm64"]
+DEFAULT_ONNX_ROOT = Path.home() / ".cache" / "local-rag-pipeline" / "onnx"
+# First sentence-transformers release with SentenceTransformer(backend="onnx")
+ONNX_MIN_SENTENCE_TRANSFORMERS = (3, 2)
+
+# Sentences for the parity check when no chunk directory is given
+_PARITY_SAMPLES = [
+    "Das Arbeitspaket 3 umfasst die Evaluation der Prototypen im Feldversuch.",
+    "The project budget was reallocated to personnel costs in the second year.",
+    "Meilenstein M2 wurde mit drei Monaten Verzögerung erreicht.",
+    "Table 4 lists the partners and their responsibilities per work package.",
+    "Die Ergebnisse wurden auf der Jahrestagung vorgestellt und veröffentlicht.",
+    "Payment terms: 30 days net after receipt of the invoice.",
+]
+
+
+def default_onnx_dir(model_name: str) -> Path:
+    """Export directory of a model under ~/.cache/local-rag-pipeline/onnx/."""
+    return DEFAULT_ONNX_ROOT / hub_model_name(model_name).replace("/", "__")
+
+
+def quantized_file_name(onnx_dir: Path):
+    """Relative path of the int8 model in an export directory, or None."""
+    files = sorted(Path(onnx_dir).glob("onnx/model_qint8_*.onnx"))
+    return files[0].relative_to(onnx_dir).as_posix() if files else None
+
+
+def check_backend(backend: str):
+    """Fail early, with the fix, if the installed packages cannot run a backend.
+
+    Raises:
+        ImportError: sentence-transformers is older than 3.2 (no backend=)
+    """
+    if backend == "torch":
+        return
+    import sentence_transformers
+
+    installed = sentence_transformers.__version__
+    version = tuple(int(part) for part in re.findall(r"\d+", installed)[:2])
+    if version < ONNX_MIN_SENTENCE_TRANSFORMERS:
+        required = ".".join(map(str, ONNX_MIN_SENTENCE_TRANSFORMERS))
+        raise ImportError(
+            f"The {backend} backend needs sentence-transformers>={required} (installed: "
+            f"{installed}); run: pip install -U 'sentence-transformers>={required}' 'optimum[onnxruntime]'"
+        )
+
+
+def cache_model_key(model_name: str, backend: str) -> str:
+    """Model name under which the embedding cache stores a backend's vectors.
+
+    fp32 ONNX reproduces the PyTorch vectors, so they share entries;
+    int8 vectors differ slightly and get their own.
+    """
+    if backend == "onnx-int8":
+        return f"{hub_model_name(model_name)}#int8"
+    return model_name
+
+
+def load_backend_model(
+    model_name: str,
+    backend: str,
+    device: str,
+    onnx_dir: str = None,
+    threads: int = None,
+    **kwargs,
+):
+    """SentenceTransformer running on the given backend.
+
+    Args:
+        model_name: Embedding model (Hub name or local path)
+        backend: One of BACKENDS
+        device: "cuda" or "cpu" (ONNX backends run on CPU)
+        onnx_dir: Export directory of the onnx backends
+            (default: default_onnx_dir(model_name))
+        threads: Intra-op threads of the ONNX Runtime session (default: one
+            per core); PyTorch callers use torch.set_num_threads()
+        **kwargs: Passed on to SentenceTransformer (e.g. local_files_only)
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device=device, **kwargs)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}; choose from {', '.join(BACKENDS)}")
+    check_backend(backend)
+
+    onnx_dir = Path(onnx_dir) if onnx_dir else default_onnx_dir(model_name)
+    if not (onnx_dir / "onnx" / "model.onnx").exists():
+        raise FileNotFoundError(
+            f"No ONNX export in {onnx_dir}; run: python embedding_backends.py export {model_name}"
+            + (" --quantize avx2" if backend == "onnx-int8" else "")
+        )
+    model_kwargs = {}
+    if backend == "onnx-int8":
+        file_name = quantized_file_name(onnx_dir)
+        if file_name is None:
+            raise FileNotFoundError(
+                f"No int8 model in {onnx_dir}; run: python embedding_backends.py export "
+                f"{model_name} --quantize avx2"
+            )
+        model_kwargs["file_name"] = file_name
+    if threads:
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs["session_options"] = session_options
+    return SentenceTransformer(
+        str(onnx_dir), device="cpu", backend="onnx", model_kwargs=model_kwargs, **kwargs
+    )
+
+
+def export_onnx(model_name: str, output_dir: Path = None, quantize: str = None) -> Path:
+    """Export a model to ONNX (and optionally int8) for the onnx backends.
+
+    Args:
+        model_name: Embedding model (Hub name or local path)
+        output_dir: Export directory (default: default_onnx_dir(model_name))
+        quantize: Instruction set to quantize for (one of
+            QUANTIZATION_CONFIGS); fp32 only when None
+
+    Returns:
+        The export directory
+    """
+    from sentence_transformers import SentenceTransformer
+
+    check_backend("onnx")
+    output_dir = Path(output_dir) if output_dir else default_onnx_dir(model_name)
+    print(f"Exporting {model_name} to ONNX: {output_dir}")
+    # Without an onnx/model.onnx, sentence-transformers exports via optimum
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save_pretrained(str(output_dir))
+
+    if quantize:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"Quantizing to int8 ({quantize})...")
+        model = SentenceTransformer(str(output_dir), device="cpu", backend="onnx")
+        export_dynamic_quantized_onnx_model(model, quantize, str(output_dir))
+    return output_dir
+
+
+def cosine_agreement(reference: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    other = other / np.linalg.norm(other, axis=1, keepdims=True)
+    return np.sum(reference * other, axis=1)
+
+
+def parity_texts(chunks_dir: str = None, samples: int = 256) -> list:
+    """Texts for a parity check: evenly spaced chunks of a chunk directory."""
+    if not chunks_dir:
+        return list(_PARITY_SAMPLES)
+    from chunk_io import find_chunk_files, iter_chunks
+
+    texts = [c["text"] for f in find_chunk_files(Path(chunks_dir)) for c in iter_chunks(f)]
+    step = max(1, len(texts) // samples)
+    return texts[::step][:samples]
+
+
+def parity_check(model_name: str, texts: list, onnx_dir: str = None, batch_size: int = 32) -> dict:
+    """Cosine agreement of each exported backend with the PyTorch vectors.
+
+    Returns:
+        backend → (minimum, mean) cosine similarity over texts
+    """
+
+    def encode(model):
+        return model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False
+        )
+
+    reference = encode(load_backend_model(model_name, "torch", "cpu"))
+    results = {}
+    for backend in BACKENDS[1:]:
+        try:
+            model = load_backend_model(model_name, backend, "cpu", onnx_dir)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"  {backend}: skipped ({e})")
+            continue
+        agreement = cosine_agreement(reference, encode(model))
+        results[backend] = (float(agreement.min()), float(agreement.mean()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check ONNX embedding backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="One-time ONNX (and int8) export")
+    export_parser.add_argument("model", help="sentence-transformers model name or path")
+    export_parser.add_argument(
+        "--output", help="Export directory (default: ~/.cache/local-rag-pipeline/onnx/<model>)"
+    )
+    export_parser.add_argument(
+        "--quantize",
+        choices=QUANTIZATION_CONFIGS,
+        help="Also write a dynamically int8-quantized model for this instruction set",
+    )
+
+    parity_parser = subparsers.add_parser(
+        "parity", help="Cosine agreement of the ONNX backends with PyTorch"
+    )
+    parity_parser.add_argument("model", help="sentence-transformers model name or path")
+    parity_parser.add_argument("--onnx-dir", help="Export directory (default: as for export)")
+    parity_parser.add_argument("--chunks-dir", help="Check on chunks of step 2 instead of samples")
+    parity_parser.add_argument(
+        "--samples", type=int, default=256, help="Chunks to compare (default: 256)"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        try:
+            output_dir = export_onnx(args.model, args.output, args.quantize)
+        except ImportError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Exported to: {output_dir}")
+        print(f"Check parity: python embedding_backends.py parity {args.model}")
+        return
+
+    texts = parity_texts(args.chunks_dir, args.samples)
+    print(f"Comparing {len(texts)} texts with the PyTorch vectors of {args.model}...")
+    results = parity_check(args.model, texts, args.onnx_dir)
+    if not results:
+        print("Error: No ONNX export found")
+        sys.exit(1)
+    for backend, (minimum, mean) in results.items():
+        print(f"  {backend}: cosine min {minimum:.6f}, mean {mean:.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Persistent embedding cache (SQLite).
+
+Re-running step 3 after a chunking change, or indexing the same
+attachment in two projects, encodes identical text again. The cache
+stores every vector under (model, normalization flag, SHA-256 of the
+exact text), so such text is looked up instead of encoded. Step 3 and
+query encoding in step 5 use it.
+
+    embeddings(model TEXT, normalized INTEGER, text_hash BLOB,
+               vector BLOB float32, last_used INTEGER)
+
+The default location is shared by all projects of a user
+(~/.cache/local-rag-pipeline/embeddings.sqlite). The file is kept below
+a size limit by evicting the least recently used vectors. SQLite's WAL
+mode lets several pipeline runs use it at the same time. A cache opened
+with refresh=True (step 3 --force) looks nothing up and overwrites the
+vectors it stores, e.g. after a model update under the same name.
+
+Usage (inside a stage script):
+    cache = EmbeddingCache.open(DEFAULT_CACHE_PATH, max_size_mb=2048)
+    rows = cache.encode(model_name, True, texts, lambda misses: embed(misses))
+    print(cache.stats_line())
+
+Inspect or clear from the command line:
+    python embedding_cache.py [--cache PATH] [--clear]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from embedding_models import hub_model_name
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "local-rag-pipeline" / "embeddings.sqlite"
+DEFAULT_MAX_SIZE_MB = 2048
+
+# Keys per SQL statement (below SQLite's default variable limit)
+_LOOKUP_BATCH = 300
+
+
+def text_hash(text: str) -> bytes:
+    """Cache key of a text: SHA-256 of the exact text (embeddings see every character)."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Size-bounded, least-recently-used embedding store in one SQLite file."""
+
+    def __init__(self, connection: sqlite3.Connection, max_bytes: int, refresh: bool = False):
+        self.db = connection
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        (size,) = self.db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        self.size_bytes = size
+
+    @classmethod
+    def open(
+        cls, path: Path = DEFAULT_CACHE_PATH, max_size_mb: int = DEFAULT_MAX_SIZE_MB, refresh: bool = False
+    ):
+        """Open (or create) the cache file at `path`; see the module docstring for `refresh`."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=60)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                normalized INTEGER NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, normalized, text_hash)
+            ) WITHOUT ROWID"""
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        connection.commit()
+        return cls(connection, max_size_mb * 1024 * 1024, refresh)
+
+    def get_many(self, model_name: str, normalized: bool, texts: list) -> dict:
+        """Cached vectors of texts.
+
+        Returns:
+            Index into texts → float32 vector, for the texts found (none
+            when refreshing)
+        """
+        if self.refresh:
+            self.misses += len(texts)
+            return {}
+        model = hub_model_name(model_name)
+        hashes = [text_hash(text) for text in texts]
+        positions = {}
+        for i, key in enumerate(hashes):
+            positions.setdefault(key, []).append(i)
+
+        found = {}
+        unique = list(positions)
+        for start in range(0, len(unique), _LOOKUP_BATCH):
+            keys = unique[start : start + _LOOKUP_BATCH]
+            rows = self.db.execute(
+                "SELECT text_hash, vector FROM embeddings "
+                f"WHERE model = ? AND normalized = ? AND text_hash IN ({','.join('?' * len(keys))})",
+                [model, int(normalized), *keys],
+            ).fetchall()
+            for key, vector in rows:
+                row = np.frombuffer(vector, dtype=np.float32)
+                for i in positions[key]:
+                    found[i] = row
+
+        if found:
+            now = time.time_ns()
+            self.db.executemany(
+                "UPDATE embeddings SET last_used = ? "
+                "WHERE model = ? AND normalized = ? AND text_hash = ?",
+                [(now, model, int(normalized), hashes[i]) for i in found],
+            )
+            self.db.commit()
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, model_name: str, normalized: bool, texts: list, vectors):
+        """Store vectors of texts (replacing cached ones when refreshing), then evict down to the size limit."""
+        model = hub_model_name(model_name)
+        now = time.time_ns()
+        added = 0
+        for text, vector in zip(texts, vectors):
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            key = (model, int(normalized), text_hash(text))
+            if self.refresh:
+                old = self.db.execute(
+                    "SELECT LENGTH(vector) FROM embeddings "
+                    "WHERE model = ? AND normalized = ? AND text_hash = ?",
+                    key,
+                ).fetchone()
+                self.db.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", (*key, blob, now))
+                added += len(blob) - (old[0] if old else 0)
+                continue
+            cursor = self.db.execute("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?)", (*key, blob, now))
+            added += cursor.rowcount * len(blob)
+        self.db.commit()
+        self.size_bytes += added
+        if self.size_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        # Down to 90% of the limit, so the next puts do not evict again
+        target = self.size_bytes - int(self.max_bytes * 0.9)
+        victims = []
+        freed = 0
+        for model, normalized, key, size in self.db.execute(
+            "SELECT model, normalized, text_hash, LENGTH(vector) FROM embeddings "
+            "ORDER BY last_used"
+        ):
+            victims.append((model, normalized, key))
+            freed += size
+            if freed >= target:
+                break
+        self.db.executemany(
+            "DELETE FROM embeddings WHERE model = ? AND normalized = ? AND text_hash = ?",
+            victims,
+        )
+        self.db.commit()
+        self.size_bytes -= freed
+        self.evicted += len(victims)
+
+    def encode(self, model_name: str, normalized: bool, texts: list, encode) -> np.ndarray:
+        """Vectors of texts, calling `encode` only for texts not in the cache.
+
+        Args:
+            model_name: Embedding model (part of the key)
+            normalized: Whether vectors are L2-normalized (part of the key)
+            texts: Texts to embed
+            encode: Function from a list of texts to an (n, dim) array
+
+        Returns:
+            (len(texts), dim) float32 array in the order of texts
+        """
+        if not texts:
+            return encode(texts)
+        found = self.get_many(model_name, normalized, texts)
+        missing = [i for i in range(len(texts)) if i not in found]
+        new = encode([texts[i] for i in missing]) if missing else None
+        if missing:
+            self.put_many(model_name, normalized, [texts[i] for i in missing], new)
+
+        dim = new.shape[1] if new is not None else len(next(iter(found.values())))
+        rows = np.empty((len(texts), dim), dtype=np.float32)
+        for i, row in found.items():
+            rows[i] = row
+        if missing:
+            rows[missing] = new
+        return rows
+
+    def stats_line(self) -> str:
+        """Hit/miss statistics of this session and the cache size."""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        line = (
+            f"Embedding cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), "
+            f"{self.size_bytes / 2**20:.1f} of {self.max_bytes / 2**20:.0f} MB"
+        )
+        if self.evicted:
+            line += f", {self.evicted} evicted"
+        return line
+
+    def clear(self):
+        """Delete every cached vector."""
+        self.db.execute("DELETE FROM embeddings")
+        self.db.commit()
+        self.db.execute("VACUUM")
+        self.size_bytes = 0
+
+    def close(self):
+        self.db.close()
+
+
+def open_cache(path, max_size_mb: int = DEFAULT_MAX_SIZE_MB, refresh: bool = False):
+    """EmbeddingCache at `path`, or None if `path` is None (--no-cache)."""
+    if path is None:
+        return None
+    return EmbeddingCache.open(path, max_size_mb, refresh)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the embedding cache")
+    parser.add_argument(
+        "--cache",
+        default=str(DEFAULT_CACHE_PATH),
+        help=f"Cache file (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument("--clear", action="store_true", help="Delete all cached vectors")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.cache):
+        print(f"Error: Embedding cache not found: {args.cache}")
+        sys.exit(1)
+
+    cache = EmbeddingCache.open(args.cache)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.cache}")
+        return
+
+    print(f"Cache: {args.cache} ({cache.size_bytes / 2**20:.1f} MB of vectors)")
+    for model, normalized, count in cache.db.execute(
+        "SELECT model, normalized, COUNT(*) FROM embeddings GROUP BY model, normalized"
+    ):
+        print(f"  {model}{' (normalized)' if normalized else ''}: {count} vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Token limits of embedding models, for sizing chunks.
+
+A sentence-transformers model truncates its input at max_seq_length
+tokens of its own tokenizer (256 for all-MiniLM-L6-v2), special tokens
+included. Chunks sized with a different tokenizer or a larger budget are
+silently cut off when embedded, and the tail is tokenized and padded for
+nothing. Step 2 therefore chunks with the embedding model's tokenizer and
+a budget of max_seq_length minus the special tokens the model adds.
+
+The limit is read from the model's sentence_bert_config.json (as
+sentence-transformers does) without loading the model weights, falling
+back to the tokenizer's model_max_length.
+
+Usage (inside a stage script):
+    limit, budget = token_limits(model_name)
+    chunker = create_chunker(budget, model_name)
+"""
+
+import json
+from pathlib import Path
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Used when neither sentence_bert_config.json nor the tokenizer state a limit
+FALLBACK_TOKEN_LIMIT = 512
+
+
+def _model_file(model_name: str, filename: str):
+    """Path of a file of a local model directory or Hugging Face Hub model, or None."""
+    local = Path(model_name) / filename
+    if local.exists():
+        return local
+    try:
+        from huggingface_hub import hf_hub_download
+
+        return Path(hf_hub_download(hub_model_name(model_name), filename))
+    except Exception:
+        return None
+
+
+def hub_model_name(model_name: str) -> str:
+    """Full Hub name; sentence-transformers accepts short names like all-MiniLM-L6-v2."""
+    if "/" in model_name or Path(model_name).exists():
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+def load_model_tokenizer(model_name: str):
+    """Load the (fast) tokenizer of an embedding model without its weights."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(hub_model_name(model_name))
+
+
+def model_token_limit(model_name: str, tokenizer=None) -> int:
+    """Maximum input length of an embedding model in tokens (special tokens included)."""
+    config_file = _model_file(model_name, "sentence_bert_config.json")
+    if config_file is not None:
+        with open(config_file, encoding="utf-8") as f:
+            limit = json.load(f).get("max_seq_length")
+        if limit:
+            return int(limit)
+
+    tokenizer = tokenizer or load_model_tokenizer(model_name)
+    limit = getattr(tokenizer, "model_max_length", None)
+    # Tokenizers without a limit report a huge sentinel value
+    if limit and limit < 1_000_000:
+        return int(limit)
+    return FALLBACK_TOKEN_LIMIT
+
+
+def token_limits(model_name: str) -> tuple:
+    """Token limit of a model and the chunk budget that fits into it.
+
+    Returns:
+        (limit, budget): limit counts special tokens, budget is what
+        is left for chunk text ([CLS] and [SEP] take 2 for BERT models)
+    """
+    tokenizer = load_model_tokenizer(model_name)
+    limit = model_token_limit(model_name, tokenizer)
+    return limit, limit - tokenizer.num_special_tokens_to_add(pair=False)
+
+
+def count_over_limit(tokenizer, texts: list, limit: int) -> int:
+    """Number of texts longer than `limit` tokens as the model would encode them.
+
+    Args:
+        tokenizer: Hugging Face tokenizer of the embedding model
+        texts: Chunk texts
+        limit: Model token limit (from model_token_limit())
+    """
+    if not texts:
+        return 0
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return sum(1 for ids in encoded["input_ids"] if len(ids) > limit)
+
+
+def collection_embedding_model(chroma_db_path: str, collection_name: str) -> str:
+    """Embedding model recorded in a collection's metadata (step 4)."""
+    from vector_store import open_client
+
+    client = open_client(chroma_db_path)
+    metadata = client.get_collection(collection_name).metadata or {}
+    model_name = metadata.get("embedding_model")
+    if not model_name:
+        raise ValueError(f"Collection {collection_name} does not record its embedding model")
+    return model_name
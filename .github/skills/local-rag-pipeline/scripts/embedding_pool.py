@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Multi-process CPU embedding pool with per-worker core pinning.
+
+One encode() call on a many-core CPU does not scale linearly: the
+intra-op thread pool of PyTorch (or ONNX Runtime) synchronizes after
+every operator, and small matrices leave most threads waiting. Several
+encoder processes with a few threads each keep more cores busy.
+
+Each worker process
+- takes a slice of the cores this process may run on from a queue and
+  pins itself to it (os.sched_setaffinity, Linux),
+- limits its intra-op threads to the slice size (torch.set_num_threads,
+  or the ONNX Runtime session options),
+- loads its own copy of the model once, in the pool initializer.
+
+Batches are formed by the caller (3_generate_embeddings.py), handed to
+the workers through the executor's call queue, and the results are
+returned in submission order, so the output does not depend on the
+number of workers or on which worker finishes first.
+
+tune_pool() measures a few workers x threads splits of the machine on
+sample texts and returns the fastest; the choice is remembered per
+machine, model and backend in ~/.cache/local-rag-pipeline/pool_tuning.json.
+
+Usage (inside a stage script):
+    with EmbeddingPool(model_name, "onnx", workers=4, threads_per_worker=4) as pool:
+        rows = pool.encode_batches([texts_a, texts_b])
+"""
+
+import os
+import json
+import time
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from embedding_backends import load_backend_model
+from embedding_models import hub_model_name, load_model_tokenizer, model_token_limit
+
+TUNING_PATH = Path.home() / ".cache" / "local-rag-pipeline" / "pool_tuning.json"
+
+
+def available_cores() -> list:
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_slices(workers: int, threads_per_worker: int) -> list:
+    """Disjoint core lists, one per worker (wrapping around if oversubscribed)."""
+    cores = available_cores()
+    return [
+        [cores[(w * threads_per_worker + t) % len(cores)] for t in range(threads_per_worker)]
+        for w in range(workers)
+    ]
+
+
+# Per-process model for the pool workers, created by the pool initializer
+_model = None
+
+
+def _init_worker(model_name: str, backend: str, onnx_dir: str, threads: int, slices):
+    global _model
+    cores = slices.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Keep tokenizer and BLAS thread pools within the slice as well
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "RAYON_NUM_THREADS"):
+        os.environ[name] = str(threads)
+
+    import torch
+
+    torch.set_num_threads(threads)
+    _model = load_backend_model(model_name, backend, "cpu", onnx_dir, threads=threads)
+
+
+def _encode_batch(texts: list) -> np.ndarray:
+    return _model.encode(
+        texts,
+        batch_size=len(texts),
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+
+
+class EmbeddingPool:
+    """Encoder processes pinned to disjoint core slices.
+
+    Offers what step 3 needs from a SentenceTransformer for batching
+    (tokenizer, max_seq_length) without loading the model in this
+    process.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = "torch",
+        onnx_dir: str = None,
+        workers: int = 2,
+        threads_per_worker: int = None,
+    ):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, len(available_cores()) // workers)
+        self.tokenizer = load_model_tokenizer(model_name)
+        self.max_seq_length = model_token_limit(model_name, self.tokenizer)
+
+        # spawn: torch and the tokenizers library must not be forked after first use
+        context = multiprocessing.get_context("spawn")
+        slices = context.Queue()
+        for cores in core_slices(workers, self.threads_per_worker):
+            slices.put(cores)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_name, backend, onnx_dir, self.threads_per_worker, slices),
+        )
+        # Start every worker (and load its model) before the first batch
+        list(self.executor.map(_encode_batch, [["warm-up"]] * workers))
+
+    def encode_batches(self, batches: list) -> list:
+        """Encode lists of texts in parallel, one list per task.
+
+        Returns:
+            Normalized embedding arrays, in the order of batches
+        """
+        return list(self.executor.map(_encode_batch, batches))
+
+    def encode(self, texts: list, batch_size: int) -> np.ndarray:
+        """Encode texts in consecutive batches of batch_size, in parallel."""
+        batches = [texts[start : start + batch_size] for start in range(0, len(texts), batch_size)]
+        return np.concatenate(self.encode_batches(batches))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def candidate_splits(num_cores: int = None) -> list:
+    """workers x threads splits that use all cores: 1 x n, 2 x n/2, 4 x n/4, ..."""
+    num_cores = num_cores or len(available_cores())
+    splits = []
+    workers = 1
+    while workers <= num_cores:
+        splits.append((workers, num_cores // workers))
+        workers *= 2
+    return splits
+
+
+def _tuning_key(model_name: str, backend: str, batch_size: int) -> str:
+    return f"{platform.node()}:{len(available_cores())}:{hub_model_name(model_name)}:{backend}:{batch_size}"
+
+
+def tune_pool(
+    model_name: str,
+    backend: str,
+    onnx_dir: str,
+    texts: list,
+    batch_size: int,
+    retune: bool = False,
+) -> tuple:
+    """Fastest workers x threads split of this machine for encoding `texts`.
+
+    Every split of candidate_splits() encodes the sample texts once after
+    its workers are warmed up. The result is stored in TUNING_PATH and
+    reused by later runs with the same machine, model, backend and batch
+    size unless `retune` is set.
+
+    Returns:
+        (workers, threads_per_worker)
+    """
+    key = _tuning_key(model_name, backend, batch_size)
+    tuning = {}
+    if TUNING_PATH.exists():
+        with open(TUNING_PATH, encoding="utf-8") as f:
+            tuning = json.load(f)
+    if key in tuning and not retune:
+        workers, threads = tuning[key]["split"]
+        print(f"Using tuned split: {workers} workers x {threads} threads (from {TUNING_PATH})")
+        return workers, threads
+
+    batches = [texts[start : start + batch_size] for start in range(0, len(texts), batch_size)]
+    print(f"Auto-tuning on {len(texts)} chunks ({len(available_cores())} cores):")
+    results = {}
+    for workers, threads in candidate_splits():
+        with EmbeddingPool(model_name, backend, onnx_dir, workers, threads) as pool:
+            start = time.perf_counter()
+            pool.encode_batches(batches)
+            seconds = time.perf_counter() - start
+        results[(workers, threads)] = len(texts) / seconds
+        print(f"  {workers:>3} workers x {threads:>3} threads: {results[(workers, threads)]:.1f} chunks/s")
+
+    best = max(results, key=results.get)
+    print(f"Best: {best[0]} workers x {best[1]} threads")
+    tuning[key] = {"split": list(best), "chunks_per_s": results[best]}
+    TUNING_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(TUNING_PATH, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, indent=2)
+    return best
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Embedding file formats (hand-off from step 3 to step 4).
+
+Formats:
+- npy (default): a shard of four files per chunk file, which step 4
+  opens without decompressing or unpickling anything:
+
+    <stem>_embeddings.npy          vectors, float32 or float16, opened with
+                                   mmap_mode="r": rows are read on access
+    <stem>_records.jsonl           one {"id", "text", "metadata"} object
+                                   per line, in vector order
+    <stem>_records.offsets.npy     int64 (num_chunks + 1,) byte offsets of
+                                   the lines, for reading any row range
+    <stem>_embeddings.json         header: model_name, embedding_dim, dtype,
+                                   count, ids, SHA-256 of the data files
+
+  The header is written last (atomically) and names the shard in the
+  manifests of steps 3 and 4. Its checksums change whenever vectors or
+  records do, so step 4 sees every rewrite.
+- npz: one compressed `<stem>_embeddings.npz` with the embeddings and the
+  texts, metadata and IDs as JSON strings (the format of earlier
+  versions). Must be decompressed and parsed completely when opened.
+
+open_embedding_file() reads both, so embedding directories written by
+earlier versions stay indexable. Writing one format removes the other
+format's files of the same stem.
+
+Usage (inside a stage script):
+    write_shard(header_path, embeddings, ids, record_lines, model_name, "float16")
+    data = open_embedding_file(path)
+    rows = data.embeddings[indices]            # memory-mapped for npy
+    records = data.records(start, stop)        # only these lines are read
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+STORE_FORMATS = ["npy", "npz"]
+DTYPES = ["float32", "float16"]
+STORE_VERSION = 1
+
+HEADER_SUFFIX = "_embeddings.json"
+NPZ_SUFFIX = "_embeddings.npz"
+VECTORS_SUFFIX = "_embeddings.npy"
+RECORDS_SUFFIX = "_records.jsonl"
+OFFSETS_SUFFIX = "_records.offsets.npy"
+
+
+def embedding_file_name(stem: str, fmt: str = "npy") -> str:
+    """Name of the file that identifies a chunk file's embeddings (header or NPZ)."""
+    return f"{stem}{HEADER_SUFFIX if fmt == 'npy' else NPZ_SUFFIX}"
+
+
+def embedding_file_stem(path: Path) -> str:
+    """Stem of an embedding file (inverse of embedding_file_name())."""
+    name = Path(path).name
+    for suffix in (HEADER_SUFFIX, NPZ_SUFFIX):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return Path(path).stem
+
+
+def embedding_file_paths(path: Path) -> list:
+    """Every file belonging to an embedding file, the header last."""
+    path = Path(path)
+    if path.name.endswith(NPZ_SUFFIX):
+        return [path]
+    stem = path.parent / embedding_file_stem(path)
+    return [
+        Path(f"{stem}{VECTORS_SUFFIX}"),
+        Path(f"{stem}{RECORDS_SUFFIX}"),
+        Path(f"{stem}{OFFSETS_SUFFIX}"),
+        path,
+    ]
+
+
+def find_embedding_files(embeddings_dir: Path) -> list:
+    """Embedding files of either format in a directory, sorted by name."""
+    embeddings_dir = Path(embeddings_dir)
+    files = list(embeddings_dir.glob(f"*{HEADER_SUFFIX}"))
+    files.extend(embeddings_dir.glob(f"*{NPZ_SUFFIX}"))
+    return sorted(files)
+
+
+def existing_embedding_files(path: Path) -> list:
+    """Embedding files of the same stem as `path` on disk, in either format."""
+    path = Path(path)
+    stem = embedding_file_stem(path)
+    candidates = [path.parent / embedding_file_name(stem, fmt) for fmt in STORE_FORMATS]
+    return [candidate for candidate in candidates if candidate.exists()]
+
+
+def remove_embedding_files(path: Path, keep: Path = None):
+    """Delete the embedding files of `path`'s stem in every format except `keep`."""
+    for existing in existing_embedding_files(path):
+        if keep is not None and existing == Path(keep):
+            continue
+        for file in embedding_file_paths(existing):
+            if file.exists():
+                file.unlink()
+
+
+def record_line(chunk_id: str, text_json: str, metadata_json: str) -> str:
+    """Line of the records file, from an already JSON-encoded text and metadata."""
+    return f'{{"id": {json.dumps(chunk_id)}, "text": {text_json}, "metadata": {metadata_json}}}\n'
+
+
+def write_shard(
+    header_path: Path,
+    embeddings: np.ndarray,
+    ids: list,
+    record_lines,
+    model_name: str,
+    dtype: str = "float32",
+):
+    """Write an npy shard.
+
+    Args:
+        header_path: <stem>_embeddings.json; the other files go next to it
+        embeddings: (num_chunks, dim) array
+        ids: Chunk IDs, in row order
+        record_lines: Lines of the records file, in row order (record_line())
+        model_name: Embedding model the vectors were computed with
+        dtype: "float32" or "float16" for the stored vectors
+    """
+    vectors_path, records_path, offsets_path, header_path = embedding_file_paths(header_path)
+    vectors = np.ascontiguousarray(embeddings, dtype=dtype)
+    np.save(vectors_path, vectors)
+
+    records_digest = hashlib.sha256()
+    offsets = [0]
+    with open(records_path, "wb") as f:
+        for line in record_lines:
+            data = line.encode("utf-8")
+            f.write(data)
+            records_digest.update(data)
+            offsets.append(offsets[-1] + len(data))
+    if len(offsets) - 1 != len(vectors):
+        raise ValueError(f"{len(offsets) - 1} records for {len(vectors)} embeddings")
+    np.save(offsets_path, np.array(offsets, dtype=np.int64))
+
+    header = {
+        "version": STORE_VERSION,
+        "model_name": model_name,
+        "embedding_dim": int(vectors.shape[1]),
+        "dtype": dtype,
+        "count": len(vectors),
+        "ids": list(ids),
+        "sha256": {
+            "embeddings": hashlib.sha256(vectors.tobytes()).hexdigest(),
+            "records": records_digest.hexdigest(),
+        },
+    }
+    tmp_path = header_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False)
+    os.replace(tmp_path, header_path)
+
+
+class EmbeddingFile:
+    """Read access to the embeddings of one chunk file, in either format.
+
+    Attributes:
+        model_name: Embedding model of the vectors
+        embedding_dim: Vector dimension
+        ids: Chunk IDs in row order (None for NPZs from before chunk IDs)
+        embeddings: (count, dim) array; memory-mapped for npy shards
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if self.path.name.endswith(NPZ_SUFFIX):
+            self._open_npz()
+        else:
+            self._open_shard()
+
+    def _open_npz(self):
+        with np.load(self.path) as data:
+            self.model_name = str(data["model_name"])
+            self.embeddings = data["embeddings"]
+            self.embedding_dim = int(data["embedding_dim"])
+            self.ids = json.loads(str(data["ids"])) if "ids" in data.files else None
+            texts = json.loads(str(data["texts"]))
+            metadata = json.loads(str(data["metadata"]))
+        self._records = [
+            {"id": chunk_id, "text": text, "metadata": meta}
+            for chunk_id, text, meta in zip(self.ids or [None] * len(texts), texts, metadata)
+        ]
+        self.dtype = str(self.embeddings.dtype)
+
+    def _open_shard(self):
+        vectors_path, self._records_path, offsets_path, _ = embedding_file_paths(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported embedding store version {header.get('version')}")
+        self.model_name = header["model_name"]
+        self.embedding_dim = header["embedding_dim"]
+        self.dtype = header["dtype"]
+        self.ids = header["ids"]
+        self.embeddings = np.load(vectors_path, mmap_mode="r")
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        self._records = None
+        if len(self.embeddings) != header["count"] or len(self._offsets) != header["count"] + 1:
+            raise ValueError(f"Incomplete embedding shard {self.path.name}")
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    def records(self, start: int = 0, stop: int = None) -> list:
+        """{"id", "text", "metadata"} of rows start:stop.
+
+        For npy shards only the bytes of these rows are read from the
+        records file.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if self._records is not None:
+            return self._records[start:stop]
+        if start >= stop:
+            return []
+        begin, end = int(self._offsets[start]), int(self._offsets[stop])
+        with open(self._records_path, "rb") as f:
+            f.seek(begin)
+            data = f.read(end - begin)
+        return [json.loads(line) for line in data.splitlines()]
+
+
+def open_embedding_file(path: Path) -> EmbeddingFile:
+    """Open an npy shard (by its header) or an NPZ file for reading."""
+    return EmbeddingFile(path)
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Lightweight extraction for documents that do not need Docling's layout
+analysis: Markdown, plain text, and born-digital PDFs without tables.
+
+triage() cheaply decides per file whether the fast path is safe; extract()
+builds a DoclingDocument directly (headings, paragraphs, list items, page
+provenance with bounding boxes) so the rest of the pipeline - Markdown
+export, HybridChunker, metadata extraction - works unchanged.
+
+PDF probing and extraction use pypdfium2, which Docling already depends on.
+Anything the probe is unsure about (no text layer, table-like layout,
+Markdown tables, probe errors) goes to the full DocumentConverter.
+"""
+
+import re
+import hashlib
+from pathlib import Path
+from collections import Counter
+
+from docling_core.types.doc import (
+    BoundingBox,
+    CoordOrigin,
+    DocItemLabel,
+    DoclingDocument,
+    GroupLabel,
+    ProvenanceItem,
+    Size,
+)
+from docling_core.types.doc.document import DocumentOrigin
+
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_raw
+except ImportError:
+    pdfium = None
+
+TEXT_EXTENSIONS = {".txt"}
+MARKDOWN_EXTENSIONS = {".md", ".markdown"}
+
+_MIMETYPES = {
+    ".pdf": "application/pdf",
+    ".md": "text/markdown",
+    ".markdown": "text/markdown",
+    ".txt": "text/plain",
+}
+
+# PDF probe thresholds
+MIN_CHARS_PER_PAGE = 80  # below this a page is treated as scanned (needs OCR)
+COLUMN_GAP_PT = 20.0  # horizontal gap between text runs that suggests a table cell
+MIN_TABLE_ROWS = 3  # consecutive multi-cell lines that count as a table
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_RE = re.compile(r"^\s*(?:([-*+])|(\d+)[.)])\s+(.*)$")
+_TABLE_ROW_RE = re.compile(r"^\s*\|.*\|\s*$")
+_TABLE_RULE_RE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)+\|?\s*$")
+
+
+def triage(file_path: Path) -> tuple:
+    """Decide whether a file can skip Docling's layout pipeline.
+
+    Returns:
+        (use_fast_path, reason) where reason explains the decision
+    """
+    suffix = file_path.suffix.lower()
+    if suffix in TEXT_EXTENSIONS:
+        return True, "plain text"
+    if suffix in MARKDOWN_EXTENSIONS:
+        lines = _read_text(file_path).splitlines()
+        for prev, line in zip(lines, lines[1:]):
+            if _TABLE_ROW_RE.match(prev) and _TABLE_RULE_RE.match(line):
+                return False, "markdown table"
+        return True, "markdown"
+    if suffix == ".pdf":
+        if pdfium is None:
+            return False, "pypdfium2 not installed"
+        try:
+            return _probe_pdf(file_path)
+        except Exception as e:
+            return False, f"probe failed: {e}"
+    return False, "needs layout analysis"
+
+
+def extract(file_path: Path) -> DoclingDocument:
+    """Build a DoclingDocument without layout analysis (call triage() first)."""
+    suffix = file_path.suffix.lower()
+    doc = DoclingDocument(name=file_path.stem)
+    doc.origin = DocumentOrigin(
+        mimetype=_MIMETYPES.get(suffix, "application/octet-stream"),
+        binary_hash=_binary_hash(file_path),
+        filename=file_path.name,
+    )
+
+    if suffix == ".pdf":
+        _extract_pdf(doc, file_path)
+    elif suffix in MARKDOWN_EXTENSIONS:
+        _extract_markdown(doc, _read_text(file_path))
+    else:
+        _extract_plain_text(doc, _read_text(file_path))
+    return doc
+
+
+def _binary_hash(file_path: Path) -> int:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return int.from_bytes(digest.digest()[:8], "big")
+
+
+def _read_text(file_path: Path) -> str:
+    data = file_path.read_bytes()
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _paragraphs(lines: list):
+    """Yield blocks of consecutive non-blank lines."""
+    block = []
+    for line in lines:
+        if line.strip():
+            block.append(line.strip())
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _extract_plain_text(doc: DoclingDocument, text: str):
+    for block in _paragraphs(text.splitlines()):
+        doc.add_text(label=DocItemLabel.TEXT, text=" ".join(block))
+
+
+def _extract_markdown(doc: DoclingDocument, text: str):
+    paragraph = []
+    list_group = None
+    code_lines = None
+
+    def flush_paragraph():
+        if paragraph:
+            doc.add_text(label=DocItemLabel.TEXT, text=" ".join(paragraph))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+
+        if code_lines is not None:
+            if stripped.startswith("```"):
+                doc.add_text(label=DocItemLabel.CODE, text="\n".join(code_lines))
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+        if stripped.startswith("```"):
+            flush_paragraph()
+            list_group = None
+            code_lines = []
+            continue
+
+        heading = _HEADING_RE.match(stripped)
+        list_item = _LIST_RE.match(line)
+        if not stripped:
+            flush_paragraph()
+            list_group = None
+        elif heading:
+            flush_paragraph()
+            list_group = None
+            doc.add_heading(text=heading.group(2), level=len(heading.group(1)))
+        elif list_item:
+            flush_paragraph()
+            if list_group is None:
+                list_group = doc.add_group(label=GroupLabel.LIST)
+            doc.add_list_item(
+                text=list_item.group(3),
+                enumerated=list_item.group(2) is not None,
+                parent=list_group,
+            )
+        else:
+            # A plain line ends the current list
+            list_group = None
+            paragraph.append(stripped)
+
+    flush_paragraph()
+    if code_lines:
+        doc.add_text(label=DocItemLabel.CODE, text="\n".join(code_lines))
+
+
+def _font_size(textpage, rect) -> float:
+    """Font size of the first character inside a text rect."""
+    left, bottom, _, top = rect
+    index = textpage.get_index(left + 0.5, (bottom + top) / 2, 2, 2)
+    if index is None or index < 0:
+        return top - bottom
+    return pdfium_raw.FPDFText_GetFontSize(textpage.raw, index)
+
+
+def _page_lines(textpage, with_font_size: bool = False) -> list:
+    """Group pdfium text rects into lines.
+
+    Returns:
+        List of (rects, texts, font_size) per line, in content order; each
+        rect is (left, bottom, right, top) in PDF points from the
+        bottom-left. font_size is 0 unless with_font_size is set.
+    """
+    lines = []
+    for i in range(textpage.count_rects()):
+        rect = textpage.get_rect(i)
+        text = textpage.get_text_bounded(*rect).strip()
+        if not text:
+            continue
+        if lines:
+            prev_rects, prev_texts, _ = lines[-1]
+            _, bottom, _, top = prev_rects[-1]
+            mid = (rect[1] + rect[3]) / 2
+            if bottom <= mid <= top and rect[0] >= prev_rects[-1][2]:
+                prev_rects.append(rect)
+                prev_texts.append(text)
+                continue
+        size = round(_font_size(textpage, rect), 1) if with_font_size else 0
+        lines.append(([rect], [text], size))
+    return lines
+
+
+def _is_table_row(rects: list) -> bool:
+    if len(rects) < 3:
+        return False
+    gaps = [b[0] - a[2] for a, b in zip(rects, rects[1:])]
+    return sum(gap >= COLUMN_GAP_PT for gap in gaps) >= 2
+
+
+def _probe_pdf(file_path: Path) -> tuple:
+    pdf = pdfium.PdfDocument(str(file_path))
+    try:
+        for page_index in range(len(pdf)):
+            textpage = pdf[page_index].get_textpage()
+            if textpage.count_chars() < MIN_CHARS_PER_PAGE:
+                return False, f"no text layer on page {page_index + 1}"
+
+            table_rows = 0
+            for rects, _, _ in _page_lines(textpage):
+                table_rows = table_rows + 1 if _is_table_row(rects) else 0
+                if table_rows >= MIN_TABLE_ROWS:
+                    return False, f"table-like layout on page {page_index + 1}"
+        return True, "text layer, no tables"
+    finally:
+        pdf.close()
+
+
+def _extract_pdf(doc: DoclingDocument, file_path: Path):
+    pdf = pdfium.PdfDocument(str(file_path))
+    try:
+        pages = []
+        for page_index in range(len(pdf)):
+            page = pdf[page_index]
+            width, height = page.get_size()
+            page_no = page_index + 1
+            doc.add_page(page_no=page_no, size=Size(width=width, height=height))
+            pages.append((page_no, _page_lines(page.get_textpage(), True)))
+
+        # Body text = most common font size; short lines set larger are headings,
+        # ranked by size (largest = level 1)
+        sizes = [size for _, lines in pages for _, _, size in lines]
+        body_size = Counter(sizes).most_common(1)[0][0] if sizes else 0
+        heading_sizes = sorted({s for s in sizes if s > body_size * 1.1}, reverse=True)
+
+        for page_no, lines in pages:
+            block = []
+            for rects, texts, size in lines:
+                height = rects[0][3] - rects[0][1]
+                text = " ".join(texts)
+                if size in heading_sizes and len(text) < 120:
+                    _add_pdf_block(doc, page_no, block)
+                    block = []
+                    level = heading_sizes.index(size) + 1
+                    doc.add_heading(
+                        text=text,
+                        level=min(level, 6),
+                        prov=_prov(page_no, rects, text),
+                    )
+                    continue
+                if block:
+                    prev_bottom = min(r[1] for r in block[-1][0])
+                    if prev_bottom - rects[0][3] > height:
+                        _add_pdf_block(doc, page_no, block)
+                        block = []
+                block.append((rects, text))
+            _add_pdf_block(doc, page_no, block)
+    finally:
+        pdf.close()
+
+
+def _add_pdf_block(doc: DoclingDocument, page_no: int, block: list):
+    """Add a paragraph built from consecutive lines of one page."""
+    if not block:
+        return
+    text = " ".join(text for _, text in block)
+    rects = [r for rects, _ in block for r in rects]
+    doc.add_text(label=DocItemLabel.TEXT, text=text, prov=_prov(page_no, rects, text))
+
+
+def _prov(page_no: int, rects: list, text: str) -> ProvenanceItem:
+    bbox = BoundingBox(
+        l=min(r[0] for r in rects),
+        t=max(r[3] for r in rects),
+        r=max(r[2] for r in rects),
+        b=min(r[1] for r in rects),
+        coord_origin=CoordOrigin.BOTTOMLEFT,
+    )
+    return ProvenanceItem(page_no=page_no, bbox=bbox, charspan=(0, len(text)))
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Single-writer index service for one ChromaDB database.
+
+ChromaDB's PersistentClient keeps its data in SQLite, which allows one
+writer at a time, so two indexing processes must not open the same
+database. The index server owns the only client of a database directory
+(either vector store, see vector_store.py) and accepts writes from any number of producer processes
+(step 4 and stream_pipeline.py with --server) over a Unix socket in that
+directory:
+
+    <chroma_db_path>/index_server.sock   socket (AF_UNIX)
+    <chroma_db_path>/index_server.key    random authentication key (0600)
+
+One thread per connection receives requests; a single writer thread
+applies them in arrival order. Consecutive upserts (or metadata updates)
+to the same collection, also from different producers, are coalesced
+into one call of up to the client's maximum batch size; the server waits
+up to --linger-ms for more requests before writing a partial batch.
+With the hnsw store, the index files are saved whenever the server is
+idle (and at least once a minute), not only when it stops.
+A request is acknowledged after the ChromaDB call that contains it has
+returned, i.e. once its rows are committed; a failed call fails every
+request in it. Requests still queued when the server stops, or arriving
+while it stops, fail with "index server stopping".
+
+Producers use IndexClient in place of chromadb's client: its
+collections are stand-ins with the methods the pipeline calls (upsert,
+update, delete, get), so the indexing code is the same with and without
+the server.
+
+Usage:
+    python index_server.py <chroma_db_path> [--linger-ms MS] [--max-batch N] [--store chroma|hnsw]
+    python index_server.py <chroma_db_path> --status
+    python index_server.py <chroma_db_path> --stop
+
+Example:
+    python index_server.py .rag/chromadb/ &
+    python 4_index_to_chromadb.py project_a/embeddings/ .rag/chromadb/ --collection docs --server &
+    python stream_pipeline.py project_b/ .rag/chromadb/ --collection docs --server
+"""
+
+import os
+import sys
+import time
+import queue
+import hashlib
+import argparse
+import importlib
+import threading
+from pathlib import Path
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from vector_store import VECTOR_STORES, open_client, persist
+
+SOCKET_NAME = "index_server.sock"
+KEY_NAME = "index_server.key"
+DEFAULT_LINGER_MS = 20
+# Index files of the hnsw store are saved when no request arrived for this
+# long, and at least this often while requests keep arriving
+IDLE_SAVE_SECONDS = 0.5
+SAVE_INTERVAL_SECONDS = 60
+# Reply to requests the server will not apply any more
+STOPPING_ERROR = "index server stopping"
+# Seconds to wait on shutdown for replies to reach their producers
+SHUTDOWN_TIMEOUT = 5
+
+# Requests that carry rows and can share one ChromaDB call
+_COALESCED = ("upsert", "update")
+
+
+def socket_path(chroma_db_path: str) -> Path:
+    """Socket of the index server of a database directory."""
+    return Path(chroma_db_path) / SOCKET_NAME
+
+
+def read_authkey(chroma_db_path: str) -> bytes:
+    """Authentication key written by the running server."""
+    key_file = Path(chroma_db_path) / KEY_NAME
+    if not key_file.exists():
+        raise ConnectionError(
+            f"No index server for {chroma_db_path}; start: python index_server.py {chroma_db_path}"
+        )
+    return bytes.fromhex(key_file.read_text().strip())
+
+
+def producer_manifest_name(prefix: str, source_dir: str) -> str:
+    """Manifest file name of one producer of a shared collection.
+
+    Producers feeding one collection through the server each keep their
+    own manifest, keyed by their source directory, so they do not remove
+    each other's files as stale.
+    """
+    digest = hashlib.sha256(str(Path(source_dir).resolve()).encode("utf-8")).hexdigest()[:8]
+    return f"{prefix}-{digest}.json"
+
+
+class IndexClient:
+    """Connection of a producer process to the index server.
+
+    Every call blocks until the server has applied the request. The
+    connection may be shared by threads (BatchedWriter writes from a
+    background thread).
+    """
+
+    def __init__(self, chroma_db_path: str):
+        self.address = str(socket_path(chroma_db_path))
+        try:
+            self.connection = Client(
+                self.address, family="AF_UNIX", authkey=read_authkey(chroma_db_path)
+            )
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(
+                f"Index server for {chroma_db_path} is not running ({e})"
+            ) from e
+        self.lock = threading.Lock()
+
+    def call(self, op: str, **request):
+        """Send one request and return its result; server errors are raised."""
+        request["op"] = op
+        with self.lock:
+            try:
+                self.connection.send(request)
+                status, result = self.connection.recv()
+            except (EOFError, OSError) as e:
+                raise ConnectionError(
+                    f"Index server at {self.address} closed the connection (stopped?)"
+                ) from e
+        if status == "error":
+            raise RuntimeError(f"Index server: {result}")
+        return result
+
+    def get_or_create_collection(self, name: str, metadata: dict = None):
+        """Get or create a collection on the server (see RemoteCollection)."""
+        metadata = self.call("open", collection=name, metadata=metadata)
+        return RemoteCollection(self, name, metadata)
+
+    def get_max_batch_size(self) -> int:
+        """Rows per write of the server (as chromadb's client method)."""
+        return self.call("info")["max_batch"]
+
+    def close(self):
+        self.connection.close()
+
+
+class RemoteCollection:
+    """Stand-in for a ChromaDB collection whose calls go to the index server."""
+
+    def __init__(self, client: IndexClient, name: str, metadata: dict):
+        self.client = client
+        self.name = name
+        self.metadata = metadata
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.client.call(
+            "upsert",
+            collection=self.name,
+            ids=list(ids),
+            embeddings=np.asarray(embeddings, dtype=np.float32),
+            documents=list(documents),
+            metadatas=list(metadatas),
+        )
+
+    def update(self, ids, metadatas):
+        self.client.call("update", collection=self.name, ids=list(ids), metadatas=list(metadatas))
+
+    def delete(self, ids):
+        self.client.call("delete", collection=self.name, ids=list(ids))
+
+    def get(self, ids, include=None):
+        """IDs of `ids` the collection holds (only {"ids": ...} is returned)."""
+        return {"ids": self.client.call("get", collection=self.name, ids=list(ids))}
+
+    def count(self) -> int:
+        return self.client.call("count", collection=self.name)
+
+
+class IndexServer:
+    """Owns the database's client and applies producer requests in order."""
+
+    def __init__(
+        self,
+        chroma_db_path: str,
+        linger_ms: int = DEFAULT_LINGER_MS,
+        max_batch: int = None,
+        store: str = None,
+    ):
+        # The stage script starts with a digit, so it cannot be imported by name
+        index_stage = importlib.import_module("4_index_to_chromadb")
+
+        self.path = Path(chroma_db_path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        address = socket_path(self.path)
+        if address.exists():
+            try:
+                IndexClient(str(self.path)).close()
+                raise RuntimeError(f"An index server is already running for {self.path}")
+            except ConnectionError:
+                address.unlink()  # left over from a crashed server
+        self.client = open_client(str(self.path), store)
+        self.max_batch = max_batch or index_stage.max_batch_size(self.client)
+        self.linger = linger_ms / 1000
+        self.requests = queue.Queue()
+        self.collections = {}
+        self.stats = {"requests": 0, "calls": 0, "rows": 0, "errors": 0, "producers": 0}
+        self.stopping = threading.Event()
+        # Requests queued and not yet answered; guards queueing against shutdown
+        self.in_flight = 0
+        self.in_flight_changed = threading.Condition()
+        self.started = time.time()
+
+    def serve(self):
+        """Listen on the socket until --stop (or Ctrl+C)."""
+        address = socket_path(self.path)
+        authkey = os.urandom(32)
+        key_file = self.path / KEY_NAME
+        with open(os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(authkey.hex())
+        listener = Listener(str(address), family="AF_UNIX", authkey=authkey)
+        os.chmod(address, 0o600)
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+
+        print(f"Index server for {self.path} listening on {address}")
+        print(f"Max. batch: {self.max_batch} rows, linger: {self.linger * 1000:.0f} ms")
+        try:
+            self._write_loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stopping.set()
+            listener.close()
+            self._drain()
+            for path in (address, key_file):
+                if path.exists():
+                    path.unlink()
+            print(f"Index server stopped: {self._stats_line()}")
+
+    def _accept(self, listener: Listener):
+        while not self.stopping.is_set():
+            try:
+                connection = listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception as e:
+                print(f"  ✗ Rejected connection: {e}")
+                continue
+            self.stats["producers"] += 1
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        """Per-connection thread: queue each request and send back its reply."""
+        reply = queue.Queue(maxsize=1)
+        try:
+            while True:
+                request = connection.recv()
+                with self.in_flight_changed:
+                    stopping = self.stopping.is_set()
+                    if not stopping:
+                        self.in_flight += 1
+                        self.requests.put((request, reply))
+                if stopping:
+                    connection.send(("error", STOPPING_ERROR))
+                    continue
+                try:
+                    connection.send(reply.get())
+                finally:
+                    with self.in_flight_changed:
+                        self.in_flight -= 1
+                        self.in_flight_changed.notify_all()
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _drain(self):
+        """Fail the requests left in the queue and wait until they are answered."""
+        with self.in_flight_changed:
+            while True:
+                try:
+                    _, reply = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                self.stats["errors"] += 1
+                reply.put(("error", STOPPING_ERROR))
+            self.in_flight_changed.wait_for(lambda: self.in_flight == 0, timeout=SHUTDOWN_TIMEOUT)
+
+    def _write_loop(self):
+        last_save = time.monotonic()
+        while not self.stopping.is_set():
+            if time.monotonic() - last_save > SAVE_INTERVAL_SECONDS:
+                self._save()
+                last_save = time.monotonic()
+            try:
+                batch = [self.requests.get(timeout=IDLE_SAVE_SECONDS)]
+            except queue.Empty:
+                self._save()
+                last_save = time.monotonic()
+                continue
+            # Linger briefly so requests of other producers join this write
+            rows = _rows(batch[0][0])
+            deadline = time.monotonic() + self.linger
+            while rows < self.max_batch:
+                try:
+                    item = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += _rows(item[0])
+            self._apply(batch)
+
+    def _save(self):
+        """Write the index files of hnsw collections changed since the last save."""
+        try:
+            persist(list(self.collections.values()))
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"  ✗ Error saving index files: {e}")
+
+    def _apply(self, batch: list):
+        """Apply requests in order, merging runs of coalescible writes."""
+        group = []
+        for request, reply in batch:
+            self.stats["requests"] += 1
+            if request.get("op") in _COALESCED:
+                if group and not _can_join(group, request, self.max_batch):
+                    self._write_group(group)
+                    group = []
+                group.append((request, reply))
+                continue
+            if group:
+                self._write_group(group)
+                group = []
+            try:
+                reply.put(("ok", self._execute(request)))
+            except Exception as e:
+                self.stats["errors"] += 1
+                reply.put(("error", str(e)))
+        if group:
+            self._write_group(group)
+
+    def _write_group(self, group: list):
+        """One ChromaDB call for a run of upserts or updates to one collection."""
+        first = group[0][0]
+        collection = self._collection(first["collection"])
+        requests = [request for request, _ in group]
+        ids = [chunk_id for request in requests for chunk_id in request["ids"]]
+        metadatas = [meta for request in requests for meta in request["metadatas"]]
+        try:
+            if first["op"] == "upsert":
+                collection.upsert(
+                    ids=ids,
+                    embeddings=np.concatenate([request["embeddings"] for request in requests]),
+                    documents=[doc for request in requests for doc in request["documents"]],
+                    metadatas=metadatas,
+                )
+            else:
+                collection.update(ids=ids, metadatas=metadatas)
+            result = ("ok", None)
+            self.stats["calls"] += 1
+            self.stats["rows"] += len(ids)
+        except Exception as e:
+            self.stats["errors"] += 1
+            result = ("error", str(e))
+        for _, reply in group:
+            reply.put(result)
+
+    def _execute(self, request: dict):
+        op = request.get("op")
+        if op == "info":
+            return {"max_batch": self.max_batch, "stats": self._stats_line()}
+        if op == "stop":
+            self.stopping.set()
+            return None
+        if op == "open":
+            collection = self.client.get_or_create_collection(
+                name=request["collection"], metadata=request.get("metadata")
+            )
+            self.collections[request["collection"]] = collection
+            return collection.metadata
+        collection = self._collection(request["collection"])
+        if op == "delete":
+            collection.delete(ids=request["ids"])
+            self.stats["calls"] += 1
+            return None
+        if op == "get":
+            return collection.get(ids=request["ids"], include=[])["ids"] if request["ids"] else []
+        if op == "count":
+            return collection.count()
+        raise ValueError(f"Unknown request {op!r}")
+
+    def _collection(self, name: str):
+        if name not in self.collections:
+            self.collections[name] = self.client.get_collection(name=name)
+        return self.collections[name]
+
+    def _stats_line(self) -> str:
+        stats = self.stats
+        rows_per_call = stats["rows"] / stats["calls"] if stats["calls"] else 0
+        return (
+            f"{stats['producers']} connections, {stats['requests']} requests, "
+            f"{stats['rows']} rows in {stats['calls']} writes ({rows_per_call:.0f} rows/write), "
+            f"{stats['errors']} errors, up {time.time() - self.started:.0f}s"
+        )
+
+
+def _rows(request: dict) -> int:
+    return len(request.get("ids", ())) if request.get("op") in _COALESCED else 0
+
+
+def _can_join(group: list, request: dict, max_batch: int) -> bool:
+    first = group[0][0]
+    if request["op"] != first["op"] or request["collection"] != first["collection"]:
+        return False
+    ids = {chunk_id for r, _ in group for chunk_id in r["ids"]}
+    # ChromaDB rejects repeated IDs within one call
+    if len(ids) + len(request["ids"]) > max_batch or not ids.isdisjoint(request["ids"]):
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-writer index service for a ChromaDB database")
+    parser.add_argument("chroma_db_path", help="Path to ChromaDB database")
+    parser.add_argument(
+        "--linger-ms",
+        type=int,
+        default=DEFAULT_LINGER_MS,
+        help=f"Wait this long for more requests before writing a partial batch (default: {DEFAULT_LINGER_MS})",
+    )
+    parser.add_argument(
+        "--max-batch", type=int, help="Rows per write (default: the ChromaDB client's maximum)"
+    )
+    parser.add_argument(
+        "--store",
+        choices=VECTOR_STORES,
+        help="Vector store of a new database (default: chroma); an existing database keeps its store",
+    )
+    parser.add_argument("--status", action="store_true", help="Show statistics of the running server")
+    parser.add_argument("--stop", action="store_true", help="Stop the running server")
+
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        try:
+            client = IndexClient(args.chroma_db_path)
+        except ConnectionError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(client.call("info")["stats"])
+        if args.stop:
+            client.call("stop")
+            print("Stopping index server")
+        client.close()
+        return
+
+    IndexServer(args.chroma_db_path, args.linger_ms, args.max_batch, args.store).serve()
+
+
+if __name__ == "__main__":
+    main()
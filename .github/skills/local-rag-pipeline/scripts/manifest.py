@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Content-hash manifest for incremental pipeline runs.
+
+Each stage keeps a manifest file next to its outputs. It maps a source key
+(the source path relative to the stage input directory) to the source's
+SHA-256, size and mtime, plus the SHA-256 of every output file the stage
+wrote for it. On the next run a stage only processes sources that are new
+or changed, and removes outputs whose source has disappeared.
+
+Sources that could not be processed safely (e.g. a worker killed for a
+timeout) can be quarantined: they are skipped by later runs until their
+content hash changes.
+
+Usage (inside a stage script):
+    manifest = StageManifest(output_path / MANIFEST_NAME, stage="chunk")
+    if not manifest.is_current(key, source):
+        ...process source, write outputs...
+        manifest.record(key, source, outputs=[output_file])
+    manifest.remove_stale(current_keys)
+    manifest.save()
+
+Quarantine (stage 1):
+    if manifest.quarantine_reason(key, source):
+        ...skip source...
+    ...worker killed while processing source...
+    manifest.quarantine(key, source, "timed out after 600s")
+"""
+
+import json
+import os
+import hashlib
+from pathlib import Path
+
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageManifest:
+    """Source → output bookkeeping for one pipeline stage.
+
+    Output paths are stored relative to the manifest's directory so the
+    whole output tree can be moved without invalidating the manifest.
+    """
+
+    def __init__(self, path: Path, stage: str):
+        self.path = Path(path)
+        self.root = self.path.parent
+        self.stage = stage
+        self.entries = {}
+        self.quarantined = {}
+
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION and data.get("stage") == stage:
+                    self.entries = data.get("entries", {})
+                    self.quarantined = data.get("quarantine", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable manifest {self.path}: {e}")
+
+    @classmethod
+    def load(cls, path: Path):
+        """Open an existing manifest of whichever stage wrote it (e.g. to prune it)."""
+        with open(path, "r", encoding="utf-8") as f:
+            stage = json.load(f).get("stage", "")
+        return cls(path, stage)
+
+    def is_current(self, key: str, source: Path) -> bool:
+        """Check whether `source` is unchanged since it was last recorded.
+
+        Size and mtime are compared first; the file is only hashed when the
+        mtime moved, so an untouched tree costs one stat() per file.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+
+        for rel_path in entry.get("outputs", {}):
+            if not (self.root / rel_path).exists():
+                return False
+
+        return self._source_unchanged(entry, source)
+
+    def _source_unchanged(self, entry: dict, source: Path) -> bool:
+        stat = Path(source).stat()
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+
+        if file_sha256(source) != entry["sha256"]:
+            return False
+
+        # Touched but identical: refresh mtime so the next run takes the fast path
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def quarantine(self, key: str, source: Path, reason: str):
+        """Skip `source` in later runs until its content changes."""
+        stat = Path(source).stat()
+        self.quarantined[key] = {
+            "sha256": file_sha256(source),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "reason": reason,
+        }
+
+    def quarantine_reason(self, key: str, source: Path):
+        """Return why `source` is quarantined, or None.
+
+        A quarantined source whose content changed is released.
+        """
+        entry = self.quarantined.get(key)
+        if entry is None:
+            return None
+        if self._source_unchanged(entry, source):
+            return entry["reason"]
+        del self.quarantined[key]
+        return None
+
+    def release(self, key: str):
+        """Remove `key` from quarantine (e.g. after it was processed)."""
+        self.quarantined.pop(key, None)
+
+    def get(self, key: str) -> dict:
+        """Return the recorded entry for `key`, or an empty dict."""
+        return self.entries.get(key, {})
+
+    def record(self, key: str, source: Path, outputs: list = None, **extra):
+        """Record a successfully processed source and the outputs it produced.
+
+        Args:
+            key: Source key (path relative to the stage input)
+            source: Source file path
+            outputs: Output file paths written for this source
+            **extra: Additional JSON-serializable fields (e.g. indexed IDs)
+        """
+        stat = Path(source).stat()
+        entry = {
+            "sha256": file_sha256(source),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "outputs": {},
+        }
+        for output in outputs or []:
+            output = Path(output)
+            rel_path = os.path.relpath(output, self.root)
+            entry["outputs"][Path(rel_path).as_posix()] = file_sha256(output)
+        entry.update(extra)
+        self.entries[key] = entry
+
+    def discard_outputs(self, key: str):
+        """Delete the output files recorded for `key` (before re-processing it)."""
+        entry = self.entries.get(key, {})
+        for rel_path in entry.get("outputs", {}):
+            output = self.root / rel_path
+            if output.exists():
+                output.unlink()
+            self._prune_empty_dirs(output.parent)
+
+    def remove_stale(self, current_keys) -> dict:
+        """Drop entries (and their output files) whose source is gone.
+
+        Returns:
+            Dict of removed key → entry, for stages that need to clean up
+            more than files (e.g. IDs in a vector store)
+        """
+        current_keys = set(current_keys)
+        for key in list(self.quarantined):
+            if key not in current_keys:
+                del self.quarantined[key]
+
+        removed = {}
+        for key in list(self.entries):
+            if key in current_keys:
+                continue
+            self.discard_outputs(key)
+            removed[key] = self.entries.pop(key)
+        return removed
+
+    def save(self):
+        """Write the manifest atomically."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "stage": self.stage,
+                    "entries": self.entries,
+                    "quarantine": self.quarantined,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+
+    def _prune_empty_dirs(self, directory: Path):
+        directory = Path(directory)
+        while directory != self.root and self.root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+            directory = directory.parent
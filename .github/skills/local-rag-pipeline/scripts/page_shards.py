@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Page-range sharding of large PDFs for parallel parsing.
+
+A single very long PDF otherwise keeps one worker busy for the whole run.
+plan_page_ranges() splits it into contiguous page ranges that workers
+convert independently (DocumentConverter.convert(..., page_range=...)),
+and merge_page_shards() concatenates the partial documents in page order.
+
+Provenance stays correct: DoclingDocument.concatenate() shifts page numbers
+only when a shard's numbering restarts at 1, so shards converted with
+absolute page numbers keep them, and the merged page count is checked
+against the source PDF.
+"""
+
+from pathlib import Path
+
+from docling_core.types.doc import DoclingDocument
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+DEFAULT_SHARD_THRESHOLD = 150  # shard PDFs with more pages than this
+DEFAULT_SHARD_SIZE = 50  # pages per shard
+
+
+def sharding_available() -> bool:
+    """Page counting needs pypdfium2, merging needs DoclingDocument.concatenate."""
+    return pdfium is not None and hasattr(DoclingDocument, "concatenate")
+
+
+def pdf_page_count(file_path: Path) -> int:
+    pdf = pdfium.PdfDocument(str(file_path))
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def plan_page_ranges(file_path: Path, threshold: int, shard_size: int) -> list:
+    """Split a PDF into 1-based inclusive page ranges.
+
+    Returns:
+        List of (first_page, last_page) tuples, or an empty list when the
+        file is not a PDF, is not above the threshold, or sharding is
+        unavailable
+    """
+    if threshold <= 0 or file_path.suffix.lower() != ".pdf" or not sharding_available():
+        return []
+
+    num_pages = pdf_page_count(file_path)
+    if num_pages <= threshold:
+        return []
+
+    shard_size = max(1, shard_size)
+    return [
+        (start, min(start + shard_size - 1, num_pages))
+        for start in range(1, num_pages + 1, shard_size)
+    ]
+
+
+def merge_page_shards(file_path: Path, shards: dict) -> DoclingDocument:
+    """Concatenate per-range documents into one document.
+
+    Args:
+        file_path: Source PDF (name, origin and page count of the result)
+        shards: Dict of (first_page, last_page) -> DoclingDocument
+
+    Raises:
+        ValueError: If the merged page numbering does not match the source
+    """
+    ordered = [shards[page_range] for page_range in sorted(shards)]
+    merged = DoclingDocument.concatenate(ordered)
+    merged.name = file_path.stem
+    merged.origin = ordered[0].origin
+
+    expected_pages = max(last for _, last in shards)
+    if merged.pages and max(merged.pages) != expected_pages:
+        raise ValueError(
+            f"page numbering mismatch after merge: last page {max(merged.pages)}, "
+            f"expected {expected_pages}"
+        )
+    return merged
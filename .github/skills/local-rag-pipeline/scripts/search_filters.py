@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Metadata filters of step 5 (--filter-filename, --filter-doc-type).
+
+A chunk collapsed into the canonical chunk of another file (see dedup.py)
+is not indexed itself: the canonical chunk lists it in its "sources"
+metadata, a JSON string no where clause can look into. A filename search
+therefore runs two queries and merges their candidates by distance:
+
+    exact       where filename == X (the file's own chunks)
+    duplicates  where has_duplicates == True and filename != X, fetched
+                FILENAME_OVERFETCH times over and kept if X is among the
+                chunk's sources (chunk_filenames())
+
+The file's own chunks are found exactly, as without deduplication;
+canonical chunks standing in for its collapsed chunks are found when
+they rank within the over-fetched window.
+
+Usage (inside a stage script):
+    results = query_candidates(collections, query_embeddings, 20, filter_filename="a.pdf")
+"""
+
+import json
+
+from shards import federated_query
+
+# Candidates fetched per requested result from other files' canonical
+# chunks: only those listing the file among their sources are kept
+FILENAME_OVERFETCH = 4
+
+
+def chunk_filenames(metadata: dict) -> set:
+    """Files a chunk occurs in: its own and those of its collapsed duplicates."""
+    sources = json.loads(metadata.get("sources", "[]"))
+    return {metadata.get("filename", "")} | {
+        source["source_path"].rsplit("/", 1)[-1] for source in sources
+    }
+
+
+def _where(clauses: list):
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _query(collections: list, n_results: int, where: dict, query_embeddings) -> dict:
+    """One query over one collection or, fanned out, over several shards."""
+    query = {"query_embeddings": query_embeddings}
+    if where:
+        query["where"] = where
+    if len(collections) == 1:
+        count = collections[0].count()
+        if not count:
+            return {key: [[] for _ in query_embeddings] for key in ("ids", "documents", "metadatas", "distances")}
+        return collections[0].query(n_results=min(n_results, count), **query)
+    return federated_query(collections, n_results, **query)
+
+
+def query_candidates(
+    collections: list,
+    query_embeddings,
+    n_results: int,
+    filter_filename: str = None,
+    filter_doc_type: str = None,
+) -> dict:
+    """Nearest chunks matching the filters, from one collection or all shards.
+
+    Args:
+        collections: Collections to search (shards are queried concurrently)
+        query_embeddings: Query vectors (list of lists)
+        n_results: Candidates per query embedding
+        filter_filename: Only chunks occurring in this file, also as a
+            collapsed duplicate
+        filter_doc_type: Only chunks of this document type
+
+    Returns:
+        Query results as of collection.query() (ids, documents, metadatas,
+        distances per query embedding), ranked by distance
+    """
+    doc_type = [{"doc_type": {"$eq": filter_doc_type}}] if filter_doc_type else []
+    if not filter_filename:
+        return _query(collections, n_results, _where(doc_type), query_embeddings)
+
+    exact = _query(
+        collections,
+        n_results,
+        _where([{"filename": {"$eq": filter_filename}}, *doc_type]),
+        query_embeddings,
+    )
+    canonical = _query(
+        collections,
+        n_results * FILENAME_OVERFETCH,
+        _where(
+            [
+                {"has_duplicates": {"$eq": True}},
+                {"filename": {"$ne": filter_filename}},
+                *doc_type,
+            ]
+        ),
+        query_embeddings,
+    )
+
+    merged = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for q in range(len(query_embeddings)):
+        rows = [
+            (distance, chunk_id, document, metadata)
+            for results in (exact, canonical)
+            for chunk_id, document, metadata, distance in zip(
+                results["ids"][q],
+                results["documents"][q],
+                results["metadatas"][q],
+                results["distances"][q],
+            )
+            if filter_filename in chunk_filenames(metadata or {})
+        ]
+        rows.sort(key=lambda row: row[0])
+        rows = rows[:n_results]
+        merged["distances"].append([row[0] for row in rows])
+        merged["ids"].append([row[1] for row in rows])
+        merged["documents"].append([row[2] for row in rows])
+        merged["metadatas"].append([row[3] for row in rows])
+    return merged
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Sharded collections: one collection per project (or other shard key).
+
+Step 4 with --shard-by writes the chunks of each document into the shard
+collection of its shard value instead of one collection, and records the
+shard in the database's shard registry. Step 5 reads the registry: a
+search naming a shard value (--project, e.g. a projekt-id) queries that
+shard only, a portfolio-wide search queries all shards concurrently and
+merges their candidates by distance.
+
+Shard keys (SHARD_KEYS):
+    project   projekt-id recorded by step 1: its --project option, or the
+              first folder of the source path when the documents/ root
+              was parsed (documents/{projekt-id}/...); see source_project()
+    doc_type  document type of step 1
+
+Step 4 refuses to shard a document without a project by project (a single
+project parsed without --project), instead of creating shards named after
+its document-type folders.
+
+Near-duplicate clusters of step 2 never span projects or document types
+(see dedup.py), so the canonical chunk of every duplicate is indexed in
+the duplicate's own shard.
+
+Shard collections are named <collection>.<value> (see
+shard_collection_name()), valid names for both vector stores.
+
+Registry (<db>/shards.json):
+    {"<collection>": {"shard_key": "project",
+                      "shards": {"<value>": {"collection": "<collection>.<value>",
+                                             "embedding_model": ..., "embedding_dim": ...}}}}
+
+Producers of an index server (see index_server.py) may register shards
+concurrently; updates are serialized with a lock file.
+"""
+
+import re
+import json
+import os
+import fcntl
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from document_scanner import document_project
+
+SHARD_FILE = "shards.json"
+PROJECT_KEY = "project"
+# Keys near-duplicate clusters do not span (see dedup.build_dedup_index())
+SHARD_KEYS = [PROJECT_KEY, "doc_type"]
+# Longest collection name both stores accept
+_MAX_NAME = 63
+
+
+def source_project(source_info: dict) -> str:
+    """Project of a document ("" when unknown).
+
+    Args:
+        source_info: source.json of step 1, or chunk metadata of step 2;
+            trees parsed before step 1 recorded the project get it from
+            the source path (document_scanner.document_project())
+    """
+    if "project" in source_info:
+        return source_info["project"]
+    return document_project(Path(source_info.get("source_path", "")))
+
+
+def shard_value(metadata: dict, shard_key: str) -> str:
+    """Shard value of a chunk, from its metadata of step 2."""
+    if shard_key == PROJECT_KEY:
+        return source_project(metadata)
+    return str(metadata.get(shard_key, ""))
+
+
+def shard_collection_name(collection_name: str, value: str) -> str:
+    """Collection of one shard: <collection>.<value>.
+
+    Values are reduced to [A-Za-z0-9_-]; values that change by that (or
+    are empty, or too long) get a hash suffix, so distinct values never
+    share a collection.
+    """
+    slug = re.sub(r"[^A-Za-z0-9_-]", "_", value).strip("_-")
+    if slug != value or not slug or len(collection_name) + 1 + len(slug) > _MAX_NAME:
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:8]
+        room = _MAX_NAME - len(collection_name) - len(digest) - 2
+        slug = f"{slug[:room].rstrip('_-')}-{digest}" if slug[:room].strip("_-") else digest
+    return f"{collection_name}.{slug}"
+
+
+class ShardRegistry:
+    """Shards of the sharded collections of one database."""
+
+    def __init__(self, chroma_db_path: str):
+        self.path = Path(chroma_db_path) / SHARD_FILE
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def entries(self) -> dict:
+        """Sharded collection name → registry entry."""
+        return self._load()
+
+    def get(self, collection_name: str):
+        """Registry entry ({"shard_key", "shards"}) of a sharded collection, or None."""
+        return self._load().get(collection_name)
+
+    def _save(self, registry: dict):
+        """Write the registry atomically (under _locked())."""
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(registry, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def register(
+        self,
+        collection_name: str,
+        shard_key: str,
+        value: str,
+        shard_collection: str,
+        embedding_model: str,
+        embedding_dim: int,
+    ):
+        """Record a shard (idempotent).
+
+        Raises:
+            ValueError: The collection is sharded by another key
+        """
+        with self._locked():
+            registry = self._load()
+            entry = registry.setdefault(collection_name, {"shard_key": shard_key, "shards": {}})
+            if entry["shard_key"] != shard_key:
+                raise ValueError(
+                    f"Collection '{collection_name}' is sharded by {entry['shard_key']}, not {shard_key}"
+                )
+            shard = {
+                "collection": shard_collection,
+                "embedding_model": embedding_model,
+                "embedding_dim": embedding_dim,
+            }
+            if entry["shards"].get(value) == shard:
+                return
+            entry["shards"][value] = shard
+            self._save(registry)
+
+    def unregister(self, collection_name: str, value: str = None):
+        """Forget one shard, or the whole sharded collection when value is None."""
+        with self._locked():
+            registry = self._load()
+            if collection_name not in registry:
+                return
+            if value is None:
+                del registry[collection_name]
+            else:
+                registry[collection_name]["shards"].pop(value, None)
+            self._save(registry)
+
+
+def federated_query(collections: list, n_results: int, max_workers: int = None, **query) -> dict:
+    """Query several collections concurrently and merge the top n_results.
+
+    Every collection is asked for n_results candidates (with the same
+    query embeddings and where filter); the union is ranked by distance,
+    which is comparable as long as the shards share embedding model and
+    space.
+
+    Args:
+        collections: Collections to search
+        n_results: Results per query embedding after the merge
+        max_workers: Concurrent queries (default: one per collection)
+        **query: Further arguments of collection.query() (query_embeddings, where)
+
+    Returns:
+        Query results as of collection.query() (ids, documents, metadatas,
+        distances per query embedding); metadatas also carry "shard",
+        the name of the collection a result came from
+    """
+    def search(collection):
+        count = collection.count()
+        if not count:
+            return collection.name, None
+        return collection.name, collection.query(n_results=min(n_results, count), **query)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(collections))) as executor:
+        shard_results = [result for result in executor.map(search, collections) if result[1]]
+
+    merged = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for q in range(len(query["query_embeddings"])):
+        rows = [
+            (distance, chunk_id, document, {**(metadata or {}), "shard": name})
+            for name, results in shard_results
+            for chunk_id, document, metadata, distance in zip(
+                results["ids"][q],
+                results["documents"][q],
+                results["metadatas"][q],
+                results["distances"][q],
+            )
+        ]
+        rows.sort(key=lambda row: row[0])
+        rows = rows[:n_results]
+        merged["distances"].append([row[0] for row in rows])
+        merged["ids"].append([row[1] for row in rows])
+        merged["documents"].append([row[2] for row in rows])
+        merged["metadatas"].append([row[3] for row in rows])
+    return merged
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Streaming pipeline: parse → chunk → embed → index in one process.
+
+The numbered scripts hand documents to each other through directories, so
+nothing is searchable until every file has passed every stage. Here each
+stage runs in its own thread and documents flow through bounded queues:
+
+    scan → [parse] → queue → [chunk] → queue → [embed] → queue → [index]
+
+A document is searchable as soon as its own embeddings are written, while
+later documents are still being parsed. At most --queue-size documents
+wait between two stages, which bounds peak memory regardless of corpus
+size. Docling, the tokenizer and torch release the GIL for their heavy
+work, so the stages overlap.
+
+Intermediate files are optional checkpoints (--checkpoint-dir): parsed/,
+chunks/ and embeddings/ are written in the same formats as steps 1-3, so
+the numbered scripts can pick up from any of them.
+
+Re-runs are incremental: a manifest in the database directory records the
+chunk IDs of every source file. Unchanged files are skipped; of a changed
+file only chunks with new content-addressed IDs are embedded and added and
+vanished ones deleted; chunks of deleted files are removed.
+
+Usage:
+    python stream_pipeline.py <input_dir> <chroma_db_path> --collection <name>
+                              [--model MODEL] [--max-tokens N] [--batch-size N]
+                              [--queue-size N] [--checkpoint-dir DIR]
+                              [--no-fast-path] [--store chroma|hnsw] [--server] [--force]
+
+Example:
+    python stream_pipeline.py documents/ki-2024/ .rag/chromadb/ --collection ki_2024
+"""
+
+import sys
+import os
+import time
+import queue
+import shutil
+import argparse
+import importlib
+import threading
+from pathlib import Path
+import numpy as np
+from tqdm import tqdm
+from manifest import StageManifest
+from document_scanner import document_project, scan_documents
+from embedding_models import DEFAULT_EMBEDDING_MODEL, token_limits
+from chunk_io import (
+    chunk_file_name,
+    chunk_ids,
+    provenance_file_name,
+    save_provenance,
+    write_chunks,
+)
+from embedding_store import embedding_file_name
+from vector_store import VECTOR_STORES, persist
+from shards import ShardRegistry
+
+# The stage scripts start with a digit, so they cannot be imported by name
+parse_stage = importlib.import_module("1_parse_documents")
+chunk_stage = importlib.import_module("2_chunk_documents")
+embed_stage = importlib.import_module("3_generate_embeddings")
+index_stage = importlib.import_module("4_index_to_chromadb")
+
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()  # end-of-stream marker passed down the queues
+
+
+def _run_stage(name: str, process, inbox: queue.Queue, outbox: queue.Queue):
+    """Thread body: apply `process` to each item until the end-of-stream marker.
+
+    A failing item is reported and dropped; the stream continues.
+    """
+    try:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            try:
+                outbox.put(process(item))
+            except Exception as e:
+                tqdm.write(f"  ✗ Error in {name} for {item['key']}: {e}")
+    finally:
+        outbox.put(_DONE)
+
+
+def stream_pipeline(
+    input_dir: str,
+    chroma_db_path: str,
+    collection_name: str,
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    max_tokens: int = None,
+    batch_size: int = 64,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    checkpoint_dir: str = None,
+    fast_path: bool = True,
+    force: bool = False,
+    server: bool = False,
+    store: str = None,
+):
+    """
+    Parse, chunk, embed and index documents as one stream.
+
+    Args:
+        input_dir: Directory tree containing PDF/DOCX/TXT/MD files
+        chroma_db_path: Path to ChromaDB database
+        collection_name: Name of ChromaDB collection
+        model_name: sentence-transformers model
+        max_tokens: Maximum tokens per chunk (default: the model's input limit)
+        batch_size: Batch size for encoding
+        queue_size: Documents buffered between two stages
+        checkpoint_dir: Also write parsed/, chunks/ and embeddings/ here
+        fast_path: Route simple files to the lightweight extractor
+        force: Re-process every file, ignoring the manifest
+        server: Write through the database's index server (index_server.py)
+        store: Vector store of a new database (see vector_store.py)
+    """
+    if ShardRegistry(chroma_db_path).get(collection_name):
+        # Streamed documents are not routed to shards
+        print(
+            f"Error: Collection '{collection_name}' is sharded; index it with "
+            "4_index_to_chromadb.py (see shards.py)"
+        )
+        sys.exit(1)
+
+    input_path = Path(input_dir)
+    checkpoint_path = Path(checkpoint_dir) if checkpoint_dir else None
+
+    manifest_name = f".manifest-stream-{collection_name}.json"
+    if server:
+        from index_server import producer_manifest_name
+
+        manifest_name = producer_manifest_name(f".manifest-stream-{collection_name}", input_dir)
+    manifest = StageManifest(
+        Path(chroma_db_path) / manifest_name,
+        stage=f"stream:{collection_name}:{model_name}",
+    )
+    # The scan thread checks entries while the index loop records them
+    manifest_lock = threading.Lock()
+
+    # Load models before the stream starts so the first document is not delayed
+    embedder = embed_stage.load_embedder(model_name)
+    # Chunks are sized with the embedding model's own tokenizer and limit
+    if max_tokens is None:
+        max_tokens = token_limits(model_name)[1]
+    print(f"Initializing HybridChunker (max_tokens={max_tokens}, tokenizer={model_name})...")
+    chunker = chunk_stage.create_chunker(max_tokens, model_name)
+    collection = index_stage.open_collection(
+        chroma_db_path,
+        collection_name,
+        model_name,
+        embedder.get_sentence_embedding_dimension(),
+        server,
+        store,
+    )
+    # Fewer rows than recorded IDs: chunks were deleted since the last run
+    # (6_collection_manager.py), so unchanged files are checked again too
+    recorded = sum(len(entry.get("ids", [])) for entry in manifest.entries.values())
+    resync = not force and recorded > 0 and collection.count() < recorded
+    if resync:
+        print(f"Collection '{collection_name}' lacks indexed chunks (deleted?); checking every file")
+
+    seen_keys = set()
+    scan_complete = threading.Event()
+
+    def scan_and_parse(outbox: queue.Queue):
+        """Source stage: walk the tree lazily and parse new or changed files."""
+        try:
+            for file_path, doc_type in scan_documents(
+                input_path, parse_stage.SUPPORTED_EXTENSIONS
+            ):
+                key = file_path.relative_to(input_path).as_posix()
+                seen_keys.add(key)
+                with manifest_lock:
+                    if not force and not resync and manifest.is_current(key, file_path):
+                        continue
+                try:
+                    outbox.put(parse(file_path, key, doc_type))
+                except Exception as e:
+                    tqdm.write(f"  ✗ Error in parse for {key}: {e}")
+            scan_complete.set()
+        finally:
+            outbox.put(_DONE)
+
+    def checkpoint_files(key: str) -> tuple:
+        """Parsed directory, chunk file, provenance sidecar and embedding file
+        (npy shard header) of a source in checkpoint_dir."""
+        # antrag/vollantrag.pdf -> antrag__vollantrag, as in step 2
+        doc_name = "__".join(Path(key).with_suffix("").parts)
+        return (
+            checkpoint_path / "parsed" / Path(key).with_suffix(""),
+            checkpoint_path / "chunks" / chunk_file_name(doc_name),
+            checkpoint_path / "chunks" / provenance_file_name(doc_name),
+            checkpoint_path / "embeddings" / embedding_file_name(f"{doc_name}_chunks"),
+        )
+
+    def parse(file_path: Path, key: str, doc_type: str) -> dict:
+        doc, route = parse_stage.convert_file(file_path, fast_path)
+        doc_name = "__".join(Path(key).with_suffix("").parts)
+        source_info = {
+            "source_path": key,
+            "doc_type": doc_type,
+            "project": document_project(Path(key)),
+        }
+        if checkpoint_path:
+            doc_dir = checkpoint_files(key)[0]
+            parse_stage.write_outputs(doc, doc_dir)
+            parse_stage.write_source_info(doc_dir, source_info)
+        return {
+            "key": key,
+            "file_path": file_path,
+            "doc_name": doc_name,
+            "source_info": source_info,
+            "route": route,
+            "doc": doc,
+            "parsed_at": time.monotonic(),
+        }
+
+    def chunk(item: dict) -> dict:
+        # Drop the DoclingDocument as soon as it is chunked
+        doc = item.pop("doc")
+        provenance = []
+        item["chunks"] = chunk_stage.chunk_document(
+            chunker, doc, item["source_info"], provenance
+        )
+        if checkpoint_path:
+            chunk_file, provenance_file = checkpoint_files(item["key"])[1:3]
+            chunk_file.parent.mkdir(parents=True, exist_ok=True)
+            write_chunks(chunk_file, item["chunks"])
+            ids = chunk_ids(item["doc_name"], [c["text"] for c in item["chunks"]])
+            save_provenance(provenance_file, provenance, ids)
+        return item
+
+    def embed(item: dict) -> dict:
+        texts = [c["text"] for c in item["chunks"]]
+        # Content-addressed IDs: chunks the collection already holds for
+        # this file (per the manifest) are not encoded again
+        item["ids"] = chunk_ids(item["doc_name"], texts)
+        with manifest_lock:
+            indexed = set() if force else set(manifest.get(item["key"]).get("ids", []))
+        # Confirmed by the collection: recorded chunks may have been deleted since
+        recorded_ids = sorted(indexed.intersection(item["ids"]))
+        item["existing"] = (
+            set(collection.get(ids=recorded_ids, include=[])["ids"]) if recorded_ids else set()
+        )
+
+        if checkpoint_path:
+            # The checkpoint file needs every row: reuse the previous file's
+            embedding_file = checkpoint_files(item["key"])[3]
+            known = {} if force else embed_stage.previous_embeddings(embedding_file, model_name)
+            skip = set()
+        else:
+            known = {}
+            skip = item["existing"]
+
+        rows, _ = embed_stage.embed_missing(
+            embedder, texts, item["ids"], known, batch_size, skip
+        )
+        item["embeddings"] = rows
+        if checkpoint_path and rows:
+            embedding_file.parent.mkdir(parents=True, exist_ok=True)
+            embed_stage.save_embeddings(
+                embedding_file, np.stack(rows), item["chunks"], model_name, item["ids"]
+            )
+        return item
+
+    def index(item: dict) -> int:
+        key = item["key"]
+        with manifest_lock:
+            old_ids = manifest.get(key).get("ids", [])
+
+        ids = item["ids"]
+        added, deleted, _ = index_stage.sync_chunks(
+            collection,
+            ids,
+            item["embeddings"],
+            [c["text"] for c in item["chunks"]],
+            [index_stage.chromadb_metadata(c["metadata"]) for c in item["chunks"]],
+            old_ids,
+            existing=item["existing"],
+        )
+        with manifest_lock:
+            manifest.record(key, item["file_path"], ids=ids)
+            manifest.save()
+
+        latency = time.monotonic() - item["parsed_at"]
+        tqdm.write(
+            f"  ✓ {key}: {len(ids)} chunks searchable {latency:.1f}s after parsing "
+            f"({added} added, {deleted} deleted, {item['route']})"
+        )
+        return added
+
+    parsed_queue = queue.Queue(maxsize=queue_size)
+    chunked_queue = queue.Queue(maxsize=queue_size)
+    embedded_queue = queue.Queue(maxsize=queue_size)
+    threads = [
+        threading.Thread(target=scan_and_parse, args=(parsed_queue,), daemon=True),
+        threading.Thread(
+            target=_run_stage,
+            args=("chunk", chunk, parsed_queue, chunked_queue),
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_run_stage,
+            args=("embed", embed, chunked_queue, embedded_queue),
+            daemon=True,
+        ),
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Index stage runs here: ChromaDB's SQLite backend wants a single writer
+    total_docs = 0
+    total_chunks = 0
+    with tqdm(desc="Streaming documents", unit="doc") as progress:
+        while True:
+            item = embedded_queue.get()
+            if item is _DONE:
+                break
+            try:
+                total_chunks += index(item)
+                total_docs += 1
+            except Exception as e:
+                tqdm.write(f"  ✗ Error in index for {item['key']}: {e}")
+            progress.update(1)
+
+    for thread in threads:
+        thread.join()
+
+    # Remove chunks of source files that no longer exist (only after a full
+    # scan: an aborted walk has not seen every file)
+    with manifest_lock:
+        removed = manifest.remove_stale(seen_keys) if scan_complete.is_set() else {}
+        for key, entry in removed.items():
+            if entry.get("ids"):
+                collection.delete(ids=entry["ids"])
+                print(f"  - {key}: {len(entry['ids'])} chunks removed")
+            if checkpoint_path:
+                doc_dir, *files = checkpoint_files(key)
+                shutil.rmtree(doc_dir, ignore_errors=True)
+                for path in files:
+                    if path.exists():
+                        path.unlink()
+        manifest.save()
+    persist([collection])
+
+    print(f"\nIndexed {total_chunks} chunks from {total_docs} new or changed documents")
+    print(f"Collection: {collection_name}")
+    print(f"Database location: {chroma_db_path}")
+    print(
+        f'Next step: python 5_search_documents.py {chroma_db_path} "your query" --collection {collection_name}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse, chunk, embed and index documents as one stream"
+    )
+    parser.add_argument("input_dir", help="Directory containing PDF/DOCX/TXT/MD files")
+    parser.add_argument("chroma_db_path", help="Path to ChromaDB database")
+    parser.add_argument(
+        "--collection", required=True, help="Name of ChromaDB collection"
+    )
+    parser.add_argument(
+        "--model",
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        help="sentence-transformers model name (default: sentence-transformers/all-MiniLM-L6-v2)",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        help="Maximum tokens per chunk (default: the embedding model's input limit)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Batch size for encoding (default: 64)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f"Documents buffered between stages; bounds peak memory (default: {DEFAULT_QUEUE_SIZE})",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        help="Also write parsed/, chunks/ and embeddings/ here (same formats as steps 1-3)",
+    )
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Send every PDF/MD file through Docling's full layout pipeline",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-process all files, ignoring the incremental manifest",
+    )
+    parser.add_argument(
+        "--store",
+        choices=VECTOR_STORES,
+        help="Vector store of a new database (default: chroma); an existing database keeps its store",
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Write through the index server of the database (index_server.py)",
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        print(f"Error: Input directory not found: {args.input_dir}")
+        sys.exit(1)
+
+    try:
+        stream_pipeline(
+            args.input_dir,
+            args.chroma_db_path,
+            args.collection,
+            args.model,
+            args.max_tokens,
+            args.batch_size,
+            args.queue_size,
+            args.checkpoint_dir,
+            not args.no_fast_path,
+            args.force,
+            args.server,
+            args.store,
+        )
+    except ConnectionError as e:
+        # --server without a running index server
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
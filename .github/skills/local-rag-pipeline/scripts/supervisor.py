@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Supervised worker processes with per-task timeout and memory cap.
+
+concurrent.futures can neither stop a task that hangs nor notice one that
+slowly eats all RAM, and a single crashed worker breaks the whole pool.
+SupervisedPool runs one task at a time per worker process and watches
+each worker from the parent:
+
+- a task running longer than `timeout` seconds gets its worker killed
+- a worker whose resident memory exceeds `max_memory_mb` is killed
+- a worker that dies (segfault, OOM killer) only loses its own task
+
+A killed or crashed worker is replaced by a fresh process on demand, and
+the task is reported with a WorkerLost error so the caller can quarantine
+the input. Ordinary exceptions raised by the task are reported as strings
+and leave the worker running.
+
+Memory is read from /proc/<pid>/status (Linux) or psutil when installed;
+without either, the memory cap is disabled with a warning.
+"""
+
+import os
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+POLL_INTERVAL = 0.5  # seconds between timeout / memory checks
+
+
+class WorkerLost(Exception):
+    """A task's worker was killed (timeout, memory cap) or crashed."""
+
+
+def process_rss_mb(pid: int):
+    """Resident set size of a process in MB, or None if it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return None
+    return None
+
+
+def _worker_main(conn, target):
+    """Worker loop: run target(*args) for each message until None or EOF."""
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        if args is None:
+            return
+        try:
+            conn.send(("ok", target(*args)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _Worker:
+    def __init__(self, mp_context, target):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(
+            target=_worker_main, args=(child_conn, target), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = 0.0
+
+    def submit(self, task, args):
+        self.task = task
+        self.started = time.monotonic()
+        self.conn.send(args)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class SupervisedPool:
+    """Fixed number of supervised worker processes.
+
+    Args:
+        workers: Number of worker processes
+        target: Picklable module-level function run in the workers
+        timeout: Wall-clock seconds per task (0 disables)
+        max_memory_mb: Resident memory limit per worker in MB (0 disables)
+        mp_context: multiprocessing context (default: spawn)
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        target,
+        timeout: float = 0,
+        max_memory_mb: float = 0,
+        mp_context=None,
+    ):
+        self.workers = max(1, workers)
+        self.target = target
+        self.timeout = timeout
+        self.max_memory_mb = max_memory_mb
+        # spawn: forking a parent that already holds torch/OpenMP state is unsafe
+        self.mp_context = mp_context or multiprocessing.get_context("spawn")
+
+        if max_memory_mb and process_rss_mb(os.getpid()) is None:
+            print("Warning: Cannot read process memory (no /proc, no psutil); memory cap disabled")
+            self.max_memory_mb = 0
+
+    def run(self, jobs):
+        """Run jobs and yield results as they finish.
+
+        Args:
+            jobs: Iterable of (task, args); args is the tuple passed to target
+
+        Yields:
+            (task, result, error) where error is None on success, a string
+            for an exception raised by the task, or a WorkerLost instance
+            when the worker had to be killed or crashed
+        """
+        jobs = iter(jobs)
+        pool = []
+        try:
+            while True:
+                # Hand out work to idle workers, starting replacements as needed
+                busy = [w for w in pool if w.task is not None]
+                while len(busy) < self.workers:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    idle = [w for w in pool if w.task is None]
+                    worker = idle[0] if idle else _Worker(self.mp_context, self.target)
+                    if not idle:
+                        pool.append(worker)
+                    worker.submit(*job)
+                    busy.append(worker)
+                if not busy:
+                    return
+
+                ready = wait(
+                    [w.conn for w in busy] + [w.process.sentinel for w in busy],
+                    timeout=POLL_INTERVAL,
+                )
+                for worker in busy:
+                    outcome = self._check(worker, ready)
+                    if outcome is None:
+                        continue
+                    task, worker.task = worker.task, None
+                    if isinstance(outcome, WorkerLost):
+                        pool.remove(worker)
+                        yield task, None, outcome
+                    elif outcome[0] == "ok":
+                        yield task, outcome[1], None
+                    else:
+                        yield task, None, outcome[1]
+        finally:
+            for worker in pool:
+                if worker.task is not None:
+                    worker.kill()
+                else:
+                    worker.stop()
+
+    def _check(self, worker: _Worker, ready: list):
+        """Return the finished task's message, a WorkerLost, or None if still running."""
+        if worker.conn in ready or worker.conn.poll():
+            try:
+                return worker.conn.recv()
+            except (EOFError, OSError):
+                pass  # died right after (or while) sending; treated as a crash below
+
+        if not worker.process.is_alive() or worker.process.sentinel in ready:
+            worker.process.join()
+            code = worker.process.exitcode
+            worker.conn.close()
+            return WorkerLost(f"worker crashed (exit code {code})")
+
+        elapsed = time.monotonic() - worker.started
+        if self.timeout and elapsed > self.timeout:
+            worker.kill()
+            return WorkerLost(f"timed out after {self.timeout:.0f}s")
+
+        if self.max_memory_mb:
+            rss = process_rss_mb(worker.process.pid)
+            if rss is not None and rss > self.max_memory_mb:
+                worker.kill()
+                return WorkerLost(
+                    f"memory limit exceeded ({rss:.0f} MB > {self.max_memory_mb:.0f} MB)"
+                )
+        return None
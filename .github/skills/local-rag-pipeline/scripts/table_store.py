@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Corpus-wide columnar table store (Arrow IPC).
+
+Instead of one page-N-table-M.csv per table, `1_parse_documents.py
+--table-store arrow` writes every table cell of the corpus into a single
+Arrow IPC file (tables.arrow in the parsed directory), in long format:
+
+    document     str    source path relative to the parse input directory
+    doc_type     str    antrag, berichte, ... (see document_scanner.py)
+    page         int32  page of the table (0 if unknown)
+    table_index  int32  1-based position of the table in the document
+    row          int32  0-based data row
+    col          int32  0-based column
+    header       str    column header
+    value        str    cell text
+
+The file is uncompressed so it can be memory-mapped: opening it costs
+no parsing, and filters such as "all cells mentioning Budget in antrag
+documents" run as vectorized Arrow compute kernels.
+
+Usage:
+    python table_store.py <store> "<pattern>" [--doc-type TYPE] [--limit N]
+
+Example:
+    python table_store.py .rag/parsed/tables.arrow "Budget|Arbeitspaket" --doc-type antrag
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+STORE_NAME = "tables.arrow"
+
+_COLUMNS = ["document", "doc_type", "page", "table_index", "row", "col", "header", "value"]
+
+
+def _schema():
+    return pa.schema(
+        [
+            ("document", pa.string()),
+            ("doc_type", pa.string()),
+            ("page", pa.int32()),
+            ("table_index", pa.int32()),
+            ("row", pa.int32()),
+            ("col", pa.int32()),
+            ("header", pa.string()),
+            ("value", pa.string()),
+        ]
+    )
+
+
+def require_pyarrow():
+    """Exit with an install hint when pyarrow is missing."""
+    if pa is None:
+        print("Error: --table-store arrow requires pyarrow (pip install pyarrow)")
+        sys.exit(1)
+
+
+def table_cells(tables: list, document: str, doc_type: str) -> dict:
+    """Flatten tables of one document into store columns.
+
+    Args:
+        tables: List of (page, table_index, headers, rows) as returned by
+            the parse step; rows is a list of lists of cell strings
+        document: Source path relative to the parse input directory
+        doc_type: Document type of the source
+
+    Returns:
+        Dict of column name -> list
+    """
+    columns = {name: [] for name in _COLUMNS}
+    for page, table_index, headers, rows in tables:
+        for row_index, row in enumerate(rows):
+            for col_index, value in enumerate(row):
+                columns["document"].append(document)
+                columns["doc_type"].append(doc_type)
+                columns["page"].append(page)
+                columns["table_index"].append(table_index)
+                columns["row"].append(row_index)
+                columns["col"].append(col_index)
+                columns["header"].append(headers[col_index] if col_index < len(headers) else "")
+                columns["value"].append(value)
+    return columns
+
+
+def open_table_store(path: Path):
+    """Memory-map the store and return it as a pyarrow Table (zero-copy)."""
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def update_table_store(path: Path, new_cells: dict, drop_documents: set) -> int:
+    """Rewrite the store with some documents' cells replaced.
+
+    Rows of `drop_documents` (re-parsed or deleted sources) are removed,
+    then the cells in `new_cells` are appended. The file is replaced
+    atomically.
+
+    Args:
+        path: Store file
+        new_cells: Dict of document -> columns (see table_cells())
+        drop_documents: Documents whose existing rows are removed
+
+    Returns:
+        Number of rows in the new store
+    """
+    path = Path(path)
+    parts = []
+    if path.exists():
+        old = open_table_store(path)
+        drop = pa.array(sorted(drop_documents | set(new_cells)), pa.string())
+        parts.append(old.filter(pc.invert(pc.is_in(old["document"], value_set=drop))))
+    for columns in new_cells.values():
+        parts.append(pa.table(columns, schema=_schema()))
+
+    table = pa.concat_tables(parts) if parts else _schema().empty_table()
+
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, _schema()) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+def find_cells(table, pattern: str, doc_type: str = None):
+    """Rows whose header or value matches a case-insensitive regex."""
+    mask = pc.or_(
+        pc.match_substring_regex(table["value"], pattern, ignore_case=True),
+        pc.match_substring_regex(table["header"], pattern, ignore_case=True),
+    )
+    if doc_type:
+        mask = pc.and_(mask, pc.equal(table["doc_type"], doc_type))
+    return table.filter(mask)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the corpus table store")
+    parser.add_argument("store", help=f"Path to {STORE_NAME}")
+    parser.add_argument("pattern", help="Regular expression matched against headers and cells")
+    parser.add_argument("--doc-type", help="Only tables of this document type")
+    parser.add_argument(
+        "--limit", type=int, default=50, help="Maximum matching cells to print (default: 50)"
+    )
+
+    args = parser.parse_args()
+    require_pyarrow()
+
+    if not os.path.exists(args.store):
+        print(f"Error: Table store not found: {args.store}")
+        sys.exit(1)
+
+    table = open_table_store(args.store)
+    matches = find_cells(table, args.pattern, args.doc_type)
+    print(f"{matches.num_rows} matching cells in {table.num_rows} stored cells\n")
+
+    for row in matches.slice(0, args.limit).to_pylist():
+        print(
+            f"{row['document']} p.{row['page']} table {row['table_index']} "
+            f"[{row['row']}, {row['col']}] {row['header']}: {row['value']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
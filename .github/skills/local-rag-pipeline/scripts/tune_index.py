@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Tune HNSW index parameters: recall@k vs. query latency on your vectors.
+
+An HNSW index answers a query by walking a graph, so it can miss true
+nearest neighbors. Its parameters trade recall for time: a larger graph
+degree (M) and build beam (construction ef) cost build time and memory,
+a larger search beam (search ef) costs query latency.
+
+This command holds out evenly spaced chunk vectors of step 3 as queries,
+finds their exact top-k neighbors among the other vectors by brute force
+(NumPy), builds an index for every M x construction ef and measures
+recall@k and single-query latency for every search ef. The settings are
+set for a new collection with the --hnsw-* options of step 4.
+
+Engines: --store hnsw measures FAISS (the index of the hnsw store),
+--store chroma measures hnswlib (ChromaDB's index; chromadb 1.x does not
+install it, pip install chroma-hnswlib).
+
+Usage:
+    python tune_index.py <embeddings_dir> [--store chroma|hnsw] [--space cosine|ip|l2]
+                         [--queries N] [--top-k K] [--m M ...] [--construction-ef EF ...]
+                         [--search-ef EF ...] [--target-recall R] [--max-vectors N]
+
+Example:
+    python tune_index.py .rag/embeddings/ --store hnsw --m 16 32 48 --target-recall 0.98
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import find_embedding_files, open_embedding_file
+from vector_store import HNSW_SPACES, VECTOR_STORES, index_vectors, similarities
+
+# Queries per NumPy block of the exact search (bounds its memory)
+_EXACT_BLOCK = 256
+
+
+def load_vectors(embeddings_dir: str, max_vectors: int = None) -> np.ndarray:
+    """float32 vectors of all embedding files (evenly thinned to max_vectors)."""
+    parts = [
+        np.asarray(open_embedding_file(path).embeddings, dtype=np.float32)
+        for path in find_embedding_files(Path(embeddings_dir))
+    ]
+    if not parts:
+        return np.empty((0, 0), dtype=np.float32)
+    vectors = np.concatenate(parts)
+    if max_vectors and len(vectors) > max_vectors:
+        vectors = vectors[np.linspace(0, len(vectors) - 1, max_vectors).astype(int)]
+    return vectors
+
+
+def split_queries(vectors: np.ndarray, num_queries: int) -> tuple:
+    """(queries, base): evenly spaced vectors held out of the indexed base."""
+    num_queries = min(num_queries, len(vectors) // 2)
+    held_out = np.linspace(0, len(vectors) - 1, num_queries).astype(int)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    return vectors[held_out], vectors[mask]
+
+
+def exact_neighbors(queries: np.ndarray, base: np.ndarray, k: int, space: str) -> np.ndarray:
+    """(num_queries, k) indices into base of the exact nearest neighbors."""
+    neighbors = []
+    for start in range(0, len(queries), _EXACT_BLOCK):
+        scores = similarities(queries[start : start + _EXACT_BLOCK], base, space)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        neighbors.append(np.take_along_axis(top, order, axis=1))
+    return np.concatenate(neighbors)
+
+
+def recall_at_k(found: list, exact: np.ndarray) -> float:
+    """Mean share of the exact top-k found by the index."""
+    k = exact.shape[1]
+    return statistics.mean(len(set(labels) & set(truth)) / k for labels, truth in zip(found, exact))
+
+
+def build_index(store: str, base: np.ndarray, space: str, m: int, construction_ef: int):
+    """Index of the store's engine over base.
+
+    Returns:
+        search(query, k, ef) → labels (row indices into base)
+    """
+    if store == "hnsw":
+        import faiss
+        from vector_store import new_hnsw_index
+
+        index = new_hnsw_index(base.shape[1], space, m, construction_ef)
+        index.add(base)
+
+        def search(query, k, ef):
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = ef
+            _, labels = index.search(query[None], k, params=params)
+            return [label for label in labels[0] if label >= 0]
+
+        return search
+
+    import hnswlib
+
+    index = hnswlib.Index(space=space, dim=base.shape[1])
+    index.init_index(max_elements=len(base), ef_construction=construction_ef, M=m)
+    index.add_items(base, np.arange(len(base)))
+    index.set_num_threads(1)
+
+    def search(query, k, ef):
+        index.set_ef(ef)
+        labels, _ = index.knn_query(query[None], k=k)
+        return list(labels[0])
+
+    return search
+
+
+def _latencies(search, queries: np.ndarray) -> tuple:
+    """Results and per-query milliseconds of searching one query at a time."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def _percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def sweep(
+    store: str,
+    queries: np.ndarray,
+    base: np.ndarray,
+    exact: np.ndarray,
+    space: str,
+    m_values: list,
+    construction_efs: list,
+    search_efs: list,
+) -> list:
+    """Recall@k and latency of every parameter combination.
+
+    Returns:
+        Dicts with m, construction_ef, search_ef, build_s, recall, p50_ms, p99_ms
+    """
+    k = exact.shape[1]
+    rows = []
+    for m in m_values:
+        for construction_ef in construction_efs:
+            start = time.perf_counter()
+            search = build_index(store, base, space, m, construction_ef)
+            build_seconds = time.perf_counter() - start
+            for search_ef in search_efs:
+                ef = max(search_ef, k)
+                found, latencies = _latencies(lambda query: search(query, k, ef), queries)
+                rows.append(
+                    {
+                        "m": m,
+                        "construction_ef": construction_ef,
+                        "search_ef": ef,
+                        "build_s": build_seconds,
+                        "recall": recall_at_k(found, exact),
+                        "p50_ms": statistics.median(latencies),
+                        "p99_ms": _percentile(latencies, 0.99),
+                    }
+                )
+                print(
+                    f"{m:>4} {construction_ef:>8} {build_seconds:>10.2f} {ef:>8} "
+                    f"{rows[-1]['recall']:>9.4f} {rows[-1]['p50_ms']:>9.3f} {rows[-1]['p99_ms']:>9.3f}"
+                )
+    return rows
+
+
+def best_setting(rows: list, target_recall: float):
+    """Fastest (p50) setting reaching target_recall, or None."""
+    reaching = [row for row in rows if row["recall"] >= target_recall]
+    return min(reaching, key=lambda row: row["p50_ms"]) if reaching else None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep HNSW parameters: recall@k vs. latency against exact search"
+    )
+    parser.add_argument("embeddings_dir", help="Directory with embedding files of step 3")
+    parser.add_argument(
+        "--store",
+        choices=VECTOR_STORES,
+        default="hnsw",
+        help="Store whose index engine to measure: hnsw (FAISS) or chroma (hnswlib) (default: hnsw)",
+    )
+    parser.add_argument(
+        "--space", choices=HNSW_SPACES, default="ip", help="Distance (default: ip)"
+    )
+    parser.add_argument(
+        "--queries", type=int, default=500, help="Held-out query vectors (default: 500)"
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=20,
+        help="Neighbors per query, e.g. the rerank candidates of step 5 (default: 20)",
+    )
+    parser.add_argument(
+        "--m", type=int, nargs="+", default=[16, 32], help="Graph degrees (default: 16 32)"
+    )
+    parser.add_argument(
+        "--construction-ef",
+        type=int,
+        nargs="+",
+        default=[100, 200],
+        help="Build beam widths (default: 100 200)",
+    )
+    parser.add_argument(
+        "--search-ef",
+        type=int,
+        nargs="+",
+        default=[16, 32, 64, 128, 256],
+        help="Query beam widths; values below --top-k are raised to it (default: 16 32 64 128 256)",
+    )
+    parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=0.95,
+        help="Recommend the fastest setting with at least this recall@k (default: 0.95)",
+    )
+    parser.add_argument(
+        "--max-vectors", type=int, help="Use an evenly spaced subset of the vectors"
+    )
+
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.embeddings_dir, args.max_vectors)
+    if len(vectors) < 2 * args.top_k:
+        print(f"Error: Not enough embeddings in {args.embeddings_dir} for top-{args.top_k}")
+        sys.exit(1)
+    queries, base = split_queries(index_vectors(vectors, args.space), args.queries)
+
+    print(f"{len(base)} vectors (dim {base.shape[1]}), {len(queries)} queries, top-{args.top_k}, {args.space}")
+    print("Computing exact neighbors (NumPy)...")
+    exact = exact_neighbors(queries, base, args.top_k, args.space)
+    engine = "FAISS" if args.store == "hnsw" else "hnswlib"
+    print(f"\n{engine} HNSW vs. exact search, one query at a time:\n")
+    print(f"{'M':>4} {'Build ef':>8} {'Build (s)':>10} {'Query ef':>8} {'Recall@k':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    print("-" * 63)
+    _, latencies = _latencies(
+        lambda query: exact_neighbors(query[None], base, args.top_k, args.space), queries[:100]
+    )
+    print(
+        f"{'exact':>4} {'-':>8} {'-':>10} {'-':>8} {1:>9.4f} "
+        f"{statistics.median(latencies):>9.3f} {_percentile(latencies, 0.99):>9.3f}"
+    )
+    try:
+        rows = sweep(
+            args.store,
+            queries,
+            base,
+            exact,
+            args.space,
+            args.m,
+            args.construction_ef,
+            args.search_ef,
+        )
+    except ImportError as e:
+        package = "faiss-cpu" if args.store == "hnsw" else "chroma-hnswlib"
+        print(f"Error: {e}; install it with: pip install {package}")
+        sys.exit(1)
+
+    best = best_setting(rows, args.target_recall)
+    if best is None:
+        top = max(rows, key=lambda row: row["recall"])
+        print(
+            f"\nNo setting reaches recall@{args.top_k} {args.target_recall}; best is "
+            f"{top['recall']:.4f} (M={top['m']}, construction ef={top['construction_ef']}, "
+            f"search ef={top['search_ef']}). Try larger --m / --search-ef values."
+        )
+        return
+    print(
+        f"\nFastest with recall@{args.top_k} >= {args.target_recall}: M={best['m']}, "
+        f"construction ef={best['construction_ef']}, search ef={best['search_ef']} "
+        f"(recall {best['recall']:.4f}, p50 {best['p50_ms']:.3f} ms)"
+    )
+    print(
+        f"Index a new collection with: python 4_index_to_chromadb.py <embeddings_dir> <chroma_db_path> "
+        f"--collection <name> --store {args.store} --hnsw-space {args.space} --hnsw-m {best['m']} "
+        f"--hnsw-construction-ef {best['construction_ef']} --hnsw-search-ef {best['search_ef']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
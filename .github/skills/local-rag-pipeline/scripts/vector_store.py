@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+"""
+Vector stores behind steps 4-6: ChromaDB and a file-based HNSW index.
+
+Steps 4, 5 and 6 (and stream_pipeline.py, index_server.py) use the part
+of chromadb's client and collection API they need: get_or_create_collection,
+get_collection, list_collections, delete_collection and upsert, update,
+delete, get, peek, count, query. open_client() returns a client of the
+store a database directory was created with:
+
+    chroma  chromadb.PersistentClient (default)
+    hnsw    one FAISS HNSW index per collection, memory-mapped for search,
+            with IDs, texts, metadata and vectors in a SQLite sidecar
+
+The store of a new database is chosen with --store in step 4 (or
+stream_pipeline.py / index_server.py) and recorded in the database
+directory; later runs and steps 5 and 6 detect it:
+
+    <db>/vector_store.json                          {"store": "hnsw"}
+    <db>/hnsw/<collection>/collection.json          name and metadata
+    <db>/hnsw/<collection>/records.sqlite           rows(row, id, document,
+                                                    metadata, embedding, deleted)
+    <db>/hnsw/<collection>/index-<generation>.faiss HNSW graph + vectors
+
+HNSW store:
+- Row numbers of the sidecar are the labels in the index. The sidecar is
+  the source of truth and committed by every write; the index file is
+  rewritten by persist() (after each run of step 4 and stream_pipeline.py,
+  when the index server is idle) and when the writing process exits.
+  Rows missing from the index file (after a crash, or while another
+  process is writing) are searched exactly, and added to the index when
+  a writer opens it.
+- Several processes may write to a collection: an upsert takes SQLite's
+  write lock, first adds the rows other processes committed to its
+  index, and numbers its rows after the sidecar's last one.
+- update() merges the given metadata keys into the stored metadata, as
+  ChromaDB does; upsert() replaces a chunk's row as a whole.
+- Deleting or re-upserting a chunk marks its row deleted; searches skip
+  deleted rows (FAISS ID selector). When more than a quarter of the rows
+  are deleted, the collection is compacted on save: live rows are
+  renumbered and the index rebuilt as the next generation.
+- Searches open the index with FAISS's memory-mapping flag, so the OS
+  pages in what a query touches instead of reading the whole file
+  (faiss-cpu >= 1.9; older versions read the whole file, with a warning).
+  Filtered searches (where=...) over few rows are computed exactly.
+- Index parameters are read from the collection metadata, with
+  ChromaDB's keys, so they are set the same way for both stores (see
+  hnsw_metadata()) and fixed when the collection is created:
+
+    hnsw:space            "ip" (default here; cosine for the normalized
+                          vectors of step 3), "cosine" or "l2"
+    hnsw:M                graph degree (default 32): recall and memory
+    hnsw:construction_ef  beam width while building (default 100)
+    hnsw:search_ef        beam width per query (default 64; at least
+                          n_results): recall vs. latency
+
+  Distances are 1 - similarity for ip and cosine, squared L2 for l2
+  (as ChromaDB reports them). tune_index.py measures the recall and
+  latency of parameter settings on your vectors.
+
+Usage (inside a stage script):
+    client = open_client(chroma_db_path, store)     # store only for new databases
+    collection = client.get_or_create_collection(name="docs", metadata={...})
+    results = collection.query(query_embeddings=rows, n_results=20, where={"doc_type": "antrag"})
+"""
+
+import re
+import json
+import atexit
+import shutil
+import warnings
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+VECTOR_STORES = ["chroma", "hnsw"]
+STORE_FILE = "vector_store.json"
+HNSW_DIR = "hnsw"
+RECORDS_NAME = "records.sqlite"
+
+# Rows per write call (as chromadb's get_max_batch_size())
+HNSW_MAX_BATCH = 5000
+# Defaults of the hnsw store's index parameters (see hnsw_metadata())
+HNSW_SPACES = ["cosine", "ip", "l2"]
+HNSW_SPACE = "ip"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 100
+HNSW_EF_SEARCH = 64
+# Filtered searches over at most this many rows are computed exactly
+EXACT_SEARCH_ROWS = 20000
+# Compact on save when more than this share of the rows is deleted
+COMPACT_RATIO = 0.25
+
+# Rows per SQL statement (below SQLite's default variable limit)
+_SQL_BATCH = 500
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]$")
+
+
+def database_store(chroma_db_path: str):
+    """Store a database directory was created with, or None for a new one."""
+    path = Path(chroma_db_path)
+    if (path / STORE_FILE).exists():
+        with open(path / STORE_FILE, encoding="utf-8") as f:
+            return json.load(f)["store"]
+    if (path / "chroma.sqlite3").exists():
+        return "chroma"
+    return None
+
+
+def open_client(chroma_db_path: str, store: str = None):
+    """Client of the database at `chroma_db_path`.
+
+    Args:
+        chroma_db_path: Database directory
+        store: One of VECTOR_STORES for a new database (default: chroma);
+            an existing database keeps the store it was created with
+
+    Raises:
+        ValueError: `store` differs from the store of an existing database
+    """
+    path = Path(chroma_db_path)
+    existing = database_store(path)
+    if existing and store and store != existing:
+        raise ValueError(f"{path} is a {existing} database; it cannot be opened as {store}")
+    store = existing or store or "chroma"
+    if store not in VECTOR_STORES:
+        raise ValueError(f"Unknown vector store {store}; choose from {', '.join(VECTOR_STORES)}")
+
+    if store == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+
+        return chromadb.PersistentClient(
+            path=str(path), settings=Settings(anonymized_telemetry=False, allow_reset=True)
+        )
+
+    if faiss is None:
+        raise ImportError("The hnsw vector store needs FAISS; install it with: pip install faiss-cpu")
+    if existing is None:
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / STORE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"store": store}, f)
+    return HnswClient(path)
+
+
+def persist(collections):
+    """Write the index files of hnsw collections changed since their last save.
+
+    Other collections (ChromaDB's, or an index server's stand-ins) are
+    skipped: they persist every write themselves.
+
+    Args:
+        collections: Collections of any store
+    """
+    for collection in collections:
+        if isinstance(collection, HnswCollection):
+            collection.save()
+
+
+def hnsw_metadata(
+    space: str = None, m: int = None, construction_ef: int = None, search_ef: int = None
+) -> dict:
+    """Collection metadata setting HNSW index parameters (for both stores).
+
+    Only the given parameters are set; the store's defaults apply to the
+    others.
+    """
+    params = {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+    return {key: value for key, value in params.items() if value is not None}
+
+
+def hnsw_params(metadata: dict) -> dict:
+    """Index parameters of an hnsw-store collection: space, m, construction_ef, search_ef."""
+    metadata = metadata or {}
+    return {
+        "space": metadata.get("hnsw:space", HNSW_SPACE),
+        "m": int(metadata.get("hnsw:M", HNSW_M)),
+        "construction_ef": int(metadata.get("hnsw:construction_ef", HNSW_EF_CONSTRUCTION)),
+        "search_ef": int(metadata.get("hnsw:search_ef", HNSW_EF_SEARCH)),
+    }
+
+
+def new_hnsw_index(dim: int, space: str, m: int, construction_ef: int):
+    """Empty FAISS HNSW index; add index_vectors() of the data."""
+    if space not in HNSW_SPACES:
+        raise ValueError(f"Unknown space {space}; choose from {', '.join(HNSW_SPACES)}")
+    metric = faiss.METRIC_L2 if space == "l2" else faiss.METRIC_INNER_PRODUCT
+    index = faiss.IndexHNSWFlat(dim, m, metric)
+    index.hnsw.efConstruction = construction_ef
+    return index
+
+
+def index_vectors(vectors, space: str) -> np.ndarray:
+    """Vectors as compared in a space: float32, L2-normalized for cosine."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+    return vectors
+
+
+def similarities(queries: np.ndarray, vectors: np.ndarray, space: str) -> np.ndarray:
+    """Exact (queries, vectors) similarity of index_vectors(); higher is nearer.
+
+    Inner product for ip and cosine, negative squared distance for l2.
+    """
+    scores = queries @ vectors.T
+    if space == "l2":
+        scores = 2 * scores - np.sum(queries**2, axis=1)[:, None] - np.sum(vectors**2, axis=1)[None, :]
+    return scores
+
+
+def similarity_distance(score: float, space: str) -> float:
+    """Distance reported for a similarity of similarities()."""
+    return -score if space == "l2" else 1.0 - score
+
+
+def _where_sql(where: dict) -> tuple:
+    """SQL condition and parameters for a chromadb-style metadata filter.
+
+    Supports {"key": value}, {"key": {"$eq"|"$ne"|"$in"|"$nin": ...}}
+    and "$and"/"$or" lists of those.
+    """
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(part) for part in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+        column = "json_extract(metadata, ?)"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in ("$eq", "$ne"):
+                clauses.append(f"{column} {'=' if op == '$eq' else '!='} ?")
+                params.extend([f"$.{key}", value])
+            elif op in ("$in", "$nin"):
+                marks = ",".join("?" * len(value))
+                clauses.append(f"{column} {'IN' if op == '$in' else 'NOT IN'} ({marks})")
+                params.extend([f"$.{key}", *value])
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class HnswCollection:
+    """Collection of the hnsw store (see the module docstring).
+
+    Calls are serialized by a lock, so a collection may be shared by
+    threads (step 4 writes in a background thread).
+    """
+
+    def __init__(self, directory: Path, name: str, metadata: dict):
+        self.directory = directory
+        self.name = name
+        self.metadata = metadata
+        self.params = hnsw_params(metadata)
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(directory / RECORDS_NAME, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                document TEXT,
+                metadata TEXT,
+                embedding BLOB NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self.db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS live_ids ON rows (id) WHERE deleted = 0"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS deleted_rows ON rows (row) WHERE deleted = 1"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        self.db.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+        self.db.commit()
+        self.index = None
+        self.generation = None
+        self.writable = False
+        self.dirty = False
+
+    # Index files
+
+    def _meta(self, key: str):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _index_path(self, generation: int) -> Path:
+        return self.directory / f"index-{generation}.faiss"
+
+    def _new_index(self, dim: int):
+        return new_hnsw_index(dim, self.params["space"], self.params["m"], self.params["construction_ef"])
+
+    def _load_index(self, writable: bool = False):
+        """Open the current generation's index; writers add missing rows."""
+        generation = self._meta("generation")
+        if self.index is not None and generation == self.generation:
+            if self.writable or not writable:
+                return
+        self.index = None
+        path = self._index_path(generation)
+        if path.exists():
+            if writable:
+                self.index = faiss.read_index(str(path))
+            elif hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+                # Zero-copy mapping (FAISS >= 1.9)
+                self.index = faiss.read_index(
+                    str(path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+                )
+            else:
+                # IO_FLAG_MMAP does not map HNSW indexes, so it would not help
+                warnings.warn(
+                    f"faiss-cpu {faiss.__version__} cannot memory-map HNSW indexes; "
+                    "reading the whole index file (pip install 'faiss-cpu>=1.9')",
+                    stacklevel=2,
+                )
+                self.index = faiss.read_index(str(path))
+        self.generation = generation
+        self.writable = writable
+        if writable:
+            self._catch_up()
+
+    def _indexed(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def _next_row(self) -> int:
+        (next_row,) = self.db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()
+        return next_row
+
+    def _catch_up(self):
+        """Add rows committed after the index file was written (or by other processes)."""
+        start = self._indexed()
+        total = self._next_row()
+        for offset in range(start, total, HNSW_MAX_BATCH):
+            vectors = self._vectors(
+                range(offset, min(offset + HNSW_MAX_BATCH, total))
+            )
+            if self.index is None:
+                self.index = self._new_index(vectors.shape[1])
+            self.index.add(index_vectors(vectors, self.params["space"]))
+        if total > start:
+            self.dirty = True
+
+    def _vectors(self, rows) -> np.ndarray:
+        """float32 vectors of sidecar rows, in the order of rows."""
+        rows = list(rows)
+        found = {}
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = rows[start : start + _SQL_BATCH]
+            found.update(
+                self.db.execute(
+                    f"SELECT row, embedding FROM rows WHERE row IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+            )
+        return np.stack([np.frombuffer(found[row], dtype=np.float32) for row in rows])
+
+    def save(self):
+        """Write the index file if rows were added (compacting if due)."""
+        with self.lock:
+            if not self.dirty:
+                return
+            # Another process may have compacted or added rows meanwhile
+            self._load_index(writable=True)
+            self._catch_up()
+            (total,) = self.db.execute("SELECT COUNT(*) FROM rows").fetchone()
+            (deleted,) = self.db.execute("SELECT COUNT(*) FROM rows WHERE deleted = 1").fetchone()
+            if total and deleted > total * COMPACT_RATIO:
+                self.compact()
+                return
+            self._write_index(self.generation)
+            self.dirty = False
+
+    def _write_index(self, generation: int):
+        path = self._index_path(generation)
+        tmp_path = path.with_suffix(".faiss.tmp")
+        faiss.write_index(self.index, str(tmp_path))
+        tmp_path.replace(path)
+
+    def compact(self):
+        """Drop deleted rows, renumber the rest and rebuild the index."""
+        with self.lock, self.db:
+            # Other processes wait with their writes until the rows are renumbered
+            self.db.execute("BEGIN IMMEDIATE")
+            self._load_index(writable=True)
+            generation = self.generation + 1
+            live = [row for (row,) in self.db.execute("SELECT row FROM rows WHERE deleted = 0 ORDER BY row")]
+            self.index = None
+            for start in range(0, len(live), HNSW_MAX_BATCH):
+                vectors = self._vectors(live[start : start + HNSW_MAX_BATCH])
+                if self.index is None:
+                    self.index = self._new_index(vectors.shape[1])
+                self.index.add(index_vectors(vectors, self.params["space"]))
+            # The new generation's file is only used once the sidecar says so
+            if self.index is not None:
+                self._write_index(generation)
+
+            self.db.execute("DELETE FROM rows WHERE deleted = 1")
+            # Through negative numbers, so no row number is taken twice
+            self.db.executemany(
+                "UPDATE rows SET row = ? WHERE row = ?",
+                [(-1 - new, old) for new, old in enumerate(live)],
+            )
+            self.db.execute("UPDATE rows SET row = -1 - row")
+            self.db.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (generation,))
+            self.generation = generation
+            self.dirty = False
+        for old in self.directory.glob("index-*.faiss"):
+            if old != self._index_path(generation):
+                old.unlink(missing_ok=True)
+
+    # Writes
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        ids = list(ids)
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self.lock:
+            with self.db:
+                # Under the write lock, so no other process takes these row numbers
+                self.db.execute("BEGIN IMMEDIATE")
+                self._load_index(writable=True)
+                self._catch_up()
+                first = self._next_row()
+                self._mark_deleted(ids)
+                self.db.executemany(
+                    "INSERT INTO rows (row, id, document, metadata, embedding) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (first + i, chunk_id, document, json.dumps(meta, ensure_ascii=False), vector.tobytes())
+                        for i, (chunk_id, document, meta, vector) in enumerate(
+                            zip(ids, documents, metadatas, vectors)
+                        )
+                    ],
+                )
+            if self.index is None:
+                self.index = self._new_index(vectors.shape[1])
+            self.index.add(index_vectors(vectors, self.params["space"]))
+            self.dirty = True
+
+    add = upsert
+
+    def update(self, ids, metadatas=None, documents=None):
+        with self.lock, self.db:
+            if metadatas is not None:
+                # Merged into the stored metadata, as ChromaDB does (None removes a key)
+                self.db.executemany(
+                    "UPDATE rows SET metadata = json_patch(metadata, ?) WHERE id = ? AND deleted = 0",
+                    [(json.dumps(meta, ensure_ascii=False), chunk_id) for chunk_id, meta in zip(ids, metadatas)],
+                )
+            if documents is not None:
+                self.db.executemany(
+                    "UPDATE rows SET document = ? WHERE id = ? AND deleted = 0",
+                    list(zip(documents, ids)),
+                )
+
+    def delete(self, ids=None, where=None):
+        if ids is None and where is None:
+            raise ValueError("delete() needs ids or where (use delete_collection() to drop all rows)")
+        with self.lock, self.db:
+            self._load_index(writable=True)
+            if ids is None:
+                ids = self.get(where=where, include=[])["ids"]
+            self._mark_deleted(list(ids))
+            self.dirty = True
+
+    def _mark_deleted(self, ids: list):
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start : start + _SQL_BATCH]
+            self.db.execute(
+                f"UPDATE rows SET deleted = 1 WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+
+    # Reads
+
+    def count(self) -> int:
+        with self.lock:
+            (count,) = self.db.execute("SELECT COUNT(*) FROM rows WHERE deleted = 0").fetchone()
+        return count
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """Live rows by ID and/or metadata filter, in row order."""
+        condition, params = _where_sql(where or {})
+        sql = f"SELECT id, document, metadata FROM rows WHERE deleted = 0 AND {condition}"
+        with self.lock:
+            if ids is None:
+                suffix = f" ORDER BY row LIMIT {int(limit) if limit else -1} OFFSET {int(offset or 0)}"
+                found = self.db.execute(sql + suffix, params).fetchall()
+            else:
+                ids = list(ids)
+                found = []
+                for start in range(0, len(ids), _SQL_BATCH):
+                    batch = ids[start : start + _SQL_BATCH]
+                    found.extend(
+                        self.db.execute(
+                            f"{sql} AND id IN ({','.join('?' * len(batch))}) ORDER BY row",
+                            [*params, *batch],
+                        )
+                    )
+        result = {"ids": [chunk_id for chunk_id, _, _ in found]}
+        if "documents" in include:
+            result["documents"] = [document for _, document, _ in found]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(meta) for _, _, meta in found]
+        return result
+
+    def peek(self, limit: int = 10) -> dict:
+        return self.get(limit=limit)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=None):
+        """Nearest live rows of each query vector (chromadb's result layout)."""
+        space = self.params["space"]
+        queries = index_vectors(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)), space)
+        with self.lock:
+            self._load_index(self.writable)
+            indexed = self._indexed()
+            if where:
+                condition, params = _where_sql(where)
+                allowed = [
+                    row
+                    for (row,) in self.db.execute(
+                        f"SELECT row FROM rows WHERE deleted = 0 AND {condition}", params
+                    )
+                ]
+                if len(allowed) <= EXACT_SEARCH_ROWS:
+                    hits = self._exact(queries, allowed, n_results)
+                else:
+                    selector = faiss.IDSelectorBatch(
+                        np.array([row for row in allowed if row < indexed], dtype=np.int64)
+                    )
+                    tail = [row for row in allowed if row >= indexed]
+                    hits = self._merge(
+                        self._ann(queries, n_results, selector),
+                        self._exact(queries, tail, n_results),
+                        n_results,
+                    )
+            else:
+                deleted = np.array(
+                    [row for (row,) in self.db.execute(
+                        "SELECT row FROM rows WHERE deleted = 1 AND row < ?", (indexed,)
+                    )],
+                    dtype=np.int64,
+                )
+                selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(deleted)) if len(deleted) else None
+                tail = [
+                    row
+                    for (row,) in self.db.execute(
+                        "SELECT row FROM rows WHERE deleted = 0 AND row >= ?", (indexed,)
+                    )
+                ]
+                hits = self._merge(
+                    self._ann(queries, n_results, selector),
+                    self._exact(queries, tail, n_results),
+                    n_results,
+                )
+            records = self._records({row for query_hits in hits for _, row in query_hits})
+
+        return {
+            "ids": [[records[row][0] for _, row in query_hits] for query_hits in hits],
+            "documents": [[records[row][1] for _, row in query_hits] for query_hits in hits],
+            "metadatas": [[json.loads(records[row][2]) for _, row in query_hits] for query_hits in hits],
+            "distances": [
+                [similarity_distance(score, space) for score, _ in query_hits] for query_hits in hits
+            ],
+        }
+
+    def _ann(self, queries: np.ndarray, k: int, selector=None) -> list:
+        """(score, row) lists of the HNSW search over indexed rows."""
+        if self.index is None or self.index.ntotal == 0 or k <= 0:
+            return [[] for _ in queries]
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = max(self.params["search_ef"], k)
+        if selector is not None:
+            params.sel = selector
+        scores, labels = self.index.search(queries, k, params=params)
+        if self.params["space"] == "l2":
+            scores = -scores  # FAISS returns squared distances
+        return [
+            [(float(score), int(label)) for score, label in zip(query_scores, query_labels) if label >= 0]
+            for query_scores, query_labels in zip(scores, labels)
+        ]
+
+    def _exact(self, queries: np.ndarray, rows: list, k: int) -> list:
+        """(score, row) lists of an exact search over the given rows."""
+        if not rows or k <= 0:
+            return [[] for _ in queries]
+        space = self.params["space"]
+        scores = similarities(queries, index_vectors(self._vectors(rows), space), space)
+        top = np.argsort(-scores, axis=1)[:, :k]
+        return [[(float(scores[q, i]), rows[i]) for i in top[q]] for q in range(len(queries))]
+
+    @staticmethod
+    def _merge(first: list, second: list, k: int) -> list:
+        return [sorted(a + b, reverse=True)[:k] for a, b in zip(first, second)]
+
+    def _records(self, rows: set) -> dict:
+        rows = list(rows)
+        records = {}
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = rows[start : start + _SQL_BATCH]
+            for row, chunk_id, document, meta in self.db.execute(
+                f"SELECT row, id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(batch))})",
+                batch,
+            ):
+                records[row] = (chunk_id, document, meta)
+        return records
+
+    def close(self):
+        self.save()
+        self.db.close()
+
+
+class HnswClient:
+    """Client of an hnsw-store database directory (see open_client())."""
+
+    def __init__(self, chroma_db_path: Path):
+        self.root = Path(chroma_db_path) / HNSW_DIR
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.collections = {}
+        # Index files are written by persist() and, at the latest, when the process exits
+        atexit.register(self.close)
+
+    def _open(self, name: str) -> HnswCollection:
+        if name not in self.collections:
+            with open(self.root / name / "collection.json", encoding="utf-8") as f:
+                info = json.load(f)
+            self.collections[name] = HnswCollection(self.root / name, name, info["metadata"])
+        return self.collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: dict = None) -> HnswCollection:
+        if not _NAME_PATTERN.match(name):
+            raise ValueError(
+                f"Invalid collection name {name!r}: 3-63 characters [A-Za-z0-9._-], "
+                "starting and ending with a letter or digit"
+            )
+        directory = self.root / name
+        if not (directory / "collection.json").exists():
+            space = hnsw_params(metadata)["space"]
+            if space not in HNSW_SPACES:
+                raise ValueError(f"Unknown space {space}; choose from {', '.join(HNSW_SPACES)}")
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / "collection.json", "w", encoding="utf-8") as f:
+                json.dump({"name": name, "metadata": metadata}, f, ensure_ascii=False)
+        return self._open(name)
+
+    def get_collection(self, name: str) -> HnswCollection:
+        if not (self.root / name / "collection.json").exists():
+            raise ValueError(f"Collection {name} does not exist.")
+        return self._open(name)
+
+    def list_collections(self) -> list:
+        return [
+            self._open(directory.name)
+            for directory in sorted(self.root.iterdir())
+            if (directory / "collection.json").exists()
+        ]
+
+    def delete_collection(self, name: str):
+        collection = self.get_collection(name)
+        collection.db.close()
+        del self.collections[name]
+        shutil.rmtree(self.root / name)
+
+    def get_max_batch_size(self) -> int:
+        return HNSW_MAX_BATCH
+
+    def close(self):
+        """Write the index files of collections changed by this process."""
+        for collection in self.collections.values():
+            collection.close()
+        self.collections = {}
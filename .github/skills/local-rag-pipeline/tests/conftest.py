@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The pipeline scripts import their helper modules by plain name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
@@ -0,0 +1,16 @@
+import pytest
+
+from chunk_io import provenance_file_name, provenance_for_chunk_id, save_provenance
+
+
+def test_provenance_for_chunk_id(tmp_path):
+    ids = ["doc:0000000000000001", "doc:0000000000000002"]
+    boxes = [[(1, 0.0, 0.0, 1.0, 1.0)], [(2, 1.0, 1.0, 2.0, 2.0), (3, 0.0, 0.0, 1.0, 1.0)]]
+    save_provenance(tmp_path / provenance_file_name("doc"), boxes, ids)
+
+    pages, bboxes = provenance_for_chunk_id(tmp_path, ids[1])
+    assert pages.tolist() == [2, 3]
+    assert bboxes.shape == (2, 4)
+
+    with pytest.raises(KeyError, match="not in provenance sidecar"):
+        provenance_for_chunk_id(tmp_path, "doc:ffffffffffffffff")
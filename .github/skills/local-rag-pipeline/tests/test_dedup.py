@@ -0,0 +1,89 @@
+import numpy as np
+
+from dedup import NUM_PERM, build_dedup_index, format_dedup_report, minhash_file_name, save_minhash
+
+
+def _signature(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 1 << 31, NUM_PERM).astype(np.uint32)
+
+
+def _edit(signature: np.ndarray, positions: range, seed: int) -> np.ndarray:
+    """Copy with the given MinHash values replaced (lower estimated similarity)."""
+    edited = signature.copy()
+    edited[list(positions)] = _signature(seed)[list(positions)]
+    return edited
+
+
+def _write(chunks_dir, doc_name: str, signature: np.ndarray, source_path: str, doc_type: str, **info):
+    save_minhash(
+        chunks_dir / minhash_file_name(doc_name),
+        [f"{doc_name}:0000000000000000"],
+        signature[None],
+        [[1]],
+        {"source_path": source_path, "doc_type": doc_type, **info},
+    )
+
+
+def test_chain_does_not_collapse_into_distant_canonical(tmp_path):
+    # sim(a, b) = sim(b, c) = 115/128 ≈ 0.90, sim(a, c) = 102/128 ≈ 0.80
+    a = _signature(1)
+    b = _edit(a, range(0, 13), 2)
+    c = _edit(b, range(13, 26), 3)
+    _write(tmp_path, "a", a, "antrag/a.md", "antrag")
+    _write(tmp_path, "b", b, "antrag/b.md", "antrag")
+    _write(tmp_path, "c", c, "antrag/c.md", "antrag")
+
+    index = build_dedup_index(tmp_path, threshold=0.85)
+
+    # b pairs with a or with c, but a and c never share a cluster
+    assert len(index["duplicates"]) == 1
+    assert index["duplicates"].get("c:0000000000000000") != "a:0000000000000000"
+    assert index["duplicates"].get("a:0000000000000000") != "c:0000000000000000"
+    assert all(len(refs) == 2 for refs in index["references"].values())
+
+
+def test_duplicates_are_collapsed_within_a_doc_type_only(tmp_path):
+    a = _signature(1)
+    _write(tmp_path, "a", a, "antrag/a.md", "antrag")
+    _write(tmp_path, "b", a.copy(), "antrag/b.md", "antrag")
+    _write(tmp_path, "c", a.copy(), "berichte/c.md", "berichte")
+
+    index = build_dedup_index(tmp_path, threshold=0.85)
+
+    assert index["duplicates"] == {"b:0000000000000000": "a:0000000000000000"}
+
+
+def test_duplicates_are_collapsed_within_a_project_only(tmp_path):
+    # Projects share a near-duplicate chunk; each shard (--shard-by project) needs its own canonical copy
+    a = _signature(1)
+    _write(tmp_path, "a", a, "P-001/antrag/a.md", "antrag")
+    _write(tmp_path, "b", _edit(a, range(0, 5), 2), "P-001/antrag/b.md", "antrag")
+    _write(tmp_path, "c", _edit(a, range(5, 10), 3), "P-002/antrag/c.md", "antrag")
+
+    index = build_dedup_index(tmp_path, threshold=0.85)
+
+    assert index["duplicates"] == {"b:0000000000000000": "a:0000000000000000"}
+    assert "c:0000000000000000" not in index["duplicates"]
+    canonical_projects = {
+        refs[0]["source_path"].split("/")[0] for refs in index["references"].values()
+    }
+    assert canonical_projects == {"P-001"}
+
+
+def test_stats_and_report_break_down_by_project(tmp_path):
+    a = _signature(1)
+    # Parsed per project with --project: source paths start with the doc_type folder
+    _write(tmp_path, "a", a, "antrag/a.md", "antrag", project="ki-2024")
+    _write(tmp_path, "b", a.copy(), "antrag/b.md", "antrag", project="ki-2024")
+    _write(tmp_path, "c", a.copy(), "antrag/c.md", "antrag", project="ml-2023")
+
+    index = build_dedup_index(tmp_path, threshold=0.85)
+
+    assert index["stats"]["by_project"] == {
+        "ki-2024": {"chunks": 2, "duplicates": 1},
+        "ml-2023": {"chunks": 1, "duplicates": 0},
+    }
+    report = format_dedup_report(index)
+    assert "  project ki-2024: 1 of 2 (50.0%)" in report
+    assert "  project ml-2023: 0 of 1 (0.0%)" in report
+    assert "  doc_type antrag: 1 of 3 (33.3%)" in report
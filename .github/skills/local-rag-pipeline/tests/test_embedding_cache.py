@@ -0,0 +1,29 @@
+import numpy as np
+
+from embedding_cache import open_cache
+
+
+def test_refresh_encodes_every_text_and_replaces_cached_vectors(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    cache = open_cache(path)
+    cache.encode("model", True, ["a", "b"], lambda texts: np.zeros((len(texts), 4)))
+    size = cache.size_bytes
+    cache.close()
+
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return np.ones((len(texts), 4))
+
+    refreshing = open_cache(path, refresh=True)
+    rows = refreshing.encode("model", True, ["a", "b"], encode)
+    assert encoded == ["a", "b"]
+    assert rows.tolist() == [[1.0] * 4] * 2
+    assert refreshing.size_bytes == size
+    refreshing.close()
+
+    cache = open_cache(path)
+    rows = cache.encode("model", True, ["a"], encode)
+    assert encoded == ["a", "b"]  # served from the cache
+    assert rows.tolist() == [[1.0] * 4]
@@ -0,0 +1,23 @@
+import importlib
+
+# The stage script starts with a digit, so it cannot be imported by name
+index_stage = importlib.import_module("4_index_to_chromadb")
+
+CANONICAL = {
+    "filename": "a.pdf",
+    "sources": [
+        {"source_path": "antrag/a.pdf", "page_numbers": [1]},
+        {"source_path": "antrag/b.pdf", "page_numbers": [2]},
+    ],
+}
+
+
+def test_chunk_that_stops_being_canonical_overwrites_its_sources():
+    stored = index_stage.chromadb_metadata(CANONICAL)
+    assert stored["has_duplicates"] is True
+
+    # ChromaDB's update() merges the new keys into the stored metadata
+    updated = {**stored, **index_stage.chromadb_metadata({"filename": "a.pdf"})}
+
+    assert updated["has_duplicates"] is False
+    assert updated["sources"] == "[]"
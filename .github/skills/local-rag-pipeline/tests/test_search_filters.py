@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+
+from search_filters import FILENAME_OVERFETCH, query_candidates
+
+
+def _matches(metadata: dict, where: dict) -> bool:
+    """chromadb-style filter of the operators search_filters.py uses."""
+    if "$and" in where:
+        return all(_matches(metadata, part) for part in where["$and"])
+    ((key, condition),) = where.items()
+    ((op, value),) = condition.items()
+    return (metadata.get(key) == value) == (op == "$eq")
+
+
+class MemoryCollection:
+    """Exact-search stand-in for a collection (query() and count())."""
+
+    name = "docs"
+
+    def __init__(self, rows: list):
+        self.rows = rows  # (id, vector, document, metadata)
+
+    def count(self) -> int:
+        return len(self.rows)
+
+    def query(self, query_embeddings, n_results, where=None):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in query_embeddings:
+            rows = [row for row in self.rows if where is None or _matches(row[3], where)]
+            rows.sort(key=lambda row: float(np.sum((row[1] - query) ** 2)))
+            rows = rows[:n_results]
+            results["ids"].append([row[0] for row in rows])
+            results["documents"].append([row[2] for row in rows])
+            results["metadatas"].append([row[3] for row in rows])
+            results["distances"].append([float(np.sum((row[1] - query) ** 2)) for row in rows])
+        return results
+
+
+def _canonical(filename: str, also_in: str = None) -> dict:
+    sources = [{"source_path": f"antrag/{filename}", "page_numbers": []}]
+    if also_in:
+        sources.append({"source_path": f"antrag/{also_in}", "page_numbers": []})
+    return {"filename": filename, "has_duplicates": True, "sources": json.dumps(sources)}
+
+
+def test_own_chunks_are_found_below_the_overfetch_window():
+    n_results = 5
+    # Canonical chunks of other files, all nearer to the query than the file's own
+    rows = [
+        (f"other-{i}", np.array([i * 0.01, 0.0]), "other", _canonical(f"other{i}.pdf"))
+        for i in range(n_results * FILENAME_OVERFETCH * 2)
+    ]
+    # A canonical chunk of another file with a collapsed duplicate in a.pdf
+    rows.append(("shared", np.array([0.001, 0.0]), "shared", _canonical("b.pdf", also_in="a.pdf")))
+    rows += [
+        (f"a-{i}", np.array([10.0 + i, 0.0]), "own", {"filename": "a.pdf", "has_duplicates": False})
+        for i in range(3)
+    ]
+    collection = MemoryCollection(rows)
+
+    results = query_candidates([collection], [[0.0, 0.0]], n_results, filter_filename="a.pdf")
+
+    assert results["ids"][0] == ["shared", "a-0", "a-1", "a-2"]
+    assert results["distances"][0] == sorted(results["distances"][0])
+
+
+def test_doc_type_filter_applies_to_both_queries():
+    rows = [
+        ("a-0", np.array([1.0, 0.0]), "own", {"filename": "a.pdf", "doc_type": "antrag"}),
+        ("a-1", np.array([2.0, 0.0]), "own", {"filename": "a.pdf", "doc_type": "berichte"}),
+        (
+            "b-0",
+            np.array([0.5, 0.0]),
+            "shared",
+            {**_canonical("b.pdf", also_in="a.pdf"), "doc_type": "berichte"},
+        ),
+    ]
+
+    results = query_candidates(
+        [MemoryCollection(rows)], [[0.0, 0.0]], 5, filter_filename="a.pdf", filter_doc_type="antrag"
+    )
+
+    assert results["ids"][0] == ["a-0"]
@@ -0,0 +1,18 @@
+from shards import PROJECT_KEY, shard_value, source_project
+
+
+def test_recorded_project_wins_over_the_source_path():
+    info = {"source_path": "antrag/a.pdf", "doc_type": "antrag", "project": "ki-2024"}
+    assert source_project(info) == "ki-2024"
+    assert shard_value(info, PROJECT_KEY) == "ki-2024"
+
+
+def test_project_of_older_trees_comes_from_the_documents_root():
+    assert source_project({"source_path": "ki-2024/antrag/a.pdf"}) == "ki-2024"
+
+
+def test_document_type_folders_are_not_projects():
+    # A single project parsed without --project: the first folder is a doc_type
+    assert source_project({"source_path": "antrag/a.pdf"}) == ""
+    assert source_project({"source_path": "Berichte/b.pdf"}) == ""
+    assert source_project({"source_path": "c.pdf"}) == ""
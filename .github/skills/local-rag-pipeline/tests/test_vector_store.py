@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from vector_store import open_client, persist
+
+
+def _upsert(collection, prefix: str, n: int, seed: int):
+    ids = [f"{prefix}-{i}" for i in range(n)]
+    vectors = np.random.default_rng(seed).random((n, 8), dtype=np.float32)
+    collection.upsert(ids=ids, embeddings=vectors, documents=ids, metadatas=[{"p": prefix}] * n)
+    return vectors
+
+
+def _collection(tmp_path, space: str = "l2"):
+    return open_client(tmp_path, "hnsw").get_or_create_collection("docs", {"hnsw:space": space})
+
+
+def test_writers_of_two_clients_share_row_numbers(tmp_path):
+    # Two clients stand in for two processes writing the same collection
+    first = open_client(tmp_path, "hnsw").get_or_create_collection("docs", {"hnsw:space": "l2"})
+    second = open_client(tmp_path).get_collection("docs")
+    _upsert(first, "a", 10, 1)
+    vectors = _upsert(second, "b", 10, 2)
+    _upsert(first, "c", 10, 3)
+
+    assert first.count() == 30
+    assert first.index.ntotal == 30
+    # Row labels of the index match the sidecar for the other client's rows
+    result = first.query(query_embeddings=vectors[3:4], n_results=1)
+    assert result["ids"][0] == ["b-3"]
+    persist([first, second])
+
+
+def test_delete_without_ids_or_where_is_refused(tmp_path):
+    collection = open_client(tmp_path, "hnsw").get_or_create_collection("docs")
+    _upsert(collection, "a", 5, 1)
+    with pytest.raises(ValueError):
+        collection.delete()
+    assert collection.count() == 5
+    collection.delete(where={"p": "a"})
+    assert collection.count() == 0
+
+
+def test_upsert_replaces_the_row_of_an_id(tmp_path):
+    collection = _collection(tmp_path)
+    _upsert(collection, "a", 3, 1)
+    collection.upsert(
+        ids=["a-1"], embeddings=np.full((1, 8), 5.0), documents=["new"], metadatas=[{"p": "b"}]
+    )
+
+    assert collection.count() == 3
+    assert collection.get(ids=["a-1"]) == {"ids": ["a-1"], "documents": ["new"], "metadatas": [{"p": "b"}]}
+    result = collection.query(query_embeddings=np.full((1, 8), 5.0), n_results=1)
+    assert result["ids"][0] == ["a-1"]
+    assert result["distances"][0][0] < 1e-6
+
+
+def test_delete_by_ids_and_where_hides_rows_from_search(tmp_path):
+    collection = _collection(tmp_path)
+    vectors = _upsert(collection, "a", 5, 1)
+    _upsert(collection, "b", 5, 2)
+
+    collection.delete(ids=["a-0"])
+    collection.delete(where={"p": "b"})
+
+    assert collection.count() == 4
+    assert collection.get(where={"p": "b"})["ids"] == []
+    result = collection.query(query_embeddings=vectors[:1], n_results=10)
+    assert "a-0" not in result["ids"][0]
+    assert sorted(result["ids"][0]) == ["a-1", "a-2", "a-3", "a-4"]
+
+
+def test_compact_renumbers_rows_and_keeps_search_results(tmp_path):
+    collection = _collection(tmp_path)
+    vectors = _upsert(collection, "a", 20, 1)
+    collection.delete(ids=[f"a-{i}" for i in range(0, 20, 2)])
+    collection.save()  # more than COMPACT_RATIO deleted: compacts
+
+    rows = [row for (row,) in collection.db.execute("SELECT row FROM rows ORDER BY row")]
+    assert rows == list(range(10))
+    assert collection.index.ntotal == 10
+    assert [path.name for path in collection.directory.glob("index-*.faiss")] == ["index-1.faiss"]
+
+    reopened = open_client(tmp_path).get_collection("docs")
+    result = reopened.query(query_embeddings=vectors[3:4], n_results=1)
+    assert result["ids"][0] == ["a-3"]
+
+
+def test_where_filter_exact_and_index_paths_agree(tmp_path, monkeypatch):
+    import vector_store
+
+    collection = _collection(tmp_path)
+    _upsert(collection, "a", 30, 1)
+    vectors = _upsert(collection, "b", 30, 2)
+    collection.save()
+    query = {"query_embeddings": vectors[:2], "n_results": 5, "where": {"p": "b"}}
+
+    exact = collection.query(**query)
+    # Filtered searches over more rows than this go through the index (IDSelectorBatch)
+    monkeypatch.setattr(vector_store, "EXACT_SEARCH_ROWS", 0)
+    indexed = collection.query(**query)
+
+    assert all(chunk_id.startswith("b-") for ids in indexed["ids"] for chunk_id in ids)
+    assert [ids[0] for ids in indexed["ids"]] == ["b-0", "b-1"]
+    assert [ids[0] for ids in exact["ids"]] == ["b-0", "b-1"]
+
+
+def test_update_merges_metadata_as_chroma_does(tmp_path):
+    collection = _collection(tmp_path)
+    collection.upsert(
+        ids=["a-0"],
+        embeddings=np.zeros((1, 8)),
+        documents=["text"],
+        metadatas=[{"filename": "a.pdf", "has_duplicates": True}],
+    )
+
+    collection.update(ids=["a-0"], metadatas=[{"has_duplicates": False}])
+
+    assert collection.get(ids=["a-0"])["metadatas"] == [{"filename": "a.pdf", "has_duplicates": False}]